@@ -0,0 +1,144 @@
+import logging
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import jsonify, request
+from metrics import register, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 准入控制：联表比对、整表读取、输出结果、Excel 导入这几类重请求各自限制同时执行的个数，
+# 超出时最多排队 queue_size 个、最多等待 QUEUE_TIMEOUT_SECONDS 秒，队列已满或等待超时立即返回 429，
+# 避免几个用户同时发起大查询拖垮 MySQL，也避免重请求占满工作线程，使分页等普通请求仍能及时处理。
+# 限制按进程计算（与 /metrics 一样），多进程部署时总并发为 进程数 × 限制。
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('JXC_ADMISSION_QUEUE_TIMEOUT', 10))
+
+ADMISSION_ACTIVE = register(Gauge(
+    'jxc_admission_active', '准入控制：正在执行的重请求数', ('gate',)))
+ADMISSION_QUEUE_DEPTH = register(Gauge(
+    'jxc_admission_queue_depth', '准入控制：排队等待的重请求数', ('gate',)))
+ADMISSION_REJECTED = register(Counter(
+    'jxc_admission_rejected_total', '准入控制：返回 429 的请求数（queue_full 队列已满、timeout 等待超时）', ('gate', 'reason')))
+ADMISSION_WAIT_SECONDS = register(Histogram(
+    'jxc_admission_wait_seconds', '准入控制：排队等待时间', ('gate',)))
+
+
+class AdmissionGate:
+    """一类重请求的并发限制和有界等待队列"""
+
+    def __init__(self, name, limit, queue_size, timeout=QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        # 平均执行时间（指数加权），用于估算 Retry-After
+        self.avg_seconds = 1.0
+        self._cond = threading.Condition()
+        ADMISSION_ACTIVE.set(0, gate=name)
+        ADMISSION_QUEUE_DEPTH.set(0, gate=name)
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.set(self.active, gate=self.name)
+        ADMISSION_QUEUE_DEPTH.set(self.waiting, gate=self.name)
+
+    def acquire(self):
+        """取得执行名额返回 None，被拒绝时返回原因（queue_full / timeout）"""
+        start = time.monotonic()
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self.active += 1
+                self._update_gauges()
+                return None
+            if self.waiting >= self.queue_size:
+                return 'queue_full'
+            self.waiting += 1
+            self._update_gauges()
+            try:
+                deadline = start + self.timeout
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # 可能恰好在超时时被唤醒，把名额让给下一个等待者
+                        self._cond.notify()
+                        return 'timeout'
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                self._update_gauges()
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, gate=self.name)
+        return None
+
+    def release(self, seconds):
+        with self._cond:
+            self.active -= 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+            self._update_gauges()
+            self._cond.notify()
+
+    def retry_after(self):
+        """估计多少秒后能取得名额：排在前面的请求数 / 并发限制 × 平均执行时间"""
+        with self._cond:
+            ahead = self.waiting + 1
+            return max(1, math.ceil(ahead / self.limit * self.avg_seconds))
+
+
+def _gate_config(env_name, limit, queue_size):
+    """环境变量格式为 "并发数:队列长度"，如 JXC_ADMISSION_JOIN=2:4"""
+    value = os.environ.get(env_name)
+    if not value:
+        return limit, queue_size
+    parts = value.split(':')
+    return int(parts[0]), int(parts[1]) if len(parts) > 1 else queue_size
+
+
+GATES = {
+    # 联表比对：不限行数的 JOIN
+    'join': AdmissionGate('join', *_gate_config('JXC_ADMISSION_JOIN', 1, 1)),
+    # 比对页面读取整张表
+    'dump': AdmissionGate('dump', *_gate_config('JXC_ADMISSION_DUMP', 2, 1)),
+    # 输出结果查询
+    'output': AdmissionGate('output', *_gate_config('JXC_ADMISSION_OUTPUT', 2, 2)),
+    # Excel 上传导入
+    'upload': AdmissionGate('upload', *_gate_config('JXC_ADMISSION_UPLOAD', 1, 1)),
+}
+
+
+def overloaded_response(gate, reason):
+    response = jsonify({
+        'error': '服务器正忙，请稍后重试',
+        'error_type': 'Overloaded',
+        'gate': gate.name,
+        'reason': reason,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(gate.retry_after())
+    return response
+
+
+def admission(gate_name, methods=None, rejected=overloaded_response):
+    """路由装饰器：按 gate_name 对应的限制执行，methods 指定时只限制这些请求方法；
+    rejected(gate, reason) 生成拒绝时的响应（默认 JSON），状态码应为 429"""
+    gate = GATES[gate_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods and request.method not in methods:
+                return view(*args, **kwargs)
+            reason = gate.acquire()
+            if reason is not None:
+                ADMISSION_REJECTED.inc(gate=gate.name, reason=reason)
+                logger.warning("拒绝 %s 请求（%s）: 正在执行 %s，排队 %s", gate.name, reason, gate.active, gate.waiting)
+                return rejected(gate, reason)
+            start = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                gate.release(time.monotonic() - start)
+        return wrapper
+    return decorator
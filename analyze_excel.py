@@ -1,84 +1,326 @@
-import pandas as pd
+"""分析 Excel 文件结构，推断字段类型并生成建表语句
+
+    python analyze_excel.py                          # 分析当前目录下所有 .xlsx / .xls
+    python analyze_excel.py 客户流向.xlsx --sample-rows 2000
+    python analyze_excel.py data/ --workers 4 --output schema.sql
+
+每个文件只读取前 --sample-rows 行（默认 5000），多个文件并行分析。
+按样本中的实际取值推断类型：日期 -> DATE/DATETIME，整数 -> 按范围选 TINYINT/SMALLINT/INT/BIGINT，
+小数 -> DECIMAL(按整数位和小数位)，文本 -> VARCHAR(按最大长度留余量)；编码、编号、批次类列始终为 VARCHAR。
+为编码、名称、日期类列建议索引，并估算每行大小（与旧的 VARCHAR(255)/DECIMAL(10,2) 映射对比）。
+"""
+import argparse
+import math
 import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import pandas as pd
+
+SAMPLE_ROWS = 5000
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+# 表头所在行：前几行中非空文本最多的一行
+HEADER_SCAN_ROWS = 10
+
+# 始终按文本保存的列（编码可能有前导零，批次/批号可能含字母）
+CODE_KEYWORDS = ('编码', '编号', '批次', '批号', '单号', '代码', '电话')
+# 金额、价格类列始终为 DECIMAL，至少保留 2 位小数
+MONEY_KEYWORDS = ('金额', '价')
+MONEY_SCALE = 2
+# 建议建索引的列
+INDEX_KEYWORDS = ('编码', '名称', '日期')
+# VARCHAR 长度档位，最大长度乘以余量后向上取档
+VARCHAR_SIZES = (16, 32, 64, 128, 255, 500, 1000)
+VARCHAR_HEADROOM = 1.5
+DECIMAL_HEADROOM = 2
+MAX_SCALE = 6
+# 类型推断允许的例外值个数（至少这么多，或样本的 1%）
+OUTLIER_LIMIT = 2
+
+INT_TYPES = [
+    ('TINYINT', -128, 127, 1),
+    ('SMALLINT', -32768, 32767, 2),
+    ('INT', -2 ** 31, 2 ** 31 - 1, 4),
+    ('BIGINT', -2 ** 63, 2 ** 63 - 1, 8),
+]
+DATE_RE = re.compile(r'^\d{4}[-/.]\d{1,2}[-/.]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$')
+NUMBER_RE = re.compile(r'^-?\d+(?:\.\d+)?$')
+
+
+def detect_header_row(raw):
+    """前几行中非空文本单元格最多的一行作为表头（活动方案的表头在第 3 行）"""
+    best_row, best_count = 0, -1
+    for i in range(min(HEADER_SCAN_ROWS, len(raw))):
+        count = sum(1 for v in raw.iloc[i] if isinstance(v, str) and v.strip())
+        if count > best_count:
+            best_row, best_count = i, count
+    return best_row
+
+
+def read_sample(filename, sample_rows=SAMPLE_ROWS):
+    """读取表头和前 sample_rows 行数据（xlsx 只解析需要的行）"""
+    raw = pd.read_excel(filename, header=None, nrows=HEADER_SCAN_ROWS)
+    header_row = detect_header_row(raw)
+    df = pd.read_excel(filename, header=header_row, nrows=sample_rows)
+    df = df.loc[:, [not str(c).startswith('Unnamed') for c in df.columns]]
+    return df, header_row
+
+
+def _is_code_column(name):
+    return any(k in name for k in CODE_KEYWORDS)
+
+
+def _number_parts(value):
+    """数字的 (整数位数, 小数位数)"""
+    text = format(value, 'f') if isinstance(value, float) else str(value)
+    text = text.lstrip('-')
+    if '.' in text:
+        int_part, frac_part = text.split('.', 1)
+        frac_part = frac_part.rstrip('0')
+    else:
+        int_part, frac_part = text, ''
+    return len(int_part.lstrip('0')) or 1, len(frac_part)
+
+
+def _varchar(max_len):
+    target = max(1, math.ceil(max_len * VARCHAR_HEADROOM))
+    for size in VARCHAR_SIZES:
+        if target <= size:
+            return f"VARCHAR({size})"
+    return 'TEXT'
+
+
+def _is_date(value, text):
+    return isinstance(value, (datetime, date, pd.Timestamp)) or bool(DATE_RE.match(text))
+
+
+def _is_number(value, text):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return not math.isinf(value)
+    return bool(NUMBER_RE.match(text))
+
+
+def _mostly(values, texts, check):
+    """大部分取值满足 check 时返回 ([(值, 文本)], 不满足的文本)，否则返回 None
+
+    允许少量例外（表尾的"联系人："、"合计"等说明行），导入时这些行会被过滤或置空
+    """
+    matched, outliers = [], []
+    for value, text in zip(values, texts):
+        if check(value, text):
+            matched.append((value, text))
+        else:
+            outliers.append(text)
+    if not matched or len(outliers) > max(OUTLIER_LIMIT, len(values) // 100):
+        return None
+    return matched, outliers
+
+
+def _note_outliers(info, outliers):
+    if outliers:
+        info['note'] = f"样本中有 {len(outliers)} 个值不符合该类型，如 {outliers[0][:20]}"
 
-def analyze_excel_file(filename):
-    """分析Excel文件结构"""
+
+def infer_column(name, series):
+    """按样本取值推断一列的 MySQL 类型，返回分析结果字典"""
+    non_null = [v for v in series.tolist() if not (v is None or (isinstance(v, float) and math.isnan(v))
+                                                   or (isinstance(v, str) and not v.strip()) or v is pd.NaT)]
+    info = {
+        'name': name,
+        'pandas_dtype': str(series.dtype),
+        'non_null': len(non_null),
+        'null_ratio': round(1 - len(non_null) / len(series), 3) if len(series) else 1.0,
+        'distinct': len(set(map(str, non_null))),
+    }
+    # 整数值的浮点数（如批号 240906.0）按整数文本计算长度
+    texts = [str(int(v)) if isinstance(v, float) and v.is_integer() else str(v).strip() for v in non_null]
+    info['example'] = texts[0] if texts else None
+    info['avg_len'] = round(sum(len(t) for t in texts) / len(texts), 1) if texts else 0
+    # utf8mb4 下的平均字节数（中文 3 字节，ASCII 1 字节），用于估算行大小
+    info['avg_bytes'] = round(sum(len(t.encode('utf-8')) for t in texts) / len(texts), 1) if texts else 0
+    max_len = max((len(t) for t in texts), default=0)
+
+    if not non_null:
+        info['sql_type'] = 'VARCHAR(255)'
+        info['note'] = '样本中全为空'
+    elif _is_code_column(name):
+        info['sql_type'] = _varchar(max_len)
+    elif _mostly(non_null, texts, _is_date):
+        values, outliers = _mostly(non_null, texts, _is_date)
+        stamps = pd.to_datetime(pd.Series([t for _, t in values]), errors='coerce', format='mixed')
+        if stamps.isna().any():
+            info['sql_type'] = _varchar(max_len)
+        elif ((stamps.dt.hour == 0) & (stamps.dt.minute == 0) & (stamps.dt.second == 0)).all():
+            info['sql_type'] = 'DATE'
+        else:
+            info['sql_type'] = 'DATETIME'
+        _note_outliers(info, outliers)
+    elif all(isinstance(v, bool) for v in non_null):
+        info['sql_type'] = 'TINYINT(1)'
+    elif _mostly(non_null, texts, _is_number):
+        values, outliers = _mostly(non_null, texts, _is_number)
+        numbers = [v if isinstance(v, (int, float)) else float(t) for v, t in values]
+        is_money = any(k in name for k in MONEY_KEYWORDS)
+        if is_money or any(isinstance(n, float) and not n.is_integer() for n in numbers):
+            parts = [_number_parts(n) for n in numbers]
+            scale = min(MAX_SCALE, max(p[1] for p in parts))
+            if is_money:
+                scale = max(scale, MONEY_SCALE)
+            precision = min(65, max(p[0] for p in parts) + scale + DECIMAL_HEADROOM)
+            info['sql_type'] = f"DECIMAL({max(precision, scale + 1)},{scale})"
+        else:
+            low, high = int(min(numbers)), int(max(numbers))
+            # 留 10 倍余量，避免样本之外的值溢出
+            margin = max(abs(low), abs(high)) * 10
+            for sql_type, type_low, type_high, _ in INT_TYPES:
+                if type_low <= -margin and margin <= type_high:
+                    info['sql_type'] = sql_type
+                    break
+            else:
+                info['sql_type'] = 'BIGINT'
+        _note_outliers(info, outliers)
+    else:
+        info['sql_type'] = _varchar(max_len)
+    info['index'] = any(k in name for k in INDEX_KEYWORDS) and info['sql_type'] != 'TEXT'
+    return info
+
+
+def estimate_bytes(sql_type, avg_bytes):
+    """按类型和样本平均字节数估算每个值的存储字节数"""
+    sql_type = sql_type.upper()
+    for name, _, _, size in INT_TYPES:
+        if sql_type == name:
+            return size
+    if sql_type.startswith('TINYINT'):
+        return 1
+    if sql_type == 'DATE':
+        return 3
+    if sql_type == 'DATETIME':
+        return 5
+    if sql_type.startswith('DECIMAL'):
+        precision, scale = map(int, re.findall(r'\d+', sql_type)[:2])
+        digits = [precision - scale, scale]
+        return sum(d // 9 * 4 + (0, 1, 1, 2, 2, 3, 3, 4, 4, 4)[d % 9] for d in digits)
+    return 1 + avg_bytes
+
+
+def legacy_sql_type(pandas_dtype):
+    """旧版 generate_sql_create_table 的类型映射，用于对比"""
+    return {'int64': 'INT', 'float64': 'DECIMAL(10,2)', 'datetime64[ns]': 'DATETIME',
+            'bool': 'BOOLEAN'}.get(pandas_dtype, 'VARCHAR(255)')
+
+
+def analyze_excel_file(filename, sample_rows=SAMPLE_ROWS):
+    """读取样本并推断每列类型（在子进程中执行），返回分析结果字典"""
     try:
-        # 读取Excel文件
-        df = pd.read_excel(filename)
-        
-        print(f"\n=== 分析文件: {filename} ===")
-        print(f"数据行数: {len(df)}")
-        print(f"数据列数: {len(df.columns)}")
-        print("\n列名和数据类型:")
-        for i, col in enumerate(df.columns):
-            # 获取列的数据类型
-            dtype = df[col].dtype
-            # 获取非空值的数量
-            non_null_count = df[col].count()
-            print(f"  {i+1}. {col} ({dtype}) - 非空值: {non_null_count}")
-        
-        # 显示前几行数据
-        print(f"\n前5行数据:")
-        print(df.head())
-        
-        return df.columns.tolist(), df.dtypes.to_dict()
-        
+        df, header_row = read_sample(filename, sample_rows)
     except Exception as e:
-        print(f"读取文件 {filename} 时出错: {e}")
-        return None, None
-
-def generate_sql_create_table(table_name, columns, dtypes):
-    """生成SQL CREATE TABLE语句"""
-    sql = f"CREATE TABLE {table_name} (\n"
-    sql += "    id INT AUTO_INCREMENT PRIMARY KEY,\n"
-    
-    type_mapping = {
-        'object': 'VARCHAR(255)',
-        'int64': 'INT',
-        'float64': 'DECIMAL(10,2)',
-        'datetime64[ns]': 'DATETIME',
-        'bool': 'BOOLEAN'
-    }
-    
-    for col in columns:
-        if col == 'id':  # 跳过id列，因为已经定义了主键
+        return {'file': filename, 'error': str(e)}
+    columns = [infer_column(str(col), df[col]) for col in df.columns]
+    return {'file': filename, 'header_row': header_row, 'sample_rows': len(df), 'columns': columns}
+
+
+def safe_column_name(col):
+    return col.replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '')
+
+
+def generate_sql_create_table(table_name, columns):
+    """根据 analyze_excel_file 的列分析结果生成 CREATE TABLE 语句（含建议索引和 当期日期 列）"""
+    lines = ["    id INT AUTO_INCREMENT PRIMARY KEY"]
+    indexes = []
+    for info in columns:
+        name = safe_column_name(info['name'])
+        if name in ('id', '当期日期'):
             continue
-            
-        # 获取数据类型
-        dtype = str(dtypes.get(col, 'object'))
-        sql_type = type_mapping.get(dtype, 'VARCHAR(255)')
-        
-        # 处理列名中的特殊字符
-        safe_col_name = col.replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '')
-        
-        sql += f"    {safe_col_name} {sql_type},\n"
-    
-    sql = sql.rstrip(',\n') + "\n);"
-    return sql
+        note = info.get('note', '').replace("'", "''")
+        comment = f" COMMENT '{note}'" if note else ''
+        lines.append(f"    {name} {info['sql_type']}{comment}")
+        if info['index']:
+            indexes.append(name)
+    # 导入按 当期日期 整批替换，始终建索引
+    lines.append("    当期日期 DATE DEFAULT (CURRENT_DATE)")
+    indexes.append('当期日期')
+    for name in indexes:
+        lines.append(f"    INDEX idx_{table_name}_{name} ({name})")
+    return (f"CREATE TABLE IF NOT EXISTS {table_name} (\n" + ",\n".join(lines)
+            + "\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;")
+
+
+def table_name_for(filename):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return name.replace(' ', '_').replace('-', '_')
+
+
+def find_excel_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                # ~$ 开头的是 Excel 打开时生成的临时文件
+                if name.lower().endswith(EXCEL_EXTENSIONS) and not name.startswith('~$'):
+                    files.append(os.path.join(path, name))
+        elif path.lower().endswith(EXCEL_EXTENSIONS):
+            files.append(path)
+    return files
+
+
+def print_report(result):
+    print(f"\n=== 分析文件: {result['file']} ===")
+    if result.get('error'):
+        print(f"读取文件时出错: {result['error']}")
+        return
+    print(f"表头行: 第 {result['header_row'] + 1} 行，样本行数: {result['sample_rows']}")
+    print(f"{'字段':<16} {'推断类型':<14} {'空值率':>6} {'不同值':>6} {'平均长度':>8}  示例")
+    legacy_bytes = new_bytes = 0
+    for info in result['columns']:
+        flag = ' *索引' if info['index'] else ''
+        print(f"{info['name']:<16} {info['sql_type']:<14} {info['null_ratio']:>6.1%} {info['distinct']:>6} "
+              f"{info['avg_len']:>8}  {info['example'] or ''}{flag}")
+        legacy_bytes += estimate_bytes(legacy_sql_type(info['pandas_dtype']), info['avg_bytes'])
+        new_bytes += estimate_bytes(info['sql_type'], info['avg_bytes'])
+    print(f"估算每行数据大小: {legacy_bytes:.0f} 字节（旧映射） -> {new_bytes:.0f} 字节")
+
 
 def main():
-    # 获取当前目录下的所有Excel文件
-    excel_files = [f for f in os.listdir('.') if f.endswith('.xlsx')]
-    
+    parser = argparse.ArgumentParser(description='分析 Excel 文件结构并生成建表语句')
+    parser.add_argument('paths', nargs='*', default=['.'], help='Excel 文件或目录，默认当前目录')
+    parser.add_argument('--sample-rows', type=int, default=SAMPLE_ROWS, help='每个文件读取的样本行数')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数，默认 CPU 核数')
+    parser.add_argument('--output', default=None, help='把建表语句写入该文件')
+    args = parser.parse_args()
+
+    excel_files = find_excel_files(args.paths)
+    if not excel_files:
+        print("没有找到 Excel 文件（.xlsx / .xls）")
+        return 1
     print("找到的Excel文件:")
     for file in excel_files:
         print(f"  - {file}")
-    
-    # 分析每个文件
-    for file in excel_files:
-        columns, dtypes = analyze_excel_file(file)
-        
-        if columns and dtypes:
-            # 生成表名（去掉.xlsx扩展名，替换特殊字符）
-            table_name = file.replace('.xlsx', '').replace(' ', '_').replace('-', '_')
-            
-            # 生成SQL CREATE TABLE语句
-            sql = generate_sql_create_table(table_name, columns, dtypes)
-            
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(excel_files)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(analyze_excel_file, excel_files, [args.sample_rows] * len(excel_files)))
+
+    statements = []
+    for result in results:
+        print_report(result)
+        if result.get('columns'):
+            sql = generate_sql_create_table(table_name_for(result['file']), result['columns'])
+            statements.append(f"-- {os.path.basename(result['file'])}\n{sql}")
             print(f"\n=== 生成的SQL CREATE TABLE语句 ===")
             print(sql)
-            print("\n" + "="*50)
+            print("\n" + "=" * 50)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(statements) + "\n")
+        print(f"建表语句已写入 {args.output}")
+    return 0
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+from flask import url_for
+
+logger = logging.getLogger(__name__)
+
+# 指纹化静态资源（由 build_assets.py 生成）：带哈希的文件名永不变化，可以长期缓存
+ASSET_MAX_AGE = 365 * 24 * 3600
+# 可用的预压缩版本，按优先顺序
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+class AssetManifest:
+    """读取 static/dist/manifest.json，记录每个资源可用的预压缩版本"""
+
+    def __init__(self, dist_dir):
+        self.dist_dir = dist_dir
+        self.names = {}       # 原文件名 -> 带哈希的文件名
+        self.variants = {}    # 带哈希的文件名 -> {编码: 文件后缀}
+        manifest_path = os.path.join(dist_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            logger.info("未找到 %s，静态资源使用 /static/ 原文件（可执行 python build_assets.py 构建）", manifest_path)
+            return
+        with open(manifest_path, encoding='utf-8') as f:
+            self.names = json.load(f)
+        for hashed in self.names.values():
+            self.variants[hashed] = {encoding: suffix for encoding, suffix in ENCODINGS
+                                     if os.path.exists(os.path.join(dist_dir, hashed + suffix))}
+
+    def url(self, filename):
+        """模板中引用静态资源的地址：已构建时为 /assets/<带哈希的文件名>，否则为 /static/<文件名>"""
+        hashed = self.names.get(filename)
+        if hashed:
+            return url_for('asset', filename=hashed)
+        return url_for('static', filename=filename)
+
+    def rewrite_static_urls(self, html):
+        """把页面中写死的 /static/<文件名> 替换为指纹化地址（用于不经过模板的页面）"""
+        for filename, hashed in self.names.items():
+            html = html.replace(f'/static/{filename}', f'/assets/{hashed}')
+        return html
+
+    def resolve(self, hashed, accept_encodings):
+        """返回 (文件路径, Content-Encoding)；hashed 不是已构建的资源时返回 (None, None)"""
+        variants = self.variants.get(hashed)
+        if variants is None:
+            return None, None
+        path = os.path.join(self.dist_dir, hashed)
+        for encoding, suffix in ENCODINGS:
+            if encoding in variants and accept_encodings.quality(encoding) > 0:
+                return path + suffix, encoding
+        return path, None
@@ -0,0 +1,174 @@
+"""生成基准测试用的合成 Excel 工作簿
+
+    python bench_data.py --sizes 10k,100k,1m --out bench_data
+
+按 10k/100k/1m 等行数生成三类文件（每个行数一个子目录，文件名与上传时的映射一致）：
+- 仲景宛西.xlsx：客户流向，字段与 customer_flow 表一致，末尾带合计行
+- 客户原始兑付明细.xlsx：字段与原始兑付明细导出一致（.xls 最多 65536 行，因此写成 .xlsx）
+- 活动方案.xlsx：标题行、第 3 行表头、空行、数据行以及"进货单位："页脚，与原始活动方案版式一致
+客户、产品、规格等取值从仓库自带的样例文件中抽样，样例不存在时使用内置词表。
+"""
+import argparse
+import os
+import random
+import zlib
+from datetime import date, timedelta
+import pandas as pd
+
+SAMPLE_FLOW_FILE = '客户流向.xlsx'
+
+DEFAULT_PRODUCTS = [
+    ('六味地黄丸', '200s/瓶', 12.5), ('知柏地黄丸', '200s/瓶', 13.0), ('生脉饮', '10mlx10支', 20.0),
+    ('黄连上清丸', '6gx10袋', 15.2), ('补中益气丸', '200丸', 17.6), ('痛经宝颗粒(月月舒)', '10g*6袋', 18.0),
+]
+DEFAULT_CUSTOMERS = ['重庆市开州区白鹤街道东华社区卫生服务站', '重庆开州大药房有限公司敦好店', '沙坪坝鞠是阳诊所',
+                     '重庆鸿翔一心堂药业有限公司', '重庆壹零柒陆益安药房连锁有限责任公司']
+DEFAULT_SUPPLIERS = ['重庆诚建医药有限公司', '重庆市开州区医药有限责任公司', '一心堂药业集团股份有限公司']
+ORGS = ['重庆省区', '四川省区', '云南省区', '贵州省区']
+LINES = ['分销线', 'KA线', '商务线']
+POLICIES = ['一次性购5盒，返20元', '一次性购5盒，返15元', '一次性购10盒，返50元', '购5盒返20元，购10盒返50元',
+            '每盒返3元', '购10盒赠1盒']
+
+
+def parse_size(text):
+    """10k -> 10000, 1m -> 1000000"""
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    return int(float(text) * multiplier)
+
+
+def load_vocabulary():
+    """从样例文件中抽取客户、产品、供货方等取值"""
+    vocab = {'products': DEFAULT_PRODUCTS, 'customers': DEFAULT_CUSTOMERS, 'suppliers': DEFAULT_SUPPLIERS}
+    if os.path.exists(SAMPLE_FLOW_FILE):
+        df = pd.read_excel(SAMPLE_FLOW_FILE, dtype=str).dropna(subset=['货品名称', '流入方名称'])
+        products = df.drop_duplicates('货品名称')[['货品名称', '货品规格', '供货价']].values.tolist()
+        vocab['products'] = [(name, spec, float(price or 0)) for name, spec, price in products]
+        vocab['customers'] = df['流入方名称'].drop_duplicates().tolist()
+        vocab['suppliers'] = df['流出方名称'].dropna().drop_duplicates().tolist()
+    return vocab
+
+
+def random_dates(rng, n, start=date(2025, 5, 1), days=31):
+    return [(start + timedelta(days=rng.randrange(days))).strftime('%Y-%m-%d') for _ in range(n)]
+
+
+def make_flow_frame(n, vocab, rng):
+    """客户流向（仲景宛西）数据，列与 customer_flow 表一致，最后一行为合计行"""
+    products = [rng.choice(vocab['products']) for _ in range(n)]
+    customers = [rng.choice(vocab['customers']) for _ in range(n)]
+    quantities = [rng.choice([1, 2, 3, 5, 5, 10, 12, 20, 50]) for _ in range(n)]
+    prices = [p[2] for p in products]
+    df = pd.DataFrame({
+        '进货日期': random_dates(rng, n),
+        '流入方编码': [f"{zlib.crc32(c.encode()) % 100000000:08d}" for c in customers],
+        '流入方别名': [f"{c}_{rng.randrange(1000)}" for c in customers],
+        '流入方名称': customers,
+        '物料编码': [str(1090100000 + vocab['products'].index(p)) for p in products],
+        '物料名称': [p[0] for p in products],
+        '销售数量': quantities,
+        '出库单价': prices,
+        '金额': [round(q * pr, 2) for q, pr in zip(quantities, prices)],
+        '流出方编码': [str(rng.randrange(1000, 30000000)) for _ in range(n)],
+        '流出方名称': [rng.choice(vocab['suppliers']) for _ in range(n)],
+        '批次': [str(rng.randrange(240101, 251231)) for _ in range(n)],
+        '规格型号': [p[1] for p in products],
+        '流入方组织': [rng.choice(ORGS) for _ in range(n)],
+        '客户分线': [rng.choice(LINES) for _ in range(n)],
+        '供货价': prices,
+        '流出方组织': [rng.choice(ORGS) for _ in range(n)],
+    })
+    total = {col: None for col in df.columns}
+    total['销售数量'] = int(df['销售数量'].sum())
+    total['金额'] = round(float(df['金额'].sum()), 2)
+    return pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+
+
+def make_redemption_frame(n, vocab, rng):
+    """客户原始兑付明细数据，列与原始导出一致"""
+    products = [rng.choice(vocab['products']) for _ in range(n)]
+    quantities = [rng.choice([10, 35, 60, 120, 300]) for _ in range(n)]
+    unit = [-rng.choice([3, 5]) for _ in range(n)]
+    amounts = [q * u for q, u in zip(quantities, unit)]
+    dates = random_dates(rng, n)
+    return pd.DataFrame({
+        '结算金额': 0.0,
+        '结束时间': '2025-05-31 00:00:00',
+        '业务日期': [d + ' 00:00:00' for d in dates],
+        '计算基准项': [-a for a in amounts],
+        '政策编号': 'FKLGCT2025007950000100001',
+        '三级公司客户编码': [f"E{rng.randrange(10**9):09d}X00001" for _ in range(n)],
+        '开始时间': '2025-05-06 00:00:00',
+        '业务量': [-a for a in amounts],
+        '单价': unit,
+        '三级公司客户名称': [rng.choice(vocab['customers']) for _ in range(n)],
+        '数量': quantities,
+        '细单编号': [f"FKLXBR{rng.randrange(10**9):09d}" for _ in range(n)],
+        '规格': [p[1] for p in products],
+        '本次结算金额': [-a for a in amounts],
+        '区域': None,
+        '商品名称': [p[0] for p in products],
+        '单据编号': [f"XSBFKL{rng.randrange(10**8):08d}" for _ in range(n)],
+        '金额': amounts,
+    })
+
+
+def make_plan_frame(n, vocab, rng):
+    """活动方案：标题 2 行、表头、空行、n 行数据、'进货单位：'页脚（header=None 时的原始版式）"""
+    header = ['产品名称', '剂型', '规格', '每件数量', '供货价', '建议零售价', '订货数量', '活动政策', '活动对象']
+    rows = [
+        ['    仲景宛西制药活动订单'] + [None] * 8,
+        ['活动时间：2025年5月6日-  5月 31日', None, None, None, '客户名称：', None, None, None, None],
+        header,
+        [None] * 9,
+    ]
+    products = vocab['products']
+    for i in range(n):
+        name, spec, price = products[i % len(products)]
+        if i >= len(products):
+            name = f"{name}{i // len(products)}"
+        rows.append([name, '浓缩丸', spec, '120盒', price, 0, None, rng.choice(POLICIES),
+                     '小连锁、单体店、社区、卫生室、门诊' if i == 0 else None])
+    rows.append(['进货单位：', None, None, None, '联系人：', None, None, '电话：', None])
+    return pd.DataFrame(rows)
+
+
+def generate(sizes, out_dir, seed=20250506):
+    """按各行数生成工作簿，返回 {行数: {文件名: 路径}}"""
+    vocab = load_vocabulary()
+    generated = {}
+    for size in sizes:
+        size_dir = os.path.join(out_dir, str(size))
+        os.makedirs(size_dir, exist_ok=True)
+        files = {
+            '仲景宛西.xlsx': (make_flow_frame, {}),
+            '客户原始兑付明细.xlsx': (make_redemption_frame, {}),
+            '活动方案.xlsx': (make_plan_frame, {'header': False}),
+        }
+        generated[size] = {}
+        for filename, (make_frame, options) in files.items():
+            path = os.path.join(size_dir, filename)
+            # 每个文件单独播种，已生成的文件直接复用（同一 seed 生成的内容相同）
+            if not os.path.exists(path):
+                print(f"生成 {path}（{size} 行）")
+                rng = random.Random(f"{seed}:{size}:{filename}")
+                make_frame(size, vocab, rng).to_excel(path, index=False, **options)
+            generated[size][filename] = path
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成基准测试用的合成 Excel 工作簿')
+    parser.add_argument('--sizes', default='10k,100k,1m', help='行数列表，例如 10k,100k,1m')
+    parser.add_argument('--out', default='bench_data', help='输出目录')
+    parser.add_argument('--seed', type=int, default=20250506)
+    args = parser.parse_args()
+    generate([parse_size(s) for s in args.sizes.split(',')], args.out, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""导入与查询基准测试
+
+    python bench_data.py --sizes 10k,100k
+    python benchmark.py --sizes 10k,100k --output bench_results/after.json --baseline bench_results/before.json
+
+在本机 MySQL 中新建独立的基准库（默认 jinxiaocun_bench，按 create_tables_simple.sql 建表），
+依次测量 import_excel_data、get_table_data 分页/排序/搜索、/api/output_results 和 /api/compare_join，
+结果写成 JSON。指定 --baseline 时与之前的结果比较，中位数变慢超过 --threshold 的项目记为回归，退出码为 1。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import mysql.connector
+import database_config
+from bench_data import generate, parse_size
+
+# 各数据文件对应的表，按导入顺序排列（先导入活动方案，流向物化时才有政策规则）
+BENCH_FILES = [
+    ('活动方案.xlsx', 'activity_plan'),
+    ('客户原始兑付明细.xlsx', 'customer_redemption_details'),
+    ('仲景宛西.xlsx', 'customer_flow'),
+]
+# 中位数低于该秒数的差异视为噪声，不记为回归
+NOISE_FLOOR = 0.005
+
+
+def sql_statements(path, database):
+    """读取建表脚本并拆分为语句，库名替换为基准库"""
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    script = ''.join(lines).replace('jinxiaocun_db', database)
+    return [stmt.strip() for stmt in script.split(';') if stmt.strip()]
+
+
+def prepare_database(database):
+    """重建基准库"""
+    if database == database_config.MYSQL_CONFIG.get('database'):
+        raise SystemExit(f"基准库不能与业务库同名: {database}")
+    config = database_config.get_connection_config()
+    config.pop('database', None)
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    for stmt in sql_statements('create_tables_simple.sql', database):
+        cursor.execute(stmt)
+    cursor.execute("SELECT VERSION()")
+    version = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    conn.close()
+    # 之后所有 create_connection() 以及压测启动的应用进程都连接基准库
+    os.environ['JXC_DB_NAME'] = database
+    return version
+
+
+def measure(fn, repeat):
+    """执行 repeat 次，返回每次耗时和最后一次的返回值"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def summarize(name, size, times, **extra):
+    entry = {
+        'name': name,
+        'size': size,
+        'repeat': len(times),
+        'times': [round(t, 4) for t in times],
+        'min': round(min(times), 4),
+        'median': round(statistics.median(times), 4),
+        'mean': round(statistics.mean(times), 4),
+        'max': round(max(times), 4),
+    }
+    entry.update(extra)
+    print(f"  {name:<40} median {entry['median']:>9.4f}s  min {entry['min']:>9.4f}s")
+    return entry
+
+
+def run_size(size, files, repeat):
+    """对一个数据规模执行全部基准项"""
+    # 基准库已在 prepare_database 中切换好后再导入业务模块
+    from data_import import create_connection, import_excel_data
+    import web_import
+
+    results = []
+    client = web_import.app.test_client()
+    print(f"== {size} 行 ==")
+
+    for filename, table_name in BENCH_FILES:
+        def run_import():
+            conn = create_connection()
+            try:
+                return import_excel_data(files[filename], table_name, conn)
+            finally:
+                conn.close()
+        times, run = measure(run_import, repeat)
+        if run['状态'] != 'success':
+            raise SystemExit(f"导入 {filename} 失败: {run['错误信息']}")
+        results.append(summarize(f"import_excel_data[{table_name}]", size, times,
+                                 rows=run['导入行数'], stages=json.loads(run['阶段耗时'])))
+
+    last_page = max(1, (size + 499) // 500)
+    queries = {
+        'get_table_data[first_page]': dict(page=1),
+        'get_table_data[last_page]': dict(page=last_page),
+        'get_table_data[sort_amount_desc]': dict(page=1, sort_field='金额', sort_order='DESC'),
+        'get_table_data[search]': dict(page=1, search_term='开州'),
+        'get_table_data[filter]': dict(page=1, filters={'客户分线': 'KA线'}),
+    }
+    for name, kwargs in queries.items():
+        times, result = measure(lambda: web_import.get_table_data('customer_flow', per_page=500, **kwargs), repeat)
+        results.append(summarize(name, size, times, rows=result['total_records'] if result else None))
+
+    requests = {
+        'api_output_results[first_page]': '/api/output_results?page=1&per_page=500',
+        'api_output_results[last_page]': f'/api/output_results?page={last_page}&per_page=500',
+        'api_output_results[search]': '/api/output_results?page=1&per_page=500&search=' + '地黄',
+    }
+    for name, url in requests.items():
+        times, response = measure(lambda: client.get(url), repeat)
+        if response.status_code != 200:
+            raise SystemExit(f"{url} 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        results.append(summarize(name, size, times, bytes=len(response.get_data())))
+
+    dbconf = database_config.get_connection_config()
+    payload = {
+        'tableA': 'customer_flow', 'tableB': 'activity_plan',
+        'keysA': ['物料名称'], 'keysB': ['产品名称'],
+        'dbconf': {'host': dbconf['host'], 'port': dbconf.get('port', 3306), 'user': dbconf['user'],
+                   'password': dbconf['password'], 'database': dbconf['database']},
+    }
+    times, response = measure(lambda: client.post('/api/compare_join', json=payload), repeat)
+    if response.status_code != 200:
+        raise SystemExit(f"/api/compare_join 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    results.append(summarize('api_compare_join[flow_x_plan]', size, times, bytes=len(response.get_data())))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """与基准结果比较，返回回归项列表"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['name'], r['size']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"== 与 {baseline_path} 比较（阈值 {threshold:.0%}）==")
+    for r in results:
+        old = baseline.get((r['name'], r['size']))
+        if not old:
+            continue
+        ratio = r['median'] / old['median'] if old['median'] else float('inf')
+        regressed = ratio > 1 + threshold and r['median'] - old['median'] > NOISE_FLOOR
+        flag = '回归' if regressed else ''
+        print(f"  {r['name']:<40} {r['size']:>8} {old['median']:>9.4f}s -> {r['median']:>9.4f}s  x{ratio:.2f} {flag}")
+        if regressed:
+            regressions.append({'name': r['name'], 'size': r['size'], 'before': old['median'],
+                                'after': r['median'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入与查询基准测试（需要本机 MySQL）')
+    parser.add_argument('--sizes', default='10k', help='数据规模，例如 10k,100k,1m')
+    parser.add_argument('--data-dir', default='bench_data', help='合成工作簿目录（不存在时自动生成）')
+    parser.add_argument('--database', default='jinxiaocun_bench', help='基准库名称，每次运行前重建')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数')
+    parser.add_argument('--output', default=None, help='结果 JSON 路径，默认 bench_results/<时间>.json')
+    parser.add_argument('--baseline', default=None, help='用于比较的历史结果 JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位数变慢超过该比例记为回归')
+    args = parser.parse_args()
+
+    os.environ.setdefault('JXC_LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('JXC_IMPORT_TRACEMALLOC', '0')
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    generated = generate(sizes, args.data_dir)
+    mysql_version = prepare_database(args.database)
+
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, generated[size], args.repeat))
+
+    output = args.output or os.path.join('bench_results', f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'mysql': mysql_version,
+            'sizes': sizes,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        report['regressions'] = compare(results, args.baseline, args.threshold)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
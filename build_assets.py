@@ -0,0 +1,77 @@
+"""构建静态资源：文件名加内容哈希，并预先生成 gzip / brotli 压缩版本
+
+    python build_assets.py
+
+输出到 static/dist/：
+- <名称>.<哈希>.<扩展名>           原文件
+- <名称>.<哈希>.<扩展名>.gz / .br  文本类资源的压缩版本（未安装 brotli 时只生成 .gz）
+- manifest.json                    {原文件名: 带哈希的文件名}
+页面通过 assets.asset_url() 引用带哈希的地址，文件内容变化后地址随之变化，因此可以长期缓存。
+打包（PyInstaller）或部署前执行一次即可；未构建时页面自动回退到 /static/ 原文件。
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = 'static'
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+# 页面本身（web_compare.html）按 ETag 协商缓存，不参与指纹化
+SKIP_FILES = {'web_compare.html'}
+# 只压缩文本类资源，图片本身已经压缩过
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.svg', '.json', '.txt'}
+HASH_LENGTH = 10
+
+
+def fingerprint_name(filename, content):
+    base, ext = os.path.splitext(filename)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """生成指纹化、预压缩的资源和 manifest，返回 manifest"""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+    manifest = {}
+    for filename in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, filename)
+        if filename in SKIP_FILES or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            content = f.read()
+        hashed = fingerprint_name(filename, content)
+        target = os.path.join(dist_dir, hashed)
+        with open(target, 'wb') as f:
+            f.write(content)
+        sizes = [f"原始 {len(content)}"]
+        if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            # mtime=0 保证相同内容生成相同的 .gz
+            gz = gzip.compress(content, compresslevel=9, mtime=0)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gz)
+            sizes.append(f"gzip {len(gz)}")
+            if brotli is not None:
+                br = brotli.compress(content, quality=11)
+                with open(target + '.br', 'wb') as f:
+                    f.write(br)
+                sizes.append(f"brotli {len(br)}")
+        manifest[filename] = hashed
+        print(f"{filename} -> {hashed}（{'，'.join(sizes)} 字节）")
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    if brotli is None:
+        print("未安装 brotli（pip install brotli），只生成了 gzip 版本", file=sys.stderr)
+    return manifest
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,168 @@
+import logging
+import re
+from output_materialize import describe_columns
+
+logger = logging.getLogger(__name__)
+
+# 批量增删改：一次请求中的新增、按 id 修改、删除在同一个事务中执行，只提交一次
+CHUNK_SIZE = 500
+
+_TABLE_NAME_RE = re.compile(r'^\w+$')
+
+
+class BulkMutationError(Exception):
+    """请求参数校验失败，results 为逐条结果（整个请求未执行）"""
+
+    def __init__(self, msg, results):
+        super().__init__(msg)
+        self.results = results
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _clean_values(data):
+    """把空字符串转为 None（与单行接口一致）"""
+    return {k: (None if isinstance(v, str) and v.strip() == '' else v) for k, v in data.items()}
+
+
+def _validate(columns, inserts, updates, deletes):
+    """逐条校验，返回 (results, 是否有错误)；字段名必须是表中已有字段"""
+    results = {'inserts': [], 'updates': [], 'deletes': []}
+    has_error = False
+
+    def check_data(data):
+        if not isinstance(data, dict) or not data:
+            return '数据为空'
+        unknown = [k for k in data if k not in columns or k == 'id']
+        if unknown:
+            return f"未知字段: {', '.join(map(str, unknown))}"
+        return None
+
+    for i, data in enumerate(inserts):
+        msg = check_data(data)
+        results['inserts'].append({'index': i, 'success': msg is None, 'msg': msg})
+        has_error = has_error or msg is not None
+    for i, item in enumerate(updates):
+        msg = None
+        if not isinstance(item, dict) or item.get('id') in (None, ''):
+            msg = '缺少 id'
+        else:
+            msg = check_data(item.get('data'))
+        results['updates'].append({'index': i, 'id': item.get('id') if isinstance(item, dict) else None,
+                                   'success': msg is None, 'msg': msg})
+        has_error = has_error or msg is not None
+    for i, row_id in enumerate(deletes):
+        msg = '缺少 id' if row_id in (None, '') or isinstance(row_id, (dict, list)) else None
+        results['deletes'].append({'index': i, 'id': row_id, 'success': msg is None, 'msg': msg})
+        has_error = has_error or msg is not None
+    return results, has_error
+
+
+def _existing_ids(cursor, table, ids):
+    """返回 ids 中表里存在的 id（字符串形式，前端传来的 id 可能是字符串）"""
+    existing = set()
+    for chunk in _chunks(list(dict.fromkeys(ids))):
+        cursor.execute(f"SELECT `id` FROM `{table}` WHERE `id` IN ({','.join(['%s'] * len(chunk))})", chunk)
+        existing.update(str(row[0]) for row in cursor.fetchall())
+    return existing
+
+
+def _insert_rows(cursor, table, inserts, results):
+    # 逐行 INSERT 并记录各自的 lastrowid：多行 INSERT 生成的自增 id 不一定连续
+    # （auto_increment_increment > 1 或 innodb_autoinc_lock_mode = 2 时），不能按首个 id 加偏移推算
+    inserted_ids = []
+    for i, data in enumerate(inserts):
+        fields = list(data)
+        cursor.execute(f"INSERT INTO `{table}` ({','.join(f'`{f}`' for f in fields)}) "
+                       f"VALUES ({','.join(['%s'] * len(fields))})", [data[f] for f in fields])
+        results[i]['id'] = cursor.lastrowid
+        inserted_ids.append(cursor.lastrowid)
+    return inserted_ids
+
+
+def _update_rows(cursor, table, updates, results, existing):
+    # 修改字段相同的行合并为一条 UPDATE ... SET 字段 = CASE id WHEN ... END WHERE id IN (...)
+    # 同一 id 的第 n 次修改放在第 n 轮执行，保证按请求中的顺序生效
+    groups = {}
+    seen = {}
+    for i, item in enumerate(updates):
+        key = str(item['id'])
+        if key not in existing:
+            results[i].update(success=False, msg='记录不存在')
+            continue
+        round_no = seen.get(key, 0)
+        seen[key] = round_no + 1
+        groups.setdefault((round_no, tuple(item['data'])), []).append(i)
+    updated_ids = []
+    for (_, fields), indexes in sorted(groups.items(), key=lambda g: g[0][0]):
+        for chunk in _chunks(indexes):
+            set_parts = []
+            params = []
+            for f in fields:
+                set_parts.append(f"`{f}` = CASE `id` {' '.join(['WHEN %s THEN %s'] * len(chunk))} END")
+                for i in chunk:
+                    params.extend([updates[i]['id'], updates[i]['data'][f]])
+            ids = [updates[i]['id'] for i in chunk]
+            params.extend(ids)
+            cursor.execute(f"UPDATE `{table}` SET {', '.join(set_parts)} "
+                           f"WHERE `id` IN ({','.join(['%s'] * len(chunk))})", params)
+            updated_ids.extend(ids)
+    return list(dict.fromkeys(updated_ids))
+
+
+def _delete_rows(cursor, table, deletes, results, existing):
+    ids = []
+    for i, row_id in enumerate(deletes):
+        if str(row_id) not in existing:
+            results[i].update(success=False, msg='记录不存在')
+        else:
+            ids.append(row_id)
+    for chunk in _chunks(ids):
+        cursor.execute(f"DELETE FROM `{table}` WHERE `id` IN ({','.join(['%s'] * len(chunk))})", chunk)
+    return ids
+
+
+def apply_bulk_mutation(connection, table, inserts=None, updates=None, deletes=None):
+    """在一个事务中执行批量新增、修改（按 id）和删除
+
+    - inserts: [{字段: 值}, ...]
+    - updates: [{'id': id, 'data': {字段: 值}}, ...]
+    - deletes: [id, ...]
+    返回 (逐条结果, 变化的 id 列表)。参数校验失败时抛出 BulkMutationError，不执行任何语句；
+    修改、删除的 id 不存在时该条结果为失败，其余照常执行；数据库出错时整体回滚并抛出异常。
+    """
+    if not _TABLE_NAME_RE.match(table or ''):
+        raise BulkMutationError(f"无效的表名: {table!r}", None)
+    inserts = [_clean_values(d) if isinstance(d, dict) else d for d in (inserts or [])]
+    updates = [dict(u, data=_clean_values(u['data'])) if isinstance(u, dict) and isinstance(u.get('data'), dict) else u
+               for u in (updates or [])]
+    deletes = list(deletes or [])
+
+    cursor = connection.cursor()
+    try:
+        columns = describe_columns(cursor, f"`{table}`")
+        results, has_error = _validate(columns, inserts, updates, deletes)
+        if has_error:
+            raise BulkMutationError('参数校验失败，未执行任何修改', results)
+
+        existing = _existing_ids(cursor, table, [u['id'] for u in updates] + deletes) if updates or deletes else set()
+        # 先删除再修改、新增，同一 id 既修改又删除时以删除为准
+        deleted_ids = _delete_rows(cursor, table, deletes, results['deletes'], existing)
+        existing -= {str(i) for i in deleted_ids}
+        updated_ids = _update_rows(cursor, table, updates, results['updates'], existing)
+        inserted_ids = _insert_rows(cursor, table, inserts, results['inserts'])
+        connection.commit()
+    except BulkMutationError:
+        raise
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    logger.info("批量修改 %s：新增 %s 行，修改 %s 行，删除 %s 行",
+                table, len(inserted_ids), len(updated_ids), len(deleted_ids))
+    return results, inserted_ids + updated_ids + deleted_ids
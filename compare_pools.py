@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import mysql.connector
+from metrics import register, Counter, Gauge, InstrumentedConnection, DB_CONNECT_SECONDS, DB_CONNECT_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# 比对页面按浏览器提交的 dbconf 连接任意数据库（表列表、左右表数据、联表比对），
+# 每次点击都新建连接要重新握手和认证。这里按连接参数保留一组空闲连接复用，
+# 并缓存各库的表结构（DESCRIBE 结果），同一个库上的连续操作不再重复建连和查询表结构。
+# 连接池个数有上限，超出时淘汰最久未使用的；空闲超过 IDLE_SECONDS 的连接关闭。
+MAX_POOLS = int(os.environ.get('JXC_COMPARE_POOLS', 8))
+POOL_SIZE = int(os.environ.get('JXC_COMPARE_POOL_SIZE', 4))
+IDLE_SECONDS = float(os.environ.get('JXC_COMPARE_POOL_IDLE_SECONDS', 300))
+SCHEMA_TTL_SECONDS = float(os.environ.get('JXC_COMPARE_SCHEMA_TTL', 60))
+# 空闲超过这么久的连接取出时先 ping 一次，服务端可能已经断开
+PING_AFTER_SECONDS = 30
+
+COMPARE_POOL_EVENTS = register(Counter(
+    'jxc_compare_pool_events_total', '比对连接池事件（reuse 复用、connect 新建、discard 丢弃、evict 淘汰）', ('event',)))
+COMPARE_POOL_IDLE = register(Gauge(
+    'jxc_compare_pool_idle_connections', '比对连接池中的空闲连接数'))
+
+
+def pool_key(dbconf):
+    """连接参数组成的键，密码只保留摘要"""
+    password = str(dbconf.get('password', ''))
+    return (
+        dbconf.get('host', 'localhost'),
+        int(dbconf.get('port', 3306)),
+        dbconf.get('user', 'root'),
+        hashlib.sha256(password.encode('utf-8')).hexdigest(),
+        dbconf.get('database', ''),
+    )
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception as e:
+        logger.debug("关闭比对连接失败: %s", e)
+
+
+class DbconfPool:
+    """同一组连接参数的空闲连接，后进先出（最近用过的连接最可能仍然有效）"""
+
+    def __init__(self, dbconf):
+        self.params = {
+            'host': dbconf.get('host', 'localhost'),
+            'port': int(dbconf.get('port', 3306)),
+            'user': dbconf.get('user', 'root'),
+            'password': dbconf.get('password', ''),
+            'database': dbconf.get('database', ''),
+        }
+        self.idle = []  # [(连接, 放回时间)]
+        self.schemas = {}  # 表名 -> (缓存时间, DESCRIBE 结果)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            # 比对接口只读，自动提交避免复用的连接停留在旧的一致性快照上
+            connection = mysql.connector.connect(autocommit=True, **self.params)
+        except Exception:
+            DB_CONNECT_ERRORS.inc()
+            raise
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
+        COMPARE_POOL_EVENTS.inc(event='connect')
+        return connection
+
+    def take_expired(self, now):
+        """移出空闲超时的连接并返回，由调用方在锁外关闭"""
+        expired = [conn for conn, since in self.idle if now - since > IDLE_SECONDS]
+        if expired:
+            self.idle = [(conn, since) for conn, since in self.idle if now - since <= IDLE_SECONDS]
+        return expired
+
+    def close_all(self):
+        for conn, _ in self.idle:
+            _close_quietly(conn)
+        count = len(self.idle)
+        self.idle = []
+        return count
+
+
+class CompareConnectionRegistry:
+    """按连接参数索引的连接池集合，最多 MAX_POOLS 个，按最近使用淘汰"""
+
+    def __init__(self, max_pools=MAX_POOLS, pool_size=POOL_SIZE):
+        self.max_pools = max_pools
+        self.pool_size = pool_size
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self, dbconf):
+        """取出（或创建）连接参数对应的池，调用方持有锁"""
+        key = pool_key(dbconf)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = DbconfPool(dbconf)
+            while len(self._pools) > self.max_pools:
+                _, evicted = self._pools.popitem(last=False)
+                closed = evicted.close_all()
+                COMPARE_POOL_EVENTS.inc(closed, event='evict')
+        self._pools.move_to_end(key)
+        return pool
+
+    def _update_idle_gauge(self):
+        COMPARE_POOL_IDLE.set(sum(len(pool.idle) for pool in self._pools.values()))
+
+    def acquire(self, dbconf):
+        """返回 (池, 连接)；优先复用空闲连接，没有时新建"""
+        now = time.monotonic()
+        with self._lock:
+            pool = self._pool(dbconf)
+            # 顺便清理所有池中空闲超时的连接（池个数有上限，遍历开销很小）
+            expired = [conn for each in self._pools.values() for conn in each.take_expired(now)]
+            candidates = []
+            while pool.idle:
+                candidates.append(pool.idle.pop())
+                if now - candidates[-1][1] <= PING_AFTER_SECONDS:
+                    break
+            self._update_idle_gauge()
+        for conn in expired:
+            _close_quietly(conn)
+        if expired:
+            COMPARE_POOL_EVENTS.inc(len(expired), event='discard')
+        # 在锁外 ping 和新建连接，避免一个慢库阻塞其他库
+        for i, (conn, since) in enumerate(candidates):
+            if now - since > PING_AFTER_SECONDS:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    _close_quietly(conn)
+                    COMPARE_POOL_EVENTS.inc(event='discard')
+                    continue
+            self._return_unused(pool, candidates[i + 1:])
+            COMPARE_POOL_EVENTS.inc(event='reuse')
+            return pool, conn
+        return pool, pool.connect()
+
+    def _return_unused(self, pool, entries):
+        if not entries:
+            return
+        with self._lock:
+            pool.idle.extend(reversed(entries))
+            self._update_idle_gauge()
+
+    def release(self, pool, conn, discard=False):
+        """用完的连接放回池中；出错、还有未读取的结果、池已满或已被淘汰时关闭"""
+        if getattr(conn, 'unread_result', False):
+            discard = True
+        with self._lock:
+            active = self._pools.get(pool_key(pool.params)) is pool
+            if not discard and active and len(pool.idle) < self.pool_size:
+                pool.idle.append((conn, time.monotonic()))
+                self._update_idle_gauge()
+                return
+        _close_quietly(conn)
+        COMPARE_POOL_EVENTS.inc(event='discard')
+
+    @contextmanager
+    def connection(self, dbconf):
+        """with registry.connection(dbconf) as conn: ...，执行出错的连接不放回"""
+        pool, conn = self.acquire(dbconf)
+        try:
+            yield InstrumentedConnection(conn)
+        except Exception:
+            self.release(pool, conn, discard=True)
+            raise
+        else:
+            self.release(pool, conn)
+
+    def describe(self, cursor, dbconf, table):
+        """表结构（DESCRIBE 结果），同一个库的同一张表在 SCHEMA_TTL_SECONDS 内只查询一次"""
+        now = time.monotonic()
+        with self._lock:
+            pool = self._pool(dbconf)
+            cached = pool.schemas.get(table)
+        if cached and now - cached[0] <= SCHEMA_TTL_SECONDS:
+            return cached[1]
+        cursor.execute(f"DESCRIBE `{table}`")
+        rows = [tuple(row) for row in cursor.fetchall()]
+        with self._lock:
+            pool.schemas[table] = (now, rows)
+        return rows
+
+    def invalidate_schema(self, dbconf=None, table=None):
+        """清除表结构缓存；不指定参数时清除全部。在出错处理中调用，参数格式不对时直接忽略，不掩盖原来的错误"""
+        if dbconf is not None:
+            if not isinstance(dbconf, dict):
+                return
+            try:
+                key = pool_key(dbconf)
+            except (TypeError, ValueError):
+                return
+        with self._lock:
+            pools = [self._pools.get(key)] if dbconf is not None else list(self._pools.values())
+            for pool in pools:
+                if pool is None:
+                    continue
+                if table is None:
+                    pool.schemas.clear()
+                else:
+                    pool.schemas.pop(table, None)
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            self._update_idle_gauge()
+        for pool in pools:
+            pool.close_all()
+
+
+compare_connections = CompareConnectionRegistry()
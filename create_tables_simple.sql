@@ -57,9 +57,12 @@ CREATE TABLE IF NOT EXISTS activity_plan (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 4. 输出结果表
+-- 流向ID非空的行由 customer_flow 物化生成（导入或编辑流向/活动方案时增量维护），
+-- 流向ID为空的行为手工导入的输出结果
 CREATE TABLE IF NOT EXISTS output_results (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    进货日期 DATETIME,
+    流向ID INT,
+    进货日期 VARCHAR(255),
     流入方编码 VARCHAR(255),
     流入方别名 VARCHAR(255),
     流入方名称 VARCHAR(255),
@@ -67,9 +70,10 @@ CREATE TABLE IF NOT EXISTS output_results (
     物料名称 VARCHAR(255),
     销售数量 INT,
     出库单价 DECIMAL(10,2),
-    活动政策 INT,
-    赠品金额 INT,
+    活动政策 VARCHAR(500),
+    赠品金额 DECIMAL(10,2),
     销售金额 DECIMAL(10,2),
+    金额 DECIMAL(10,2),
     流出方编码 VARCHAR(255),
     流出方名称 VARCHAR(255),
     批次 VARCHAR(255),
@@ -78,5 +82,125 @@ CREATE TABLE IF NOT EXISTS output_results (
     流入人代码 VARCHAR(255),
     流入人名称 VARCHAR(255),
     流入方组织 VARCHAR(255),
-    当期日期 DATE DEFAULT (CURRENT_DATE)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci; 
\ No newline at end of file
+    客户分线 VARCHAR(255),
+    供货价 DECIMAL(10,2),
+    流出方组织 VARCHAR(255),
+    当期日期 DATE DEFAULT (CURRENT_DATE),
+    INDEX idx_output_flow_id (流向ID),
+    INDEX idx_output_period (当期日期),
+    INDEX idx_output_product (物料名称)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 5. 活动政策规则表（导入活动方案时由活动政策文本编译生成）
+CREATE TABLE IF NOT EXISTS activity_policy_rules (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    产品名称 VARCHAR(255) NOT NULL,
+    规则类型 VARCHAR(32) NOT NULL,
+    门槛数量 INT,
+    返利金额 DECIMAL(10,2),
+    赠品数量 INT,
+    单价 DECIMAL(10,2),
+    活动政策 VARCHAR(500),
+    当期日期 DATE DEFAULT (CURRENT_DATE),
+    INDEX idx_policy_rules_product (产品名称)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- 6. 导入运行记录表（每次Excel导入的文件哈希、行数和各阶段耗时）
+CREATE TABLE IF NOT EXISTS import_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    表名 VARCHAR(64) NOT NULL,
+    文件名 VARCHAR(255),
+    文件哈希 CHAR(64),
+    文件大小 BIGINT,
+    读取行数 INT,
+    删除行数 INT,
+    导入行数 INT,
+    状态 VARCHAR(16) NOT NULL,
+    错误信息 TEXT,
+    总耗时 DECIMAL(10,3),
+    CPU耗时 DECIMAL(10,3),
+    峰值内存MB DECIMAL(10,2),
+    每秒行数 DECIMAL(12,1),
+    阶段耗时 TEXT,
+    性能分析文件 VARCHAR(255),
+    开始时间 DATETIME,
+    结束时间 DATETIME,
+    INDEX idx_import_runs_started (开始时间),
+    INDEX idx_import_runs_table (表名)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- 7. 后台任务表（按条件删除、导出等耗时操作的状态和进度）
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    类型 VARCHAR(32) NOT NULL,
+    参数 TEXT,
+    参数键 CHAR(40),
+    状态 VARCHAR(16) NOT NULL,
+    已完成 BIGINT DEFAULT 0,
+    总数 BIGINT,
+    进度说明 VARCHAR(255),
+    结果 TEXT,
+    错误信息 TEXT,
+    创建时间 DATETIME,
+    开始时间 DATETIME,
+    结束时间 DATETIME,
+    更新时间 DATETIME,
+    INDEX idx_jobs_created (创建时间),
+    INDEX idx_jobs_type_key (类型, 参数键)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- 8. 流向日汇总表（由 customer_flow 按当期日期增量维护，/api/aggregate 优先读取）
+CREATE TABLE IF NOT EXISTS customer_flow_daily (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    当期日期 DATE,
+    进货日期 DATE,
+    物料名称 VARCHAR(255),
+    流入方名称 VARCHAR(255),
+    流出方组织 VARCHAR(255),
+    行数 INT NOT NULL,
+    销售数量 BIGINT,
+    金额 DECIMAL(16,2),
+    INDEX idx_flow_daily_period (当期日期),
+    INDEX idx_flow_daily_date (进货日期),
+    INDEX idx_flow_daily_product (物料名称)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- 9. 对账结果表（流向与兑付明细按当期日期对账，/api/reconcile 生成）
+CREATE TABLE IF NOT EXISTS reconcile_results (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    当期日期 DATE NOT NULL,
+    任务ID INT,
+    状态 VARCHAR(16) NOT NULL,
+    流向ID INT,
+    兑付ID INT,
+    客户名称 VARCHAR(255),
+    产品名称 VARCHAR(255),
+    批号 VARCHAR(255),
+    流向日期 DATE,
+    兑付日期 DATE,
+    流向金额 DECIMAL(14,2),
+    兑付金额 DECIMAL(14,2),
+    日期差 INT,
+    金额差 DECIMAL(14,2),
+    INDEX idx_reconcile_period_status (当期日期, 状态),
+    INDEX idx_reconcile_job (任务ID)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- 10. 客户名称映射表（流向客户名称 -> 兑付明细客户名称，导入后增量维护，比对页面模糊关联使用）
+CREATE TABLE IF NOT EXISTS customer_name_index (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    来源 VARCHAR(16) NOT NULL,
+    名称 VARCHAR(255) NOT NULL,
+    规范名称 VARCHAR(255),
+    匹配名称 VARCHAR(255),
+    相似度 DECIMAL(5,3),
+    匹配方式 VARCHAR(16),
+    更新时间 DATETIME,
+    UNIQUE KEY uk_name_index_source_name (来源, 名称),
+    INDEX idx_name_index_match (匹配名称)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
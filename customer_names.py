@@ -0,0 +1,256 @@
+import logging
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from mysql.connector import Error
+from schema import create_table_sql
+
+logger = logging.getLogger(__name__)
+
+# 客户名称映射：流向的 流入方名称 / 流入方别名 -> 兑付明细的 三级公司客户名称。
+# 名称先规范化（全角转半角、去空白和标点、去掉 有限公司 等组织形式），规范化后相同的直接对应；
+# 其余按字符二元组（bigram）倒排索引分块，只与共享少见 bigram 的候选名称计算相似度，不做两两比较。
+# 映射保存在 customer_name_index 表中，导入后只为新出现的名称计算，联表比对时直接使用。
+INDEX_TABLE = 'customer_name_index'
+FLOW_TABLE = 'customer_flow'
+REDEMPTION_TABLE = 'customer_redemption_details'
+FLOW_NAME_FIELDS = ('流入方名称', '流入方别名')
+REDEMPTION_NAME_FIELD = '三级公司客户名称'
+SOURCE_FLOW = 'flow'
+SOURCE_REDEMPTION = 'redemption'
+
+MATCH_EXACT = 'exact'
+MATCH_NORMALIZED = 'normalized'
+MATCH_FUZZY = 'fuzzy'
+MATCH_NONE = 'none'
+MATCH_TYPES = (MATCH_EXACT, MATCH_NORMALIZED, MATCH_FUZZY, MATCH_NONE)
+
+# 相似度（bigram 的 Dice 系数）不低于该值时认为是同一客户
+FUZZY_THRESHOLD = 0.8
+# 出现在超过这么多个名称中的 bigram（如 重庆、药房）不参与分块
+BLOCK_MAX_NAMES = 200
+# 每个名称最多对共享 bigram 最多的这么多个候选计算相似度
+MAX_CANDIDATES = 20
+INSERT_CHUNK_SIZE = 2000
+
+# 组织形式，规范化时去掉（按长度从长到短匹配）
+LEGAL_FORMS = ('股份有限公司', '有限责任公司', '有限公司', '(个人独资)', '(普通合伙)', '(有限合伙)')
+PUNCTUATION_RE = re.compile(r"[\s·•.,;:，。；：、\-_/\\'\"“”‘’()\[\]【】{}]+")
+# 流入方别名形如 "某某卫生室_联系人"，下划线后为联系人或编号
+ALIAS_SUFFIX_RE = re.compile(r'_[^_]*$')
+
+CREATE_INDEX_SQL = create_table_sql(INDEX_TABLE)
+
+_table_checked = False
+
+
+def ensure_index_table(connection):
+    global _table_checked
+    if _table_checked:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CREATE_INDEX_SQL)
+        connection.commit()
+        _table_checked = True
+    finally:
+        cursor.close()
+
+
+def normalize_name(name):
+    """规范化客户名称：全角转半角、小写、去掉联系人后缀、组织形式、空白和标点"""
+    if name is None:
+        return ''
+    text = unicodedata.normalize('NFKC', str(name)).strip().lower()
+    text = ALIAS_SUFFIX_RE.sub('', text)
+    text = re.sub(r'\s+', '', text)
+    for form in LEGAL_FORMS:
+        text = text.replace(form, '')
+    if text.endswith('公司') and len(text) > 4:
+        text = text[:-2]
+    return PUNCTUATION_RE.sub('', text)
+
+
+def collation_key(name):
+    """名称在 utf8mb4_unicode_ci 下的等价形式：全半角、大小写、重音不同以及末尾空格都视为相同。
+
+    映射表 (来源, 名称) 的唯一键按该排序规则比较，内存中按这个形式去重，
+    否则只有大小写或全半角不同的名称会互相覆盖，且每次导入都被当作新名称重新计算。
+    """
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return unicodedata.normalize('NFKC', text).casefold().rstrip(' ')
+
+
+def _by_key(names):
+    """{collation_key: 名称}，等价的名称只保留排序最前的一个"""
+    result = {}
+    for name in sorted(names):
+        result.setdefault(collation_key(name), name)
+    return result
+
+
+def bigrams(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class NameMatcher:
+    """目标名称（兑付明细客户名称）的规范化索引和 bigram 倒排索引"""
+
+    def __init__(self, target_names):
+        self.exact = set()
+        self.by_normalized = {}
+        self.grams = {}
+        self.postings = {}
+        for name in target_names:
+            if not name or name in self.exact:
+                continue
+            self.exact.add(name)
+            normalized = normalize_name(name)
+            if not normalized or normalized in self.by_normalized:
+                continue
+            self.by_normalized[normalized] = name
+            grams = bigrams(normalized)
+            self.grams[normalized] = grams
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(normalized)
+
+    def candidates(self, grams):
+        """共享少见 bigram 的候选规范名称，按共享个数从多到少"""
+        counts = Counter()
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting and len(posting) <= BLOCK_MAX_NAMES:
+                counts.update(posting)
+        return [normalized for normalized, _ in counts.most_common(MAX_CANDIDATES)]
+
+    def match(self, name):
+        """返回 (规范名称, 匹配名称, 相似度, 匹配方式)"""
+        normalized = normalize_name(name)
+        if name in self.exact:
+            return normalized, name, 1.0, MATCH_EXACT
+        if normalized in self.by_normalized:
+            return normalized, self.by_normalized[normalized], 1.0, MATCH_NORMALIZED
+        grams = bigrams(normalized)
+        best_score, best = 0.0, None
+        for candidate in self.candidates(grams):
+            score = dice(grams, self.grams[candidate])
+            # 相同分数时取长度更接近的
+            if score > best_score or (score == best_score and best is not None
+                                      and abs(len(candidate) - len(normalized)) < abs(len(best) - len(normalized))):
+                best_score, best = score, candidate
+        if best is not None and best_score >= FUZZY_THRESHOLD:
+            return normalized, self.by_normalized[best], round(best_score, 3), MATCH_FUZZY
+        return normalized, None, round(best_score, 3) if best else None, MATCH_NONE
+
+
+def _distinct_names(cursor, table_name, fields):
+    names = set()
+    for field in fields:
+        cursor.execute(f"SELECT DISTINCT `{field}` FROM {table_name} WHERE `{field}` IS NOT NULL AND `{field}` <> ''")
+        names.update(str(row[0]).strip() for row in cursor.fetchall())
+    names.discard('')
+    return names
+
+
+def _upsert(cursor, rows):
+    sql = (f"INSERT INTO {INDEX_TABLE} (来源, 名称, 规范名称, 匹配名称, 相似度, 匹配方式, 更新时间) "
+           "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+           "ON DUPLICATE KEY UPDATE 规范名称 = VALUES(规范名称), 匹配名称 = VALUES(匹配名称), "
+           "相似度 = VALUES(相似度), 匹配方式 = VALUES(匹配方式), 更新时间 = VALUES(更新时间)")
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        cursor.executemany(sql, rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def refresh_name_index(connection, full=False):
+    """增量更新客户名称映射，返回各匹配方式的新计算个数
+
+    只为新出现的流向客户名称计算映射；兑付明细出现新客户名称时，之前没有匹配上的流向名称也重新计算。
+    full=True 时清空后全部重新计算。
+    """
+    ensure_index_table(connection)
+    now = datetime.now()
+    cursor = connection.cursor()
+    try:
+        if full:
+            cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+        # 已有映射和源表名称都按 collation_key 对应，与唯一键的比较方式一致
+        cursor.execute(f"SELECT 来源, 名称, 匹配方式 FROM {INDEX_TABLE}")
+        known = {SOURCE_FLOW: {}, SOURCE_REDEMPTION: {}}
+        for source, name, match_type in cursor.fetchall():
+            known.setdefault(source, {})[collation_key(name)] = (name, match_type)
+
+        target_names = _by_key(_distinct_names(cursor, REDEMPTION_TABLE, [REDEMPTION_NAME_FIELD]))
+        new_targets = {key: name for key, name in target_names.items() if key not in known[SOURCE_REDEMPTION]}
+        flow_names = _by_key(_distinct_names(cursor, FLOW_TABLE, FLOW_NAME_FIELDS))
+        to_match = {key: name for key, name in flow_names.items() if key not in known[SOURCE_FLOW]}
+        if new_targets:
+            to_match.update({key: flow_names[key] for key, (_, match_type) in known[SOURCE_FLOW].items()
+                             if match_type == MATCH_NONE and key in flow_names})
+
+        matcher = NameMatcher(sorted({name for name, _ in known[SOURCE_REDEMPTION].values()} | set(target_names.values())))
+        rows = [(SOURCE_REDEMPTION, name, normalize_name(name), None, None, None, now)
+                for name in sorted(new_targets.values())]
+        stats = Counter()
+        for name in sorted(to_match.values()):
+            normalized, matched, score, match_type = matcher.match(name)
+            rows.append((SOURCE_FLOW, name, normalized, matched, score, match_type, now))
+            stats[match_type] += 1
+        _upsert(cursor, rows)
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    result = {'new_targets': len(new_targets), 'matched': len(to_match)}
+    result.update({match_type: stats[match_type] for match_type in MATCH_TYPES})
+    logger.info("客户名称映射更新完成: %s", result)
+    return result
+
+
+def list_name_index(connection, match_type=None, search=None, page=1, per_page=500):
+    """分页读取流向客户名称的映射，返回 (总数, 行列表)"""
+    ensure_index_table(connection)
+    conditions, params = ["来源 = %s"], [SOURCE_FLOW]
+    if match_type:
+        conditions.append("匹配方式 = %s")
+        params.append(match_type)
+    if search:
+        conditions.append("(名称 LIKE %s OR 匹配名称 LIKE %s)")
+        params.extend([f"%{search}%"] * 2)
+    where = "WHERE " + " AND ".join(conditions)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT COUNT(*) AS total FROM {INDEX_TABLE} {where}", params)
+        total = cursor.fetchone()['total']
+        cursor.execute(f"SELECT 名称, 规范名称, 匹配名称, 相似度, 匹配方式 FROM {INDEX_TABLE} {where} "
+                       "ORDER BY 匹配方式, 相似度 DESC, id LIMIT %s OFFSET %s", params + [per_page, (page - 1) * per_page])
+        return total, cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def has_name_index(cursor):
+    """当前库是否已有客户名称映射表（联表比对可能连接其他库）"""
+    cursor.execute("SHOW TABLES LIKE %s", (INDEX_TABLE,))
+    return bool(cursor.fetchall())
+
+
+def name_join_pair(keys_a, keys_b):
+    """关联键中第一组 流向客户名称 - 兑付客户名称，返回 (下标, 流向一侧 'A' 或 'B')，没有时返回 None"""
+    for i, (key_a, key_b) in enumerate(zip(keys_a, keys_b)):
+        if key_a in FLOW_NAME_FIELDS and key_b == REDEMPTION_NAME_FIELD:
+            return i, 'A'
+        if key_b in FLOW_NAME_FIELDS and key_a == REDEMPTION_NAME_FIELD:
+            return i, 'B'
+    return None
@@ -1,19 +1,43 @@
-import pandas as pd
+import logging
 import mysql.connector
 from mysql.connector import Error
 import os
+import time
 from datetime import datetime, date
 from database_config import get_connection_config, test_connection
+from table_changes import notify_table_changed
+from table_versions import bump_table_version
+from output_materialize import ensure_output_results_schema
+from log_config import setup_logging, sampled, reset_sampled
+from metrics import InstrumentedConnection, DB_CONNECT_SECONDS, DB_CONNECT_ERRORS
+from import_runs import ImportProfiler, record_import_run
+
+logger = logging.getLogger(__name__)
+
+# pandas（连同 openpyxl、xlrd）导入较慢，打包后的程序更明显；只在真正导入 Excel 时加载，
+# 服务启动和普通查询不需要
+pd = None
+
+def load_pandas():
+    global pd
+    if pd is None:
+        import pandas
+        pd = pandas
+    return pd
 
 def create_connection():
     """创建数据库连接"""
+    start = time.perf_counter()
     try:
         config = get_connection_config()
         connection = mysql.connector.connect(**config)
-        print("数据库连接成功")
-        return connection
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
+        logger.debug("数据库连接成功")
+        # 包装后的连接记录每条 SQL 的耗时和行数（/metrics）
+        return InstrumentedConnection(connection)
     except Error as e:
-        print(f"数据库连接失败: {e}")
+        DB_CONNECT_ERRORS.inc()
+        logger.error("数据库连接失败: %s", e)
         return None
 
 def check_table_structure(connection, table_name):
@@ -22,13 +46,13 @@ def check_table_structure(connection, table_name):
         cursor = connection.cursor()
         cursor.execute(f"DESCRIBE {table_name}")
         columns = cursor.fetchall()
-        print(f"\n=== {table_name} 表结构 ===")
+        logger.debug("=== %s 表结构 ===", table_name)
         for col in columns:
-            print(f"字段: {col[0]}, 类型: {col[1]}, 允许NULL: {col[2]}, 键: {col[3]}, 默认值: {col[4]}, 额外: {col[5]}")
+            logger.debug("字段: %s, 类型: %s, 允许NULL: %s, 键: %s, 默认值: %s, 额外: %s", col[0], col[1], col[2], col[3], col[4], col[5])
         cursor.close()
         return [col[0] for col in columns if col[0] != 'id']
     except Error as e:
-        print(f"检查表结构失败: {e}")
+        logger.error("检查表结构失败: %s", e)
         return []
 
 def clean_data_value(value, column_name):
@@ -87,6 +111,48 @@ def clean_data_value(value, column_name):
         # 文本列，直接返回
         return value_str
 
+def clean_categorical(series, column_name):
+    """清洗 category 列：每个不同取值只清洗一次，再按编码展开（结果与逐个清洗相同）"""
+    lookup = [clean_data_value(v, column_name) for v in series.cat.categories]
+    # 编码 -1 表示空值，对应列表最后一项
+    lookup.append(clean_data_value(None, column_name))
+    return pd.Series([lookup[code] for code in series.cat.codes], index=series.index, dtype=object)
+
+# 文本列不同取值占非空行数的比例不超过该值时转为 category
+CATEGORY_MAX_RATIO = 0.5
+
+def optimize_dtypes(df):
+    """压缩读取后的 DataFrame：重复较多的文本列转为 category，整数列降为能无损容纳的最窄类型
+
+    只做无损转换（清洗时得到的 Python 值与转换前完全相同），写入 MySQL 的数据不变。
+    返回 (df, {列名: {转换前类型、转换后类型、转换前KB、转换后KB}})。
+    """
+    report = {}
+    for col in df.columns:
+        series = df[col]
+        converted = series
+        if pd.api.types.is_bool_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+            pass
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            converted = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            # 小数列保持 float64：即使值能被 float32 精确表示，numpy.float32 转成字符串也可能与原来不同
+            pass
+        elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            non_null = series.dropna()
+            # 只转换全是字符串的列：混有数字时 1 与 1.0 会被合并为同一个类别
+            if (len(non_null) and pd.api.types.infer_dtype(non_null, skipna=True) == 'string'
+                    and non_null.nunique() <= len(non_null) * CATEGORY_MAX_RATIO):
+                converted = series.astype('category')
+        before_kb = series.memory_usage(index=False, deep=True) / 1024
+        after_kb = before_kb
+        if converted is not series:
+            df[col] = converted
+            after_kb = converted.memory_usage(index=False, deep=True) / 1024
+        report[col] = {'from': str(series.dtype), 'to': str(converted.dtype),
+                       'before_kb': round(before_kb, 1), 'after_kb': round(after_kb, 1)}
+    return df, report
+
 def clean_column_name(col, index):
     """清理列名，确保没有特殊字符"""
     if pd.isna(col) or col == '' or str(col).lower() == 'nan':
@@ -96,34 +162,50 @@ def clean_column_name(col, index):
         clean_col = str(col).replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '').replace('/', '_')
         return clean_col
 
-def import_excel_data(excel_file, table_name, connection):
-    """导入Excel数据到数据库表"""
+def import_excel_data(excel_file, table_name, connection, profile=False):
+    """导入Excel数据到数据库表
+
+    每次导入的行数和各阶段耗时写入 import_runs 表；profile=True 时额外保存 cProfile 结果。
+    返回导入运行记录（ImportProfiler.summary()）。
+    """
+    load_pandas()
+    profiler = ImportProfiler(table_name, excel_file, profile=profile)
+    # 行级日志采样按本次导入计数：每次导入都记录首行，并发导入同一张表时互不影响
+    sample_key = f"import_row:{table_name}:{id(profiler)}"
     try:
-        print(f"\n正在读取文件: {excel_file}")
+        logger.info("正在读取文件: %s", excel_file)
+        profiler.hash_file()
         
         # 获取今天的日期
         today = date.today()
-        print(f"今天日期: {today}")
+        logger.debug("今天日期: %s", today)
         
         # 删除今天日期的数据
         cursor = connection.cursor()
         delete_query = f"DELETE FROM {table_name} WHERE 当期日期 = %s"
+        if 'output_results' in table_name:
+            # 输出结果表中还有由流向表物化的行（流向ID非空），导入只替换手工导入的行
+            ensure_output_results_schema(connection)
+            delete_query += " AND 流向ID IS NULL"
         cursor.execute(delete_query, (today,))
         deleted_count = cursor.rowcount
         connection.commit()
-        print(f"已删除 {deleted_count} 条今天日期的数据")
+        logger.info("已删除 %s 条今天日期的数据", deleted_count)
+        profiler.counts['删除行数'] = deleted_count
+        profiler.mark('delete', rows=deleted_count)
         
         # 特殊处理活动方案表
         if 'activity_plan' in table_name:
-            print("检测到活动方案表，使用特殊处理...")
+            logger.debug("检测到活动方案表，使用特殊处理...")
             # 读取原始数据时，强制将流入方编码列作为字符串处理
             df_raw = pd.read_excel(excel_file, header=None, dtype={'流入方编码': str})
-            print(f"原始数据行数: {len(df_raw)}")
-            print(f"原始数据列数: {len(df_raw.columns)}")
+            profiler.mark('read_excel', rows=len(df_raw))
+            logger.debug("原始数据行数: %s", len(df_raw))
+            logger.debug("原始数据列数: %s", len(df_raw.columns))
             
             # 获取第3行作为列名（索引为4）
             column_names = df_raw.iloc[2].tolist()
-            print(f"原始列名: {column_names}")
+            logger.debug("原始列名: %s", column_names)
             
             # 从第5行开始读取数据（索引从4开始），但需要检查是否遇到"进货单位"
             start_row = 4
@@ -135,12 +217,12 @@ def import_excel_data(excel_file, table_name, connection):
                 # 检查这一行是否包含"进货单位"
                 if any('进货单位' in str(cell) for cell in row_data if pd.notna(cell)):
                     end_row = i
-                    print(f"在第{i+1}行发现'进货单位'，停止读取数据")
+                    logger.info("在第%s行发现'进货单位'，停止读取数据", i+1)
                     break
             
             # 读取指定范围的数据
             df = df_raw.iloc[start_row:end_row].copy()
-            print(f"数据行数: {len(df)}")
+            logger.debug("数据行数: %s", len(df))
             
             # 设置列名
             df.columns = column_names
@@ -151,7 +233,8 @@ def import_excel_data(excel_file, table_name, connection):
                 clean_columns.append(clean_column_name(col, i))
             
             df.columns = clean_columns
-            print(f"清理后列名: {list(df.columns)}")
+            logger.debug("清理后列名: %s", list(df.columns))
+            profiler.mark('footer_scan', rows=len(df))
             
         elif 'customer_redemption_details' in table_name:
             df = pd.read_excel(excel_file, dtype={'批号': str})
@@ -159,6 +242,7 @@ def import_excel_data(excel_file, table_name, connection):
             df.columns = [col.replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '') for col in df.columns]
             if '批号' not in df.columns:
                 df['批号'] = ''
+            profiler.mark('read_excel', rows=len(df))
 
         else:
             # 在导入数据时，强制将物料编码、流出方编码、出库单价、批次、金额列作为字符串处理
@@ -171,14 +255,16 @@ def import_excel_data(excel_file, table_name, connection):
                 df = pd.read_excel(excel_file, dtype={'流入方编码': str})
             # 清理列名
             df.columns = [col.replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '') for col in df.columns]
+            profiler.mark('read_excel', rows=len(df))
         
-        print(f"最终数据行数: {len(df)}")
-        print(f"最终数据列数: {len(df.columns)}")
-        print(f"最终列名: {list(df.columns)}")
+        profiler.counts['读取行数'] = len(df)
+        logger.debug("最终数据行数: %s", len(df))
+        logger.debug("最终数据列数: %s", len(df.columns))
+        logger.debug("最终列名: %s", list(df.columns))
         
         # 检查表结构
         table_columns = check_table_structure(connection, table_name)
-        print(f"数据库表字段: {table_columns}")
+        logger.debug("数据库表字段: %s", table_columns)
         
         # 检查列名是否匹配
         excel_columns = list(df.columns)
@@ -186,20 +272,35 @@ def import_excel_data(excel_file, table_name, connection):
         extra_columns = [col for col in table_columns if col not in excel_columns]
         
         if missing_columns:
-            print(f"警告: Excel中有但数据库表中没有的列: {missing_columns}")
+            logger.warning("Excel中有但数据库表中没有的列: %s", missing_columns)
         if extra_columns:
-            print(f"警告: 数据库表中有但Excel中没有的列: {extra_columns}")
+            logger.warning("数据库表中有但Excel中没有的列: %s", extra_columns)
         
         # 只使用数据库表中存在的列，并过滤掉无效列名
         valid_columns = [col for col in excel_columns if col in table_columns and str(col).lower() != 'nan' and col != '']
-        df = df[valid_columns]
+        df = df[valid_columns].copy()
+        
+        logger.debug("将使用的列: %s", valid_columns)
+        profiler.mark('check_columns')
         
-        print(f"将使用的列: {valid_columns}")
+        # 压缩内存：重复较多的文本列转为 category，数字列降为最窄类型
+        df, memory_report = optimize_dtypes(df)
+        before_mb = sum(r['before_kb'] for r in memory_report.values()) / 1024
+        after_mb = sum(r['after_kb'] for r in memory_report.values()) / 1024
+        logger.info("DataFrame 内存 %.1fMB -> %.1fMB", before_mb, after_mb)
+        for col, r in memory_report.items():
+            if r['from'] != r['to']:
+                logger.debug("列 %s: %s -> %s，%.1fKB -> %.1fKB", col, r['from'], r['to'], r['before_kb'], r['after_kb'])
+        profiler.mark('optimize_dtypes', rows=len(df), detail=memory_report)
         
-        # 清理数据
-        print("正在清理数据...")
+        # 清理数据（category 列每个不同取值只清洗一次）
+        logger.debug("正在清理数据...")
         for col in valid_columns:
-            df[col] = df[col].apply(lambda x: clean_data_value(x, col))
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = clean_categorical(df[col], col)
+            else:
+                df[col] = df[col].apply(lambda x: clean_data_value(x, col))
+        profiler.mark('clean_values', rows=len(df))
         
         # 准备插入数据
         cursor = connection.cursor()
@@ -210,10 +311,11 @@ def import_excel_data(excel_file, table_name, connection):
         placeholders = ', '.join(['%s'] * len(columns_with_date))
         insert_query = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
         
-        print(f"INSERT语句: {insert_query}")
+        logger.debug("INSERT语句: %s", insert_query)
         
         # 准备数据，包含当期日期
         data_to_insert = []
+        debug_rows = logger.isEnabledFor(logging.DEBUG)
         for idx, row in df.iterrows():
             row_data = []
             for col in valid_columns:
@@ -223,27 +325,47 @@ def import_excel_data(excel_file, table_name, connection):
             row_data.append(today)
             data_to_insert.append(row_data)
             
-            # 打印前几行数据用于调试
-            if idx < 3:
-                print(f"第{idx+1}行数据: {row_data}")
+            # 行级调试日志按采样记录（首行及此后每 10000 行），INFO 级别下不产生开销
+            if debug_rows and sampled(sample_key, every=10000):
+                logger.debug("第%s行数据: %s", idx+1, row_data)
+        profiler.mark('build_rows', rows=len(data_to_insert))
         
         # 执行批量插入
         cursor.executemany(insert_query, data_to_insert)
         connection.commit()
+        profiler.counts['导入行数'] = len(data_to_insert)
+        profiler.mark('insert', rows=len(data_to_insert))
         
-        print(f"成功导入 {len(df)} 行数据到表 {table_name}")
+        logger.info("成功导入 %s 行数据到表 %s", len(df), table_name)
         cursor.close()
+
+        # 维护派生数据：活动方案编译政策规则，流向表重新物化当天的输出结果
+        notify_table_changed(connection, table_name, days=[today])
+        profiler.mark('derived')
+        profiler.finish('success')
         
     except Error as e:
-        print(f"导入数据失败: {e}")
-        print(f"错误代码: {e.errno}")
-        print(f"错误消息: {e.msg}")
+        logger.error("导入数据失败: %s (错误代码: %s, 错误消息: %s)", e, e.errno, e.msg)
+        profiler.finish('failed', str(e))
     except Exception as e:
-        print(f"处理文件时出错: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("处理文件时出错: %s", e)
+        profiler.finish('failed', str(e))
+    reset_sampled(sample_key)
+
+    if connection is not None:
+        if profiler.status != 'success':
+            # 丢弃失败导入未提交的部分数据，避免随运行记录一起提交
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            # 删除当期旧数据已经提交，表数据可能已变化
+            bump_table_version(table_name)
+        record_import_run(connection, profiler)
+    return profiler.summary()
 
 def main():
+    setup_logging()
     print("=== 数据库连接测试 ===")
     if not test_connection():
         print("\n请先解决数据库连接问题，然后重新运行脚本。")
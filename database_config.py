@@ -1,6 +1,8 @@
 # 数据库连接配置
 # 请根据您的MySQL设置修改以下信息
 
+import os
+
 # MySQL连接配置
 MYSQL_CONFIG = {
     'host': 'localhost',        # 数据库主机地址
@@ -17,21 +19,36 @@ MYSQL_CONFIG = {
 # 'user': 'your_username',
 # 'password': 'your_password',
 
+# 环境变量覆盖（基准测试、压测或多实例部署时使用），未设置时使用上面的配置
+ENV_OVERRIDES = {
+    'host': 'JXC_DB_HOST',
+    'port': 'JXC_DB_PORT',
+    'user': 'JXC_DB_USER',
+    'password': 'JXC_DB_PASSWORD',
+    'database': 'JXC_DB_NAME',
+}
+
 def get_connection_config():
     """获取数据库连接配置"""
-    return MYSQL_CONFIG.copy()
+    config = MYSQL_CONFIG.copy()
+    for key, env_name in ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            config[key] = int(os.environ[env_name]) if key == 'port' else os.environ[env_name]
+    return config
 
 def test_connection():
     """测试数据库连接"""
     import mysql.connector
     from mysql.connector import Error
     
+    config = get_connection_config()
     try:
         # 先尝试不指定数据库连接
         connection = mysql.connector.connect(
-            host=MYSQL_CONFIG['host'],
-            user=MYSQL_CONFIG['user'],
-            password=MYSQL_CONFIG['password']
+            host=config['host'],
+            port=config.get('port', 3306),
+            user=config['user'],
+            password=config['password']
         )
         print("✅ 数据库连接成功！")
         
@@ -40,10 +57,10 @@ def test_connection():
         cursor.execute("SHOW DATABASES")
         databases = [db[0] for db in cursor.fetchall()]
         
-        if MYSQL_CONFIG['database'] in databases:
-            print(f"✅ 数据库 {MYSQL_CONFIG['database']} 已存在")
+        if config['database'] in databases:
+            print(f"✅ 数据库 {config['database']} 已存在")
         else:
-            print(f"⚠️  数据库 {MYSQL_CONFIG['database']} 不存在，将自动创建")
+            print(f"⚠️  数据库 {config['database']} 不存在，将自动创建")
         
         cursor.close()
         connection.close()
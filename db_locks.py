@@ -0,0 +1,28 @@
+import logging
+import os
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 跨进程互斥：MySQL 命名锁（GET_LOCK），用于首次读取时的全量物化、汇总等只应执行一次的重建。
+# 锁属于连接，连接断开时自动释放；多个工作进程、多台服务器连同一个库时同样有效
+REBUILD_LOCK_TIMEOUT = int(os.environ.get('JXC_REBUILD_LOCK_TIMEOUT', 120))
+
+
+@contextmanager
+def named_lock(connection, name, timeout=REBUILD_LOCK_TIMEOUT):
+    """with named_lock(conn, 'jxc_xxx') as acquired: ...；等待 timeout 秒仍未取得时 acquired 为 False"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+        acquired = cursor.fetchone()[0] == 1
+        if not acquired:
+            logger.warning("等待锁 %s 超过 %s 秒", name, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+                cursor.fetchone()
+    finally:
+        cursor.close()
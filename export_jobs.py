@@ -0,0 +1,125 @@
+import csv
+import logging
+import os
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 后台导出：按查询条件把表数据写成 xlsx / csv 文件，完成后通过下载地址获取；
+# 相同条件、表数据版本未变化时直接复用已生成的文件
+EXPORT_FOLDER = os.path.join('uploads', 'exports')
+EXPORT_RETENTION_HOURS = float(os.environ.get('JXC_EXPORT_RETENTION_HOURS', 24))
+EXPORT_FORMATS = ('xlsx', 'csv')
+FETCH_SIZE = 5000
+# 单个工作表最多写这么多行数据（Excel 上限 1048576 行，含表头）
+SHEET_MAX_ROWS = 1000000
+
+
+def export_path(job_id, fmt):
+    return os.path.join(EXPORT_FOLDER, f"export_{job_id}.{fmt}")
+
+
+def export_expired(path, now=None):
+    """文件不存在或超过保留时间"""
+    if not path or not os.path.exists(path):
+        return True
+    age = (now or time.time()) - os.path.getmtime(path)
+    return age > EXPORT_RETENTION_HOURS * 3600
+
+
+def cleanup_exports():
+    """删除超过保留时间的导出文件，返回删除个数"""
+    if not os.path.isdir(EXPORT_FOLDER):
+        return 0
+    now = time.time()
+    removed = 0
+    for name in os.listdir(EXPORT_FOLDER):
+        path = os.path.join(EXPORT_FOLDER, name)
+        if os.path.isfile(path) and export_expired(path, now):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning("删除过期导出文件失败 %s: %s", path, e)
+    if removed:
+        logger.info("已删除 %s 个过期导出文件", removed)
+    return removed
+
+
+def _iter_rows(cursor, fetch_size=FETCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _write_xlsx(path, fields, cursor, progress):
+    # write_only 模式逐行写入，不在内存中保留整个工作簿，比 DataFrame.to_excel 快得多
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = SHEET_MAX_ROWS
+    written = 0
+    for rows in _iter_rows(cursor):
+        for row in rows:
+            if sheet_rows >= SHEET_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append(fields)
+                sheet_rows = 0
+            sheet.append(list(row))
+            sheet_rows += 1
+        written += len(rows)
+        progress(written)
+    if sheet is None:
+        workbook.create_sheet('Sheet1').append(fields)
+    workbook.save(path)
+    return written
+
+
+def _write_csv(path, fields, cursor, progress):
+    written = 0
+    # utf-8-sig：Excel 直接打开不乱码
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for rows in _iter_rows(cursor):
+            writer.writerows(rows)
+            written += len(rows)
+            progress(written)
+    return written
+
+
+def write_export(connection, table_name, fields, where_clause, params, path, fmt='xlsx', progress=None, total=None):
+    """查询匹配的行并写入导出文件（先写临时文件，完成后改名），返回行数"""
+    select_exprs = []
+    for field in fields:
+        if field == '当期日期':
+            # %T 即 %H:%i:%s，避免与参数占位符 %s 冲突
+            select_exprs.append(f"DATE_FORMAT(`{field}`, '%Y-%m-%d %T')")
+        else:
+            select_exprs.append(f"`{field}`")
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT {', '.join(select_exprs)} FROM `{table_name}` {where_clause} ORDER BY `id`", params)
+        report = (lambda done: progress(done, total)) if progress else (lambda done: None)
+        writer = _write_xlsx if fmt == 'xlsx' else _write_csv
+        written = writer(tmp_path, list(fields), cursor, report)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    os.replace(tmp_path, path)
+    logger.info("导出 %s：%s 行，%s，耗时 %.1fs", table_name, written, os.path.basename(path),
+                time.perf_counter() - started)
+    return written
+
+
+def export_download_name(table_name, fmt, when=None):
+    return f"{table_name}_{(when or datetime.now()):%Y%m%d_%H%M%S}.{fmt}"
@@ -0,0 +1,71 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 按查询条件删除：先按主键顺序取出一批匹配行的 id，再按主键范围（并重新套用条件）删除，
+# 每批单独提交，避免一条大 DELETE 长时间持有锁
+DELETE_CHUNK_SIZE = 1000
+# 匹配行数不超过该值时在请求内直接删除，否则转为后台任务
+SYNC_DELETE_LIMIT = 5000
+# 派生数据（输出结果、流向日汇总）每删除这么多批维护一次，而不是每批都维护：
+# 同一当期日期的行分散在多批中，每批都维护会反复重建同一天的汇总
+NOTIFY_EVERY_CHUNKS = 20
+
+
+def _and_condition(where_clause, condition):
+    return f"{where_clause} AND {condition}" if where_clause else f"WHERE {condition}"
+
+
+def count_matching(connection, table_name, where_clause, params):
+    """匹配条件的行数（删除前的预览）"""
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM `{table_name}` {where_clause}", params)
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+
+def delete_matching(connection, table_name, where_clause, params, chunk_size=DELETE_CHUNK_SIZE,
+                    on_deleted=None, progress=None, total=None):
+    """分批删除匹配条件的行，返回删除行数
+
+    on_deleted(ids): 每 NOTIFY_EVERY_CHUNKS 批以及结束时（包括中途出错）用累计的已提交 id 调用一次（维护派生数据）
+    progress(done, total): 每批提交后调用（报告进度）
+    """
+    cursor = connection.cursor()
+    deleted = 0
+    last_id = None
+    pending_ids = []
+    pending_chunks = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            select_where = where_clause if last_id is None else _and_condition(where_clause, "`id` > %s")
+            select_params = list(params) + ([] if last_id is None else [last_id])
+            cursor.execute(f"SELECT `id` FROM `{table_name}` {select_where} ORDER BY `id` LIMIT {int(chunk_size)}",
+                           select_params)
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            # 主键范围内重新套用条件，期间被修改为不再匹配的行不会被误删
+            cursor.execute(f"DELETE FROM `{table_name}` {_and_condition(where_clause, '`id` BETWEEN %s AND %s')}",
+                           list(params) + [ids[0], ids[-1]])
+            deleted += cursor.rowcount
+            connection.commit()
+            last_id = ids[-1]
+            pending_ids.extend(ids)
+            pending_chunks += 1
+            if on_deleted is not None and pending_chunks >= NOTIFY_EVERY_CHUNKS:
+                on_deleted(pending_ids)
+                pending_ids, pending_chunks = [], 0
+            if progress is not None:
+                progress(deleted, total)
+            if len(ids) < chunk_size:
+                break
+    finally:
+        cursor.close()
+        if on_deleted is not None and pending_ids:
+            on_deleted(pending_ids)
+    logger.info("按条件删除 %s：%s 行，耗时 %.1fs", table_name, deleted, time.perf_counter() - started)
+    return deleted
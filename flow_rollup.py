@@ -0,0 +1,305 @@
+import logging
+import os
+from datetime import datetime
+from mysql.connector import Error
+from output_materialize import describe_columns, OUTPUT_TABLE, SOURCE_TABLE
+from db_locks import named_lock
+from schema import create_table_sql
+
+logger = logging.getLogger(__name__)
+
+# 流向日汇总：按 当期日期 × 进货日期（天）× 物料名称 × 流入方名称 × 流出方组织 汇总行数、销售数量、金额。
+# 导入按 当期日期 整批替换，汇总表同样按 当期日期 分批重建；按月汇总由日汇总再聚合得到。
+ROLLUP_TABLE = 'customer_flow_daily'
+ROLLUP_DATE_FIELD = '进货日期'
+# 首次全量汇总的命名锁
+ROLLUP_LOCK = 'jxc_flow_rollup_build'
+ROLLUP_DIMENSIONS = ('物料名称', '流入方名称', '流出方组织')
+# 源表的进货日期是文本（2025-05-06、2025/5/6、2025-05-06 00:00:00 等），取第一段、斜杠换成横杠后转为 DATE，
+# 无法识别时为 NULL。建汇总表和直接查询源表用同一个表达式，两条路径的分天、分月结果一致（与 parse_day 规则相同）
+SOURCE_DAY_EXPR = f"CAST(REPLACE(SUBSTRING_INDEX(TRIM(`{ROLLUP_DATE_FIELD}`), ' ', 1), '/', '-') AS DATE)"
+ROLLUP_MEASURES = ('销售数量', '金额')
+INSERT_CHUNK_SIZE = 2000
+
+# /api/aggregate：不能用汇总表回答时直接在源表上 GROUP BY，限制分组数和执行时间
+AGGREGATE_DEFAULT_LIMIT = 1000
+AGGREGATE_MAX_GROUPS = 10000
+AGGREGATE_TIMEOUT_MS = int(os.environ.get('JXC_AGGREGATE_TIMEOUT_MS', 30000))
+# period: (输出列名, DATE_FORMAT 格式)
+PERIOD_FORMATS = {'day': ('日期', '%Y-%m-%d'), 'month': ('月份', '%Y-%m')}
+NUMERIC_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint', 'decimal', 'float', 'double')
+
+ROLLUP_DDL = create_table_sql(ROLLUP_TABLE)
+
+# 每个进程只建一次表
+schema_checked = False
+
+
+class AggregateError(ValueError):
+    """/api/aggregate 参数错误"""
+
+
+def ensure_rollup_schema(connection):
+    global schema_checked
+    if schema_checked:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute(ROLLUP_DDL)
+        connection.commit()
+        schema_checked = True
+    finally:
+        cursor.close()
+
+
+def parse_day(value):
+    """进货日期（文本，如 2025-05-06、2025/5/6 或 2025-05-06 00:00:00）转为日期，无法识别时返回 None"""
+    if value is None:
+        return None
+    if hasattr(value, 'year'):
+        return value
+    parts = str(value).split()
+    if not parts:
+        return None
+    text = parts[0].replace('/', '-')
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def refresh_rollup_days(connection, days=None):
+    """重建指定当期日期的日汇总；days 为 None 时全量重建，days 中的 None 表示当期日期为空的行，返回写入的汇总行数"""
+    ensure_rollup_schema(connection)
+    columns = ['当期日期', ROLLUP_DATE_FIELD] + list(ROLLUP_DIMENSIONS) + ['行数'] + list(ROLLUP_MEASURES)
+    group_exprs = ['当期日期', SOURCE_DAY_EXPR] + [f"`{d}`" for d in ROLLUP_DIMENSIONS]
+    select_sql = ', '.join(group_exprs + ['COUNT(*)'] + [f"SUM(`{m}`)" for m in ROLLUP_MEASURES])
+    insert_sql = (f"INSERT INTO {ROLLUP_TABLE} ({', '.join(f'`{c}`' for c in columns)}) "
+                  f"VALUES ({', '.join(['%s'] * len(columns))})")
+
+    cursor = connection.cursor()
+    try:
+        if days is None:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+            where_sql, params = "", []
+        else:
+            # None 表示当期日期为空的行（IN 匹配不到 NULL，单独加条件）
+            include_null = None in days
+            days = sorted({d for d in days if d is not None})
+            if not days and not include_null:
+                return 0
+            conditions = [f"当期日期 IN ({', '.join(['%s'] * len(days))})"] if days else []
+            if include_null:
+                conditions.append("当期日期 IS NULL")
+            where_sql, params = "WHERE " + " OR ".join(conditions), days
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} {where_sql}", params)
+            if include_null:
+                days = days + [None]
+        # 分组在 MySQL 中完成，返回的汇总行远少于源表行；非法的进货日期记为空
+        cursor.execute(f"SELECT {select_sql} FROM {SOURCE_TABLE} {where_sql} GROUP BY {', '.join(group_exprs)}", params)
+        rows = [tuple(row) for row in cursor.fetchall()]
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            cursor.executemany(insert_sql, rows[start:start + INSERT_CHUNK_SIZE])
+        connection.commit()
+        logger.info("流向日汇总完成: 当期日期=%s, 写入 %s 行", days if days is not None else '全部', len(rows))
+        return len(rows)
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def rollup_days_for_ids(connection, flow_ids):
+    """行级修改涉及的当期日期，返回 None 表示无法确定（需要全量重建）
+
+    需要在输出结果按 id 重新物化之前调用：修改前的当期日期从输出结果的 流向ID 找到，
+    修改后的从流向表找到。输出结果尚未物化时只用流向表中的当期日期；只有被删除的行
+    在两处都找不到（原来的当期日期无从得知）时才返回 None。
+    """
+    flow_ids = sorted({int(i) for i in flow_ids})
+    if not flow_ids:
+        return []
+    cursor = connection.cursor()
+    try:
+        placeholders = ', '.join(['%s'] * len(flow_ids))
+        cursor.execute(f"SELECT id, 当期日期 FROM {SOURCE_TABLE} WHERE id IN ({placeholders})", flow_ids)
+        current = dict(cursor.fetchall())
+        cursor.execute(f"SELECT DISTINCT 流向ID, 当期日期 FROM {OUTPUT_TABLE} WHERE 流向ID IN ({placeholders})", flow_ids)
+        old = cursor.fetchall()
+        unknown = set(flow_ids) - set(current) - {row[0] for row in old}
+        if unknown:
+            logger.info("%s 个被删除的流向行找不到原来的当期日期，将全量重建日汇总", len(unknown))
+            return None
+        changed = set(current.values()) | {row[1] for row in old}
+        # 当期日期为空的行也要重建（None 放在最后）
+        return sorted(d for d in changed if d is not None) + ([None] if None in changed else [])
+    except Error as e:
+        logger.warning("无法确定流向变化涉及的当期日期，将全量重建日汇总: %s", e)
+        return None
+    finally:
+        cursor.close()
+
+
+def _needs_build(connection):
+    """汇总表为空而流向表有数据"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT 1 FROM {ROLLUP_TABLE} LIMIT 1")
+        built = cursor.fetchone() is not None
+        cursor.execute(f"SELECT 1 FROM {SOURCE_TABLE} LIMIT 1")
+        has_source = cursor.fetchone() is not None
+    finally:
+        cursor.close()
+    return has_source and not built
+
+
+def ensure_rollup_built(connection):
+    """首次使用时（例如旧库升级后）若汇总表为空而流向表有数据，则全量汇总一次
+
+    并发的首次查询用命名锁串行执行，取得锁后重新检查，只汇总一次。
+    """
+    ensure_rollup_schema(connection)
+    if not _needs_build(connection):
+        return
+    with named_lock(connection, ROLLUP_LOCK) as acquired:
+        if not acquired:
+            return
+        # 结束当前事务，重新检查时读到其他连接已提交的汇总结果
+        connection.commit()
+        if _needs_build(connection):
+            refresh_rollup_days(connection)
+
+
+def parse_metrics(raw, default):
+    """metrics 参数：逗号分隔的 count、sum:字段，返回 [('count', None) | ('sum', 字段)]"""
+    items = [m.strip() for m in (raw or default).split(',') if m.strip()]
+    metrics = []
+    for item in items:
+        if item == 'count':
+            metrics.append(('count', None))
+        elif item.startswith('sum:') and item[4:].strip():
+            metrics.append(('sum', item[4:].strip()))
+        else:
+            raise AggregateError(f"不支持的统计项: {item}（可用 count、sum:字段）")
+    if not metrics:
+        raise AggregateError("至少需要一个统计项")
+    return metrics
+
+
+def metric_alias(kind, field):
+    return '行数' if kind == 'count' else f"{field}合计"
+
+
+def can_use_rollup(table_name, group_by, metrics, filters):
+    # 按进货日期分组请用 period=day（汇总表中为 DATE，源表中为文本）
+    dimensions = set(ROLLUP_DIMENSIONS) | {'当期日期'}
+    return (table_name == SOURCE_TABLE
+            and set(group_by) <= dimensions
+            and set(filters) <= dimensions | {ROLLUP_DATE_FIELD}
+            and all(kind == 'count' or field in ROLLUP_MEASURES for kind, field in metrics))
+
+
+def run_aggregate(connection, table_name, group_by=(), period=None, metrics=None, filters=None,
+                  start_date=None, end_date=None, sort_field=None, sort_order='DESC',
+                  limit=AGGREGATE_DEFAULT_LIMIT, source=None):
+    """分组汇总查询，能用日汇总表时用汇总表，否则在源表上执行有限制的 GROUP BY
+
+    - group_by: 分组字段列表；period: day / month，按进货日期分天或分月
+    - metrics: 'count,sum:销售数量' 格式；filters: {字段: 关键词}（包含匹配，与 /api/data 相同）
+    - start_date / end_date: 进货日期范围（含两端，YYYY-MM-DD）
+    - source: 'table' 时强制查询源表
+    返回 {'source', 'columns', 'rows', 'truncated'}
+    """
+    group_by = [g for g in dict.fromkeys(group_by or []) if g]
+    filters = filters or {}
+    default_metrics = f"count,{','.join('sum:' + m for m in ROLLUP_MEASURES)}" if table_name == SOURCE_TABLE else 'count'
+    metrics = parse_metrics(metrics, default_metrics)
+    if period and period not in PERIOD_FORMATS:
+        raise AggregateError(f"period 只能是 {', '.join(PERIOD_FORMATS)}")
+    limit = min(AGGREGATE_MAX_GROUPS, max(1, int(limit or AGGREGATE_DEFAULT_LIMIT)))
+    for value in (start_date, end_date):
+        if value and parse_day(value) is None:
+            raise AggregateError(f"日期格式错误: {value}")
+
+    use_rollup = source != 'table' and can_use_rollup(table_name, group_by, metrics, filters)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        if use_rollup:
+            ensure_rollup_built(connection)
+            from_table = ROLLUP_TABLE
+            date_expr = f"`{ROLLUP_DATE_FIELD}`"
+            metric_exprs = {('count', None): "SUM(`行数`)"}
+            metric_exprs.update({('sum', m): f"SUM(`{m}`)" for m in ROLLUP_MEASURES})
+        else:
+            columns = describe_columns(cursor, table_name)
+            unknown = [f for f in group_by + list(filters) if f not in columns]
+            if unknown:
+                raise AggregateError(f"字段不存在: {', '.join(unknown)}")
+            if (period or start_date or end_date) and ROLLUP_DATE_FIELD not in columns:
+                raise AggregateError(f"{table_name} 没有 {ROLLUP_DATE_FIELD} 字段，不能按日期汇总")
+            metric_exprs = {('count', None): "COUNT(*)"}
+            for kind, field in metrics:
+                if kind != 'sum':
+                    continue
+                if field not in columns:
+                    raise AggregateError(f"字段不存在: {field}")
+                if not columns[field].lower().startswith(NUMERIC_TYPES):
+                    raise AggregateError(f"字段不是数值类型，不能求和: {field}")
+                metric_exprs[('sum', field)] = f"SUM(`{field}`)"
+            from_table = table_name
+            # 源表的进货日期为文本，与建汇总表时一样转为 DATE
+            date_expr = SOURCE_DAY_EXPR
+
+        conditions, params = [], []
+        for field, value in filters.items():
+            conditions.append(f"`{field}` LIKE %s")
+            params.append(f"%{value}%")
+        if start_date:
+            conditions.append(f"{date_expr} >= %s")
+            params.append(parse_day(start_date).isoformat())
+        if end_date:
+            conditions.append(f"{date_expr} <= %s")
+            params.append(parse_day(end_date).isoformat())
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+        select_items, group_items, output_columns = [], [], []
+        if period:
+            alias, fmt = PERIOD_FORMATS[period]
+            period_expr = f"DATE_FORMAT({date_expr}, '{fmt}')"
+            select_items.append(f"{period_expr} AS `{alias}`")
+            group_items.append(period_expr)
+            output_columns.append(alias)
+        for field in group_by:
+            select_items.append(f"`{field}`")
+            group_items.append(f"`{field}`")
+            output_columns.append(field)
+        for kind, field in metrics:
+            alias = metric_alias(kind, field)
+            select_items.append(f"{metric_exprs[(kind, field)]} AS `{alias}`")
+            output_columns.append(alias)
+
+        order_exprs = {col: f"`{col}`" for col in output_columns}
+        if sort_field in order_exprs:
+            direction = 'ASC' if str(sort_order).upper() == 'ASC' else 'DESC'
+            order_clause = f"ORDER BY {order_exprs[sort_field]} {direction}"
+        elif group_items:
+            order_clause = "ORDER BY " + ", ".join(group_items)
+        else:
+            order_clause = ""
+        group_clause = "GROUP BY " + ", ".join(group_items) if group_items else ""
+        # 源表查询限制执行时间（MySQL 5.7.8+ 的优化器提示，其他版本视为注释）
+        hint = "" if use_rollup else f"/*+ MAX_EXECUTION_TIME({AGGREGATE_TIMEOUT_MS}) */ "
+        query = (f"SELECT {hint}{', '.join(select_items)} FROM {from_table} {where_clause} "
+                 f"{group_clause} {order_clause} LIMIT {limit + 1}")
+        logger.debug("汇总查询: %s 参数: %s", query, params)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return {
+        'source': 'rollup' if use_rollup else 'table',
+        'columns': output_columns,
+        'rows': rows[:limit],
+        'truncated': len(rows) > limit,
+    }
@@ -0,0 +1,238 @@
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from mysql.connector import Error
+from metrics import IMPORT_STAGE_SECONDS
+from schema import create_table_sql
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# 导入运行记录：每次 Excel 导入的文件哈希、行数和各阶段耗时写入 import_runs 表，
+# 用户反馈"上传很慢"时据此判断时间花在读取、清洗、组装还是写库上
+IMPORT_RUNS_TABLE = 'import_runs'
+
+# 单次导入的 cProfile 结果保存目录；上传时带 profile=1 或设置 JXC_IMPORT_PROFILE=1 开启
+PROFILE_FOLDER = os.path.join('uploads', 'profiles')
+PROFILE_ENABLED = os.environ.get('JXC_IMPORT_PROFILE', '') == '1'
+# 各阶段结束时总是记录进程常驻内存（RSS）；tracemalloc 统计的 Python 分配峰值更精确，
+# 但会明显拖慢内存分配，默认关闭，设置 JXC_IMPORT_TRACEMALLOC=1 开启
+TRACEMALLOC_ENABLED = os.environ.get('JXC_IMPORT_TRACEMALLOC', '0') == '1'
+
+CREATE_IMPORT_RUNS_SQL = create_table_sql(IMPORT_RUNS_TABLE)
+
+def process_rss_mb():
+    """进程当前的常驻内存（MB）：安装 psutil 时由 psutil 读取，未安装时 Linux 读取 /proc/self/statm，
+    其他系统返回 None（getrusage 只有进程整个生命周期的峰值，不能反映各阶段的内存）"""
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / 1024 / 1024, 2)
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 2)
+
+
+# tracemalloc 是进程级的，多个导入并发时按引用计数启停
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """按块计算文件 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImportProfiler:
+    """记录一次导入各阶段的墙钟时间、CPU 时间、峰值内存和行数
+
+    每次 mark(stage) 结束一个阶段（自上一次 mark 起算），同时写入 /metrics 的阶段耗时直方图。
+    """
+
+    def __init__(self, table_name, excel_file, profile=False):
+        self.table_name = table_name
+        self.excel_file = excel_file
+        self.stages = []
+        self.counts = {'读取行数': None, '删除行数': None, '导入行数': None}
+        self.file_hash = None
+        self.file_size = None
+        self.status = 'running'
+        self.error = None
+        self.profile_path = None
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.track_memory = TRACEMALLOC_ENABLED
+        if self.track_memory:
+            _start_tracemalloc()
+            tracemalloc.reset_peak()
+        self._start_wall = self._last_wall = time.perf_counter()
+        self._start_cpu = self._last_cpu = time.thread_time()
+        self._profile = None
+        if profile or PROFILE_ENABLED:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def mark(self, stage, rows=None, detail=None):
+        """detail：该阶段的附加信息（如各列内存），随阶段耗时一起保存"""
+        now_wall = time.perf_counter()
+        now_cpu = time.thread_time()
+        wall = now_wall - self._last_wall
+        entry = {'stage': stage, 'wall': round(wall, 4), 'cpu': round(now_cpu - self._last_cpu, 4)}
+        if self.track_memory:
+            entry['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.reset_peak()
+        rss_mb = process_rss_mb()
+        if rss_mb is not None:
+            entry['rss_mb'] = rss_mb
+        if rows is not None:
+            entry['rows'] = rows
+            entry['rows_per_sec'] = round(rows / wall, 1) if wall > 0 else None
+        if detail is not None:
+            entry['detail'] = detail
+        self.stages.append(entry)
+        self._last_wall, self._last_cpu = now_wall, now_cpu
+        IMPORT_STAGE_SECONDS.observe(wall, table=self.table_name, stage=stage)
+        return wall
+
+    def hash_file(self):
+        self.file_size = os.path.getsize(self.excel_file)
+        self.file_hash = file_sha256(self.excel_file)
+        self.mark('hash')
+
+    def finish(self, status='success', error=None):
+        """结束计时；开启 cProfile 时把结果写入 PROFILE_FOLDER"""
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now()
+        self.total_wall = time.perf_counter() - self._start_wall
+        self.total_cpu = time.thread_time() - self._start_cpu
+        if self.track_memory:
+            _stop_tracemalloc()
+        if self._profile is not None:
+            self._profile.disable()
+            os.makedirs(PROFILE_FOLDER, exist_ok=True)
+            # 加随机后缀：同一秒内导入同一张表时不会互相覆盖
+            name = f"{self.started_at:%Y%m%d_%H%M%S}_{self.table_name}_{uuid.uuid4().hex[:8]}.prof"
+            self.profile_path = os.path.join(PROFILE_FOLDER, name)
+            self._profile.dump_stats(self.profile_path)
+            logger.info("导入性能分析已保存: %s", self.profile_path)
+
+    def summary(self):
+        # 开启 tracemalloc 时取 Python 分配峰值，否则取各阶段结束时的 RSS
+        peaks = [s['peak_mb'] for s in self.stages if 'peak_mb' in s]
+        if not peaks:
+            peaks = [s['rss_mb'] for s in self.stages if 'rss_mb' in s]
+        imported = self.counts.get('导入行数') or 0
+        return {
+            '表名': self.table_name,
+            '文件名': os.path.basename(self.excel_file),
+            '文件哈希': self.file_hash,
+            '文件大小': self.file_size,
+            '读取行数': self.counts.get('读取行数'),
+            '删除行数': self.counts.get('删除行数'),
+            '导入行数': self.counts.get('导入行数'),
+            '状态': self.status,
+            '错误信息': self.error,
+            '总耗时': round(self.total_wall, 3),
+            'CPU耗时': round(self.total_cpu, 3),
+            '峰值内存MB': max(peaks) if peaks else None,
+            '每秒行数': round(imported / self.total_wall, 1) if imported and self.total_wall > 0 else None,
+            '阶段耗时': json.dumps(self.stages, ensure_ascii=False),
+            '性能分析文件': self.profile_path,
+            '开始时间': self.started_at,
+            '结束时间': self.finished_at,
+        }
+
+
+def ensure_import_runs_table(connection):
+    cursor = connection.cursor()
+    cursor.execute(CREATE_IMPORT_RUNS_SQL)
+    cursor.close()
+
+
+def record_import_run(connection, profiler):
+    """写入一条导入运行记录；记录失败只记日志，不影响导入结果"""
+    summary = profiler.summary()
+    logger.info("导入运行记录: 表=%s 状态=%s 总耗时=%ss 阶段=%s",
+                summary['表名'], summary['状态'], summary['总耗时'],
+                {s['stage']: s['wall'] for s in profiler.stages})
+    try:
+        ensure_import_runs_table(connection)
+        columns = list(summary)
+        cursor = connection.cursor()
+        cursor.execute(
+            f"INSERT INTO {IMPORT_RUNS_TABLE} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            [summary[c] for c in columns])
+        run_id = cursor.lastrowid
+        cursor.close()
+        connection.commit()
+        return run_id
+    except Error as e:
+        logger.error("写入导入运行记录失败: %s", e)
+        return None
+
+
+def list_import_runs(connection, limit=50, table_name=None):
+    """最近的导入运行记录（阶段耗时解析为列表）"""
+    ensure_import_runs_table(connection)
+    sql = f"SELECT * FROM {IMPORT_RUNS_TABLE}"
+    params = []
+    if table_name:
+        sql += " WHERE 表名 = %s"
+        params.append(table_name)
+    sql += " ORDER BY id DESC LIMIT %s"
+    params.append(int(limit))
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(sql, params)
+        runs = cursor.fetchall()
+    finally:
+        cursor.close()
+    for run in runs:
+        try:
+            run['阶段耗时'] = json.loads(run['阶段耗时'] or '[]')
+        except ValueError:
+            pass
+    return runs
+
+
+def profile_report(profile_path, limit=40):
+    """cProfile 结果按累计耗时排序的文本报告"""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile_path, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
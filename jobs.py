@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from data_import import create_connection
+from schema import create_table_sql
+
+logger = logging.getLogger(__name__)
+
+# 后台任务：耗时较长的操作（大批量删除、导出）在后台线程中执行，
+# 状态和进度写入 background_jobs 表，任何工作进程都能查询
+JOBS_TABLE = 'background_jobs'
+JOB_WORKERS = int(os.environ.get('JXC_JOB_WORKERS', 2))
+# 进度最多每隔这么多秒写一次库
+PROGRESS_INTERVAL = 1.0
+# 本进程的未完成任务每隔这么多秒刷新一次 更新时间（心跳），即使任务函数长时间没有报告进度
+HEARTBEAT_SECONDS = float(os.environ.get('JXC_JOB_HEARTBEAT_SECONDS', 30))
+# pending/running 任务的 更新时间 超过这么多秒没有刷新，说明所在进程已退出（重启、max_requests、崩溃），
+# 查找可复用任务时跳过，进程启动后首次访问任务表时标记为 failed
+STALE_SECONDS = float(os.environ.get('JXC_JOB_STALE_SECONDS', 300))
+UNFINISHED_STATUSES = ('pending', 'running')
+
+CREATE_JOBS_SQL = create_table_sql(JOBS_TABLE)
+
+_executor = None
+_executor_lock = threading.Lock()
+_table_checked = False
+# 本进程中已提交、尚未结束的任务 id（心跳线程据此刷新 更新时间）
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+def _get_executor():
+    # 延迟创建：gunicorn 预加载后 fork 的工作进程各自拥有自己的线程池和心跳线程
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+            threading.Thread(target=_heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        return _executor
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with _active_lock:
+            job_ids = sorted(_active_jobs)
+        if not job_ids:
+            continue
+        conn = create_connection()
+        if not conn:
+            logger.error("任务心跳失败: 数据库连接错误")
+            continue
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"UPDATE {JOBS_TABLE} SET 更新时间 = %s WHERE id IN ({', '.join(['%s'] * len(job_ids))})",
+                           [datetime.now()] + job_ids)
+            cursor.close()
+            conn.commit()
+        except Error as e:
+            logger.error("任务心跳失败: %s", e)
+        finally:
+            conn.close()
+
+
+def stale_before():
+    """更新时间 早于该时刻的未完成任务视为已中断"""
+    return datetime.now() - timedelta(seconds=STALE_SECONDS)
+
+
+def fail_stale_jobs(connection):
+    """把已中断（心跳超时）的 pending/running 任务标记为 failed，返回标记的个数"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE {JOBS_TABLE} SET 状态 = 'failed', 错误信息 = %s, 结束时间 = %s "
+            f"WHERE 状态 IN ({', '.join(['%s'] * len(UNFINISHED_STATUSES))}) AND 更新时间 < %s",
+            ['任务中断：所在进程已退出（服务重启或异常）', datetime.now()] + list(UNFINISHED_STATUSES) + [stale_before()])
+        count = cursor.rowcount
+        connection.commit()
+    finally:
+        cursor.close()
+    if count:
+        logger.warning("标记 %s 个中断的后台任务为 failed", count)
+    return count
+
+
+def ensure_jobs_table(connection):
+    global _table_checked
+    if _table_checked:
+        return
+    cursor = connection.cursor()
+    cursor.execute(CREATE_JOBS_SQL)
+    cursor.close()
+    _table_checked = True
+    # 进程启动后首次使用任务表时清理之前中断的任务
+    try:
+        fail_stale_jobs(connection)
+    except Error as e:
+        logger.error("清理中断的后台任务失败: %s", e)
+
+
+def params_key(params):
+    """任务参数的摘要，用于查找参数相同的任务"""
+    raw = json.dumps(params, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class JobContext:
+    """传给任务函数，用于报告进度"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def progress(self, done, total=None, message=None, force=False):
+        """更新进度（节流写库，force=True 时立即写入）"""
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        _update_job(self.job_id, 已完成=done, 总数=total, 进度说明=message)
+
+
+def _update_job(job_id, **fields):
+    fields = {k: v for k, v in fields.items() if v is not None}
+    fields['更新时间'] = datetime.now()
+    conn = create_connection()
+    if not conn:
+        logger.error("更新任务 %s 失败: 数据库连接错误", job_id)
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE {JOBS_TABLE} SET {', '.join(f'{k} = %s' for k in fields)} WHERE id = %s",
+                       list(fields.values()) + [job_id])
+        cursor.close()
+        conn.commit()
+    except Error as e:
+        logger.error("更新任务 %s 失败: %s", job_id, e)
+    finally:
+        conn.close()
+
+
+def _run_job(job_id, job_type, func, params):
+    started = time.perf_counter()
+    _update_job(job_id, 状态='running', 开始时间=datetime.now())
+    try:
+        result = func(JobContext(job_id), params)
+    except Exception as e:
+        logger.exception("后台任务 %s（%s）失败: %s", job_id, job_type, e)
+        _update_job(job_id, 状态='failed', 错误信息=str(e), 结束时间=datetime.now())
+        return
+    finally:
+        with _active_lock:
+            _active_jobs.discard(job_id)
+    logger.info("后台任务 %s（%s）完成，耗时 %.1fs", job_id, job_type, time.perf_counter() - started)
+    _update_job(job_id, 状态='success', 结果=json.dumps(result, ensure_ascii=False, default=str),
+                结束时间=datetime.now())
+
+
+def submit_job(connection, job_type, params, func):
+    """登记任务并放入后台线程池执行，返回任务 id
+
+    func(ctx, params) 在后台线程中执行，自行创建数据库连接；返回值（可 JSON 序列化）保存为任务结果。
+    """
+    ensure_jobs_table(connection)
+    now = datetime.now()
+    cursor = connection.cursor()
+    cursor.execute(
+        f"INSERT INTO {JOBS_TABLE} (类型, 参数, 参数键, 状态, 创建时间, 更新时间) VALUES (%s, %s, %s, %s, %s, %s)",
+        (job_type, json.dumps(params, ensure_ascii=False, default=str), params_key(params), 'pending', now, now))
+    job_id = cursor.lastrowid
+    cursor.close()
+    connection.commit()
+    # 排队等待线程池期间也要有心跳
+    with _active_lock:
+        _active_jobs.add(job_id)
+    _get_executor().submit(_run_job, job_id, job_type, func, params)
+    logger.info("提交后台任务 %s（%s）", job_id, job_type)
+    return job_id
+
+
+def _job_row(row):
+    for key in ('参数', '结果'):
+        if row.get(key):
+            try:
+                row[key] = json.loads(row[key])
+            except ValueError:
+                pass
+    return row
+
+
+def get_job(connection, job_id):
+    ensure_jobs_table(connection)
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(f"SELECT * FROM {JOBS_TABLE} WHERE id = %s", (job_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return _job_row(row) if row else None
+
+
+def find_job(connection, job_type, params, statuses=('pending', 'running', 'success')):
+    """查找参数相同的最近一个任务（用于复用结果），没有时返回 None；跳过心跳超时（已中断）的未完成任务"""
+    ensure_jobs_table(connection)
+    cursor = connection.cursor(dictionary=True)
+    unfinished = ', '.join(['%s'] * len(UNFINISHED_STATUSES))
+    cursor.execute(
+        f"SELECT * FROM {JOBS_TABLE} WHERE 类型 = %s AND 参数键 = %s AND 状态 IN ({', '.join(['%s'] * len(statuses))}) "
+        f"AND NOT (状态 IN ({unfinished}) AND 更新时间 < %s) "
+        f"ORDER BY id DESC LIMIT 1",
+        [job_type, params_key(params)] + list(statuses) + list(UNFINISHED_STATUSES) + [stale_before()])
+    row = cursor.fetchone()
+    cursor.close()
+    return _job_row(row) if row else None
+
+
+def list_jobs(connection, limit=50, job_type=None):
+    ensure_jobs_table(connection)
+    cursor = connection.cursor(dictionary=True)
+    sql = f"SELECT * FROM {JOBS_TABLE}"
+    params = []
+    if job_type:
+        sql += " WHERE 类型 = %s"
+        params.append(job_type)
+    sql += " ORDER BY id DESC LIMIT %s"
+    params.append(int(limit))
+    cursor.execute(sql, params)
+    rows = [_job_row(r) for r in cursor.fetchall()]
+    cursor.close()
+    return rows
@@ -0,0 +1,104 @@
+import gzip
+import json
+from datetime import date
+from decimal import Decimal
+from flask import Response
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 数据接口的 JSON 序列化、列式格式和压缩
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# 字符串列不同取值占行数的比例不超过该值时做字典编码
+DICTIONARY_RATIO = 0.5
+
+
+def json_default(value):
+    """与 Flask jsonify 的默认转换保持一致：Decimal 转字符串，日期转 HTTP 日期"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """序列化为 UTF-8 字节，安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=json_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def to_columnar(fields, rows, dictionary_fields=None):
+    """行列表（字典）转为列式结构
+
+    返回 {'fields': [...], 'columns': [[列1的值...], ...], 'dictionaries': {字段: [取值...]}}；
+    出现在 dictionaries 中的列，columns 里保存的是取值在字典中的下标。
+    dictionary_fields 为 None 时，对重复较多的字符串列自动做字典编码。
+    """
+    columns = [[row.get(f) for row in rows] for f in fields]
+    dictionaries = {}
+    for field, values in zip(fields, columns):
+        if dictionary_fields is not None and field not in dictionary_fields:
+            continue
+        if not values or not all(v is None or isinstance(v, str) for v in values):
+            continue
+        distinct = {}
+        for v in values:
+            if v not in distinct:
+                distinct[v] = len(distinct)
+        if dictionary_fields is None and len(distinct) > len(values) * DICTIONARY_RATIO:
+            continue
+        dictionaries[field] = list(distinct)
+        values[:] = [distinct[v] for v in values]
+    return {'fields': list(fields), 'columns': columns, 'dictionaries': dictionaries}
+
+
+def columnar_result(result, fields=None):
+    """把分页结果中的 data（行列表）替换为列式结构，其余字段不变"""
+    rows = result.get('data') or []
+    if fields is None:
+        fields = list(rows[0]) if rows else [c['Field'] for c in result.get('columns', [])]
+    converted = dict(result)
+    converted['format'] = 'columnar'
+    converted['data'] = to_columnar(fields, rows)
+    return converted
+
+
+def compress_response(response, accept_encodings):
+    """按 Accept-Encoding 压缩 JSON 响应（brotli 优先，其次 gzip）"""
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accept_encodings.quality('gzip') > 0:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,286 @@
+"""并发 HTTP 压测
+
+    python loadtest.py --seed 100k --start-app --stages 1,5,10,20,50 --stage-duration 30
+
+按权重回放一组请求（分页 /query、/api/data 分页与搜索、输出结果分页、修改行），
+并发数按 --stages 逐级增加，每级持续 --stage-duration 秒，
+输出每一级、每个接口的吞吐量、p50/p95/p99 延迟和错误率，结果同时写成 JSON。
+
+- --seed 10k：用 bench_data 生成的工作簿重建并导入基准库（默认 jinxiaocun_bench）
+- --start-app：在子进程中启动应用（连接基准库），也可以用 --url 指向已启动的实例
+- --mix mix.json：自定义请求组合，格式见 DEFAULT_MIX；路径和请求体中的 {page}、{term}、{id}、{qty} 会被随机值替换
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+from urllib.request import urlopen
+
+# 默认请求组合
+DEFAULT_MIX = [
+    {'name': 'query_page', 'method': 'GET', 'weight': 3,
+     'path': '/query?table=customer_flow&page={page}&per_page=100'},
+    {'name': 'api_data_page', 'method': 'GET', 'weight': 4,
+     'path': '/api/data?table=customer_flow&page={page}&per_page=100'},
+    {'name': 'api_data_search', 'method': 'GET', 'weight': 3,
+     'path': '/api/data?table=customer_flow&page=1&per_page=100&search={term}'},
+    {'name': 'api_output_results', 'method': 'GET', 'weight': 2,
+     'path': '/api/output_results?page={page}&per_page=100'},
+    {'name': 'update_row', 'method': 'POST', 'weight': 1, 'path': '/api/update_row',
+     'json': {'table': 'customer_flow', 'pk_name': 'id', 'pk_value': '{id}', 'data': {'销售数量': '{qty}'}}},
+]
+SEARCH_TERMS = ['开州', '地黄', '药房', '诊所', '重庆', '生脉饮', '卫生室', 'KA线']
+PER_PAGE = 100
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Target:
+    """压测目标：请求路径中的随机参数范围"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        parts = urlsplit(self.base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.total_pages = 1
+        self.max_id = 1
+
+    def discover(self):
+        """读取流向表总行数和最大 id，用于生成随机页码和行 id"""
+        with urlopen(f"{self.base_url}/api/data?table=customer_flow&page=1&per_page=1"
+                     f"&fields=id&sort_field=id&sort_order=DESC", timeout=60) as resp:
+            result = json.load(resp)
+        total = result.get('total_records') or 0
+        self.total_pages = max(1, (total + PER_PAGE - 1) // PER_PAGE)
+        self.max_id = result['data'][0]['id'] if result.get('data') else 1
+        print(f"目标数据: 流向 {total} 行, {self.total_pages} 页, 最大 id {self.max_id}")
+
+    def fill(self, value, rng):
+        if isinstance(value, str):
+            if value == '{id}':
+                return rng.randint(1, self.max_id)
+            if value == '{qty}':
+                return rng.choice([1, 2, 5, 10, 20])
+            return value.format(page=rng.randint(1, self.total_pages), term=quote(rng.choice(SEARCH_TERMS)),
+                                id=rng.randint(1, self.max_id), qty=rng.choice([1, 2, 5, 10, 20]))
+        if isinstance(value, dict):
+            return {k: self.fill(v, rng) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.fill(v, rng) for v in value]
+        return value
+
+
+class Worker(threading.Thread):
+    """一个虚拟用户：复用 keep-alive 连接，按权重随机发请求直到本级结束"""
+
+    def __init__(self, target, mix, deadline, think_time, records, seed):
+        super().__init__(daemon=True)
+        self.target = target
+        self.mix = mix
+        self.weights = [m.get('weight', 1) for m in mix]
+        self.deadline = deadline
+        self.think_time = think_time
+        self.records = records
+        self.rng = random.Random(seed)
+        self.conn = None
+
+    def request(self, item):
+        path = self.target.fill(item['path'], self.rng)
+        body = None
+        headers = {}
+        if 'json' in item:
+            body = json.dumps(self.target.fill(item['json'], self.rng), ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.target.host, self.target.port, timeout=120)
+        self.conn.request(item.get('method', 'GET'), path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        return response.status
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            item = self.rng.choices(self.mix, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status = self.request(item)
+                ok = status < 400
+            except (OSError, http.client.HTTPException):
+                status, ok = 0, False
+                if self.conn is not None:
+                    self.conn.close()
+                    self.conn = None
+            self.records.append((item['name'], time.perf_counter() - start, ok, status))
+            if self.think_time:
+                time.sleep(self.rng.uniform(0, self.think_time * 2))
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_stage(target, mix, concurrency, duration, think_time):
+    """以固定并发数压测 duration 秒，返回 (请求记录, 实际耗时)"""
+    records = []
+    deadline = time.monotonic() + duration
+    workers = [Worker(target, mix, deadline, think_time, records, seed=concurrency * 1000 + i)
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return records, time.perf_counter() - start
+
+
+def summarize_stage(concurrency, records, elapsed):
+    by_name = {}
+    for name, latency, ok, status in records:
+        by_name.setdefault(name, []).append((latency, ok, status))
+    endpoints = {}
+    for name, items in sorted(by_name.items()):
+        latencies = sorted(i[0] for i in items)
+        errors = sum(1 for i in items if not i[1])
+        statuses = {}
+        for i in items:
+            statuses[str(i[2])] = statuses.get(str(i[2]), 0) + 1
+        endpoints[name] = {
+            'requests': len(items),
+            'rps': round(len(items) / elapsed, 2),
+            'error_rate': round(errors / len(items), 4),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            'statuses': statuses,
+        }
+    total = len(records)
+    errors = sum(1 for r in records if not r[2])
+    return {
+        'concurrency': concurrency,
+        'duration': round(elapsed, 2),
+        'requests': total,
+        'rps': round(total / elapsed, 2) if elapsed else 0,
+        'error_rate': round(errors / total, 4) if total else 0,
+        'endpoints': endpoints,
+    }
+
+
+def print_stage(stage):
+    print(f"\n== 并发 {stage['concurrency']}：{stage['requests']} 个请求，"
+          f"{stage['rps']} req/s，错误率 {stage['error_rate']:.2%} ==")
+    print(f"  {'接口':<22}{'请求数':>8}{'req/s':>9}{'错误率':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}")
+    for name, e in stage['endpoints'].items():
+        print(f"  {name:<22}{e['requests']:>8}{e['rps']:>9}{e['error_rate']:>9.2%}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}{e['max_ms']:>9}")
+
+
+def seed_database(size, data_dir, database):
+    """生成工作簿并重建、导入基准库"""
+    from bench_data import generate, parse_size
+    from benchmark import BENCH_FILES, prepare_database
+    rows = parse_size(size)
+    files = generate([rows], data_dir)[rows]
+    prepare_database(database)
+    from data_import import create_connection, import_excel_data
+    for filename, table_name in BENCH_FILES:
+        conn = create_connection()
+        try:
+            run = import_excel_data(files[filename], table_name, conn)
+        finally:
+            conn.close()
+        print(f"已导入 {filename}: {run['导入行数']} 行，{run['总耗时']} 秒")
+
+
+def start_app(port, server_cmd):
+    """在子进程中启动应用，等待 /healthz 可用"""
+    cmd = server_cmd.format(python=sys.executable, port=port).split() if server_cmd else [
+        sys.executable, '-c',
+        f"import web_import; web_import.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    proc = subprocess.Popen(cmd, env=dict(os.environ))
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        if proc.poll() is not None:
+            raise SystemExit(f"应用进程已退出: {proc.returncode}")
+        try:
+            with urlopen(f"{url}/healthz", timeout=2) as resp:
+                if resp.status == 200:
+                    return proc, url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("应用启动超时")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发 HTTP 压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='已启动的应用地址')
+    parser.add_argument('--start-app', action='store_true', help='在子进程中启动应用')
+    parser.add_argument('--port', type=int, default=5055, help='--start-app 时的端口')
+    parser.add_argument('--server-cmd', default=None,
+                        help='--start-app 时的启动命令，可用 {python}、{port} 占位，默认使用 Flask 开发服务器')
+    parser.add_argument('--seed', default=None, help='先生成并导入该规模的基准数据，例如 10k')
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--database', default='jinxiaocun_bench', help='--seed 或 --start-app 使用的库')
+    parser.add_argument('--stages', default='1,5,10,20,50', help='逐级增加的并发数')
+    parser.add_argument('--stage-duration', type=float, default=30, help='每级持续秒数')
+    parser.add_argument('--think-time', type=float, default=0, help='每个虚拟用户两次请求间的平均间隔秒数')
+    parser.add_argument('--mix', default=None, help='自定义请求组合 JSON 文件')
+    parser.add_argument('--output', default=None, help='结果 JSON 路径，默认 bench_results/loadtest_<时间>.json')
+    args = parser.parse_args()
+
+    os.environ.setdefault('JXC_LOG_LEVEL', 'WARNING')
+    if args.seed:
+        seed_database(args.seed, args.data_dir, args.database)
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix, encoding='utf-8') as f:
+            mix = json.load(f)
+
+    proc = None
+    url = args.url
+    if args.start_app:
+        os.environ['JXC_DB_NAME'] = args.database
+        proc, url = start_app(args.port, args.server_cmd)
+    try:
+        target = Target(url)
+        target.discover()
+        stages = []
+        for concurrency in [int(c) for c in args.stages.split(',')]:
+            records, elapsed = run_stage(target, mix, concurrency, args.stage_duration, args.think_time)
+            stage = summarize_stage(concurrency, records, elapsed)
+            print_stage(stage)
+            stages.append(stage)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    output = args.output or os.path.join('bench_results', f"loadtest_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), 'url': url,
+                            'stage_duration': args.stage_duration, 'think_time': args.think_time, 'mix': mix},
+                   'stages': stages}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import atexit
+import contextvars
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+# 日志配置：
+# - JXC_LOG_LEVEL  日志级别，默认 INFO（生产环境热点循环里的 debug 日志不产生任何格式化开销）
+# - JXC_LOG_FILE   额外写入的日志文件（按大小滚动），默认只输出到控制台
+# 业务线程只合成消息文本并把日志记录放入队列，按格式输出和写出由后台线程完成
+LOG_LEVEL = os.environ.get('JXC_LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.environ.get('JXC_LOG_FILE', '')
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] [req=%(request_id)s] %(message)s'
+
+# 当前请求的 request_id，由 web_import 在每个请求开始时设置
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+_exception_formatter = logging.Formatter()
+
+_listener = None
+_listener_level = None
+_setup_lock = threading.Lock()
+
+
+class RequestContextQueueHandler(logging.handlers.QueueHandler):
+    """在业务线程中合成消息文本、记录 request_id，按格式输出和写出推迟到写日志的后台线程
+
+    参数在这里就合成到 msg 中（与标准库 QueueHandler 相同）：调用方记录日志后可能修改传入的字典、列表，
+    推迟到后台线程再合成会写出修改后的内容；异常堆栈也在这里转成文本，不让记录持有 traceback 帧。
+    """
+
+    def prepare(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestIdFilter(logging.Filter):
+    """保证直接写出的日志记录也带有 request_id 字段"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
+def setup_logging(level=None):
+    """初始化日志系统（可重复调用，只生效一次）"""
+    global _listener, _listener_level
+    with _setup_lock:
+        if _listener is not None:
+            return
+        _listener_level = level
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        console = logging.StreamHandler(sys.stderr)
+        console.setFormatter(formatter)
+        console.addFilter(RequestIdFilter())
+        handlers.append(console)
+        if LOG_FILE:
+            file_handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=20 * 1024 * 1024, backupCount=5, encoding='utf-8')
+            file_handler.setFormatter(formatter)
+            file_handler.addFilter(RequestIdFilter())
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.handlers = [RequestContextQueueHandler(log_queue)]
+        root.setLevel(level or LOG_LEVEL)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def _reinit_after_fork():
+    """gunicorn 预加载应用后 fork 出的工作进程里没有写日志的后台线程，需要重新启动"""
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        setup_logging(_listener_level)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+def stop_logging():
+    """停止后台写日志线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# 行级日志采样：同一个 key 只记录第 1 次以及此后每 every 次
+_sample_counters = {}
+
+
+def sampled(key, every=1000):
+    """返回本次是否应记录该 key 的行级日志"""
+    counter = _sample_counters.get(key)
+    if counter is None:
+        counter = _sample_counters.setdefault(key, itertools.count())
+    return next(counter) % every == 0
+
+
+def reset_sampled(key):
+    """丢弃 key 的采样计数，下次调用 sampled(key) 重新从第 1 次开始"""
+    _sample_counters.pop(key, None)
+
+
+def mask_dbconf(dbconf):
+    """日志中隐藏数据库密码"""
+    if not isinstance(dbconf, dict):
+        return dbconf
+    return {k: ('***' if k == 'password' and v else v) for k, v in dbconf.items()}
@@ -0,0 +1,269 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+
+# 进程内指标：按 Prometheus 文本格式在 /metrics 输出，不依赖外部服务。
+# 多进程部署时每个进程各自统计，由抓取端按实例汇总。
+
+# 默认耗时分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metric:
+    """带标签的指标基类，label_values 按 labelnames 顺序组成元组作为键"""
+
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数（最后一个为 +Inf）, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else format_value(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {format_value(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics():
+    """所有指标的 Prometheus 文本格式"""
+    PROCESS_UPTIME.set(time.time() - PROCESS_START_TIME)
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+PROCESS_START_TIME = time.time()
+
+HTTP_REQUEST_SECONDS = register(Histogram(
+    'jxc_http_request_duration_seconds', 'Flask 路由处理耗时', ('route', 'method', 'status')))
+HTTP_IN_FLIGHT = register(Gauge(
+    'jxc_http_requests_in_flight', '正在处理的请求数'))
+DB_QUERY_SECONDS = register(Histogram(
+    'jxc_db_query_duration_seconds', 'SQL 语句执行耗时', ('kind', 'table')))
+DB_QUERY_ROWS = register(Counter(
+    'jxc_db_query_rows_total', 'SQL 语句影响或返回的行数', ('kind', 'table')))
+DB_QUERY_ERRORS = register(Counter(
+    'jxc_db_query_errors_total', 'SQL 语句执行失败次数', ('kind', 'table')))
+DB_CONNECT_SECONDS = register(Histogram(
+    'jxc_db_connect_duration_seconds', '获取数据库连接的等待时间'))
+DB_CONNECT_ERRORS = register(Counter(
+    'jxc_db_connect_errors_total', '获取数据库连接失败次数'))
+IMPORT_STAGE_SECONDS = register(Histogram(
+    'jxc_import_stage_duration_seconds', 'Excel 导入各阶段耗时', ('table', 'stage')))
+PROCESS_UPTIME = register(Gauge(
+    'jxc_process_uptime_seconds', '进程已运行时间'))
+
+
+# ---- SQL 语句分类 ----
+
+SQL_KIND_PATTERN = re.compile(r'^\s*(?:/\*.*?\*/\s*)*(\w+)', re.S)
+SQL_TABLE_PATTERNS = {
+    'select': re.compile(r'\bFROM\s+`?(\w+)', re.I),
+    'delete': re.compile(r'\bFROM\s+`?(\w+)', re.I),
+    'insert': re.compile(r'\bINTO\s+`?(\w+)', re.I),
+    'replace': re.compile(r'\bINTO\s+`?(\w+)', re.I),
+    'update': re.compile(r'\bUPDATE\s+`?(\w+)', re.I),
+    'describe': re.compile(r'\bDESCRIBE\s+`?(\w+)', re.I),
+    'show': re.compile(r'\bFROM\s+`?(\w+)', re.I),
+    'alter': re.compile(r'\bTABLE\s+`?(\w+)', re.I),
+    'create': re.compile(r'\b(?:TABLE(?:\s+IF\s+NOT\s+EXISTS)?|ON)\s+`?(\w+)', re.I),
+}
+
+
+# 这些语句按 rowcount 统计影响行数，其余语句按 fetch 返回的行数统计
+DML_KINDS = {'insert', 'replace', 'update', 'delete'}
+
+
+@lru_cache(maxsize=2048)
+def classify_sql(sql):
+    """返回 (语句类型, 表名)，用作指标标签"""
+    match = SQL_KIND_PATTERN.match(sql)
+    kind = match.group(1).lower() if match else 'other'
+    pattern = SQL_TABLE_PATTERNS.get(kind)
+    table_match = pattern.search(sql) if pattern else None
+    return kind, (table_match.group(1) if table_match else '-')
+
+
+class InstrumentedCursor:
+    """记录每条 SQL 的耗时和行数的游标包装，其余属性透传给原游标"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._labels = {'kind': 'other', 'table': '-'}
+
+    def _run(self, method, operation, *args, **kwargs):
+        kind, table = classify_sql(operation if isinstance(operation, str) else str(operation))
+        self._labels = {'kind': kind, 'table': table}
+        start = time.perf_counter()
+        try:
+            result = method(operation, *args, **kwargs)
+        except Exception:
+            DB_QUERY_ERRORS.inc(**self._labels)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, **self._labels)
+        if kind in DML_KINDS and self._cursor.rowcount and self._cursor.rowcount > 0:
+            DB_QUERY_ROWS.inc(self._cursor.rowcount, **self._labels)
+        return result
+
+    def execute(self, operation, *args, **kwargs):
+        return self._run(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._run(self._cursor.executemany, operation, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            DB_QUERY_ROWS.inc(1, **self._labels)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        DB_QUERY_ROWS.inc(len(rows), **self._labels)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        DB_QUERY_ROWS.inc(len(rows), **self._labels)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """返回 InstrumentedCursor 的连接包装，其余属性透传给原连接"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
@@ -0,0 +1,246 @@
+import logging
+from mysql.connector import Error
+from policy_rules import load_policy_rules, compute_gift_amount
+from db_locks import named_lock
+
+logger = logging.getLogger(__name__)
+
+# 输出结果物化：把 customer_flow 行加上活动政策、赠品金额后写入 output_results，
+# 物化行用 流向ID 关联来源流向行；手工导入的输出结果行 流向ID 为空，互不影响
+OUTPUT_TABLE = 'output_results'
+SOURCE_TABLE = 'customer_flow'
+CHUNK_SIZE = 5000
+# 首次全量物化的命名锁
+MATERIALIZE_LOCK = 'jxc_output_materialize'
+
+# 物化表需要的额外字段（旧库通过 ensure_output_results_schema 自动补齐）
+MATERIALIZED_COLUMNS = {
+    '流向ID': 'INT',
+    '活动政策': 'VARCHAR(500)',
+    '赠品金额': 'DECIMAL(10,2)',
+}
+OUTPUT_INDEXES = {
+    'idx_output_flow_id': '流向ID',
+    'idx_output_period': '当期日期',
+    'idx_output_product': '物料名称',
+}
+
+# 每个进程只检查一次表结构
+schema_checked = False
+
+
+def describe_columns(cursor, table_name):
+    """返回 {字段名: 类型}，保持表中字段顺序"""
+    cursor.execute(f"DESCRIBE {table_name}")
+    columns = {}
+    for row in cursor.fetchall():
+        col_type = row[1].decode() if isinstance(row[1], (bytes, bytearray)) else row[1]
+        columns[row[0]] = col_type
+    return columns
+
+
+def ensure_output_results_schema(connection):
+    """补齐 output_results 物化所需的字段和索引
+
+    - 增加 流向ID 及 customer_flow 中有而输出结果表没有的字段
+    - 活动政策 改为文本、赠品金额 改为 DECIMAL、进货日期 与流向表保持一致
+    """
+    global schema_checked
+    if schema_checked:
+        return
+    cursor = connection.cursor()
+    try:
+        output_columns = describe_columns(cursor, OUTPUT_TABLE)
+        flow_columns = describe_columns(cursor, SOURCE_TABLE)
+
+        alters = []
+        for col, col_type in MATERIALIZED_COLUMNS.items():
+            if col not in output_columns:
+                alters.append(f"ADD COLUMN `{col}` {col_type}")
+            elif col != '流向ID' and output_columns[col].lower() != col_type.lower():
+                alters.append(f"MODIFY COLUMN `{col}` {col_type}")
+        for col, col_type in flow_columns.items():
+            if col in ('id', '当期日期'):
+                continue
+            if col not in output_columns:
+                alters.append(f"ADD COLUMN `{col}` {col_type}")
+            elif col == '进货日期' and output_columns[col].lower() != col_type.lower():
+                alters.append(f"MODIFY COLUMN `{col}` {col_type}")
+        if alters:
+            logger.info("调整 %s 表结构: %s", OUTPUT_TABLE, alters)
+            cursor.execute(f"ALTER TABLE {OUTPUT_TABLE} " + ', '.join(alters))
+
+        cursor.execute(f"SHOW INDEX FROM {OUTPUT_TABLE}")
+        existing = {row[2] for row in cursor.fetchall()}
+        for index_name, col in OUTPUT_INDEXES.items():
+            if index_name not in existing:
+                cursor.execute(f"CREATE INDEX {index_name} ON {OUTPUT_TABLE} (`{col}`)")
+        connection.commit()
+        schema_checked = True
+    finally:
+        cursor.close()
+
+
+def flow_output_fields(connection):
+    """来源流向表字段（不含 id、当期日期），即物化时复制到输出结果表的字段"""
+    cursor = connection.cursor()
+    try:
+        return [col for col in describe_columns(cursor, SOURCE_TABLE) if col not in ('id', '当期日期')]
+    finally:
+        cursor.close()
+
+
+def build_output_rows(connection, flow_rows):
+    """按已编译的活动政策规则为流向行计算活动政策、赠品金额"""
+    policy_rules = load_policy_rules(connection, (row.get('物料名称') for row in flow_rows))
+    for row in flow_rows:
+        entry = policy_rules.get(row.get('物料名称'))
+        row['活动政策'] = entry['policy'] if entry else ''
+        row['赠品金额'] = compute_gift_amount(entry['rules'], row.get('销售数量', 0)) if entry else 0
+    return flow_rows
+
+
+def materialize_flow_rows(connection, where_sql, params):
+    """把满足条件的流向行重新计算并插入输出结果表（按 id 分块，不提交事务）"""
+    fields = flow_output_fields(connection)
+    select_sql = ', '.join(f"`{f}`" for f in ['id'] + fields + ['当期日期'])
+    insert_columns = ['流向ID'] + fields + ['当期日期', '活动政策', '赠品金额']
+    insert_sql = (f"INSERT INTO {OUTPUT_TABLE} ({', '.join(f'`{c}`' for c in insert_columns)}) "
+                  f"VALUES ({', '.join(['%s'] * len(insert_columns))})")
+
+    cursor = connection.cursor(dictionary=True)
+    total = 0
+    last_id = 0
+    try:
+        while True:
+            cursor.execute(
+                f"SELECT {select_sql} FROM {SOURCE_TABLE} WHERE ({where_sql}) AND id > %s ORDER BY id LIMIT {CHUNK_SIZE}",
+                list(params) + [last_id])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            build_output_rows(connection, rows)
+            cursor.executemany(insert_sql, [
+                [row['id']] + [row[f] for f in fields] + [row['当期日期'], row['活动政策'], row['赠品金额']]
+                for row in rows
+            ])
+            total += len(rows)
+            if len(rows) < CHUNK_SIZE:
+                break
+    finally:
+        cursor.close()
+    return total
+
+
+def refresh_output_days(connection, days=None):
+    """重新物化指定当期日期的输出结果；days 为 None 时全量重建"""
+    ensure_output_results_schema(connection)
+    cursor = connection.cursor()
+    try:
+        if days is None:
+            cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE 流向ID IS NOT NULL")
+            where_sql, params = "1=1", []
+        else:
+            days = sorted(set(days))
+            if not days:
+                return 0
+            placeholders = ', '.join(['%s'] * len(days))
+            cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE 流向ID IS NOT NULL AND 当期日期 IN ({placeholders})", days)
+            where_sql, params = f"当期日期 IN ({placeholders})", days
+        deleted = cursor.rowcount
+        inserted = materialize_flow_rows(connection, where_sql, params)
+        connection.commit()
+        logger.info("输出结果物化完成: 当期日期=%s, 删除 %s 行, 写入 %s 行", days if days is not None else '全部', deleted, inserted)
+        return inserted
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def refresh_output_flow_ids(connection, flow_ids):
+    """按流向行 id 重新物化（行级新增、修改、删除）"""
+    ensure_output_results_schema(connection)
+    flow_ids = sorted({int(i) for i in flow_ids})
+    if not flow_ids:
+        return 0
+    cursor = connection.cursor()
+    try:
+        inserted = 0
+        for start in range(0, len(flow_ids), CHUNK_SIZE):
+            chunk = flow_ids[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE 流向ID IN ({placeholders})", chunk)
+            inserted += materialize_flow_rows(connection, f"id IN ({placeholders})", chunk)
+        connection.commit()
+        logger.info("输出结果物化完成: 流向行 %s 个, 写入 %s 行", len(flow_ids), inserted)
+        return inserted
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def refresh_output_products(connection, products):
+    """活动政策变化后，只重算相关产品的活动政策和赠品金额"""
+    ensure_output_results_schema(connection)
+    products = sorted(p for p in set(products or []) if p)
+    if not products:
+        return 0
+    policy_rules = load_policy_rules(connection, products)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        placeholders = ', '.join(['%s'] * len(products))
+        cursor.execute(
+            f"SELECT id, 物料名称, 销售数量 FROM {OUTPUT_TABLE} WHERE 流向ID IS NOT NULL AND 物料名称 IN ({placeholders})",
+            products)
+        updates = []
+        for row in cursor.fetchall():
+            entry = policy_rules.get(row['物料名称'])
+            policy = entry['policy'] if entry else ''
+            amount = compute_gift_amount(entry['rules'], row['销售数量']) if entry else 0
+            updates.append((policy, amount, row['id']))
+        for start in range(0, len(updates), CHUNK_SIZE):
+            cursor.executemany(f"UPDATE {OUTPUT_TABLE} SET 活动政策=%s, 赠品金额=%s WHERE id=%s",
+                               updates[start:start + CHUNK_SIZE])
+        connection.commit()
+        logger.info("输出结果物化完成: 政策变化产品 %s 个, 更新 %s 行", len(products), len(updates))
+        return len(updates)
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _needs_materialize(connection):
+    """物化表为空而流向表有数据"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT 1 FROM {OUTPUT_TABLE} WHERE 流向ID IS NOT NULL LIMIT 1")
+        materialized = cursor.fetchone() is not None
+        cursor.execute(f"SELECT 1 FROM {SOURCE_TABLE} LIMIT 1")
+        has_source = cursor.fetchone() is not None
+    finally:
+        cursor.close()
+    return has_source and not materialized
+
+
+def ensure_output_materialized(connection):
+    """首次读取时（例如旧库升级后）若物化表为空而流向表有数据，则全量物化一次
+
+    多个请求（可能在不同进程）同时首次读取时用命名锁串行执行，取得锁后重新检查，只物化一次。
+    """
+    ensure_output_results_schema(connection)
+    if not _needs_materialize(connection):
+        return
+    with named_lock(connection, MATERIALIZE_LOCK) as acquired:
+        if not acquired:
+            return
+        # 结束当前事务，重新检查时读到其他连接已提交的物化结果
+        connection.commit()
+        if _needs_materialize(connection):
+            refresh_output_days(connection)
@@ -0,0 +1,198 @@
+import logging
+import re
+from decimal import Decimal
+from mysql.connector import Error
+from schema import create_table_sql
+
+logger = logging.getLogger(__name__)
+
+# 活动政策规则表：导入活动方案时把自由文本的活动政策编译成结构化规则，
+# 读取方（输出结果等）只按产品名称查规则，不再逐行正则解析政策文本
+POLICY_RULES_TABLE = 'activity_policy_rules'
+
+# 规则类型
+RULE_BOX_REBATE = 'box_rebate'    # 购N盒返M元，按购买数量满N盒的倍数返利
+RULE_TIER_REBATE = 'tier_rebate'  # 多档位：购N1盒返M1元、购N2盒返M2元……取满足的最高档
+RULE_PER_BOX = 'per_box'          # 每盒返M元
+RULE_GIFT = 'gift'                # 购N盒赠M盒，赠品金额按供货价折算
+RULE_TEXT = 'text'                # 无法识别的政策，只保留原文
+
+# 政策文本模式（新增模式只需在这里和 compile_policy 中补充，不影响读取端）
+# 政策按标点拆成子句逐句匹配，避免 购10盒返50元，购20盒送3盒 中的"购10盒"与后一句的"送3盒"配对
+CLAUSE_SEPARATOR = re.compile(r'[，,；;。]')
+REBATE_PATTERN = re.compile(r'购(\d+)盒.*?返(\d+(?:\.\d+)?)元')
+PER_BOX_PATTERN = re.compile(r'每盒返(\d+(?:\.\d+)?)元')
+GIFT_PATTERN = re.compile(r'购(\d+)盒.*?[赠送](\d+)盒')
+
+CREATE_POLICY_RULES_SQL = create_table_sql(POLICY_RULES_TABLE)
+
+
+def ensure_policy_rules_table(connection):
+    """确保活动政策规则表存在"""
+    cursor = connection.cursor()
+    cursor.execute(CREATE_POLICY_RULES_SQL)
+    cursor.close()
+
+
+def compile_policy(product, policy, unit_price=None):
+    """把一条活动政策文本编译为规则行列表
+
+    每条规则为字典：产品名称、规则类型、门槛数量、返利金额、赠品数量、单价、活动政策
+    """
+    policy = (policy or '').strip()
+    base = {'产品名称': product, '门槛数量': None, '返利金额': None,
+            '赠品数量': None, '单价': unit_price, '活动政策': policy}
+    if not policy:
+        return []
+
+    clauses = [c for c in CLAUSE_SEPARATOR.split(policy) if c.strip()]
+    rules = []
+    rebates = [m for c in clauses for m in REBATE_PATTERN.findall(c)]
+    if len(rebates) == 1:
+        qty, amount = rebates[0]
+        rules.append(dict(base, 规则类型=RULE_BOX_REBATE, 门槛数量=int(qty), 返利金额=Decimal(amount)))
+    elif len(rebates) > 1:
+        for qty, amount in rebates:
+            rules.append(dict(base, 规则类型=RULE_TIER_REBATE, 门槛数量=int(qty), 返利金额=Decimal(amount)))
+
+    per_box = next((m for m in map(PER_BOX_PATTERN.search, clauses) if m), None)
+    if per_box and not rebates:
+        rules.append(dict(base, 规则类型=RULE_PER_BOX, 门槛数量=1, 返利金额=Decimal(per_box.group(1))))
+
+    gift = next((m for m in map(GIFT_PATTERN.search, clauses) if m), None)
+    if gift:
+        rules.append(dict(base, 规则类型=RULE_GIFT, 门槛数量=int(gift.group(1)), 赠品数量=int(gift.group(2))))
+
+    if not rules:
+        rules.append(dict(base, 规则类型=RULE_TEXT))
+    return rules
+
+
+def compile_policy_rules(connection):
+    """根据 activity_plan 全量重建活动政策规则表
+
+    活动方案只有几十行，每次导入或编辑后整表重建；同名产品以最后导入的一行为准，
+    与原先 {产品名称: 行} 的映射语义一致。返回规则发生变化的产品名称集合。
+    """
+    ensure_policy_rules_table(connection)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT 产品名称, 供货价, 活动政策, 当期日期 FROM activity_plan ORDER BY id")
+        latest = {}
+        for row in cursor.fetchall():
+            if row['产品名称']:
+                latest[row['产品名称']] = row
+
+        cursor.execute(f"SELECT 产品名称, 规则类型, 门槛数量, 返利金额, 赠品数量, 单价, 活动政策 FROM {POLICY_RULES_TABLE}")
+        old_rules = {}
+        for row in cursor.fetchall():
+            old_rules.setdefault(row['产品名称'], []).append(rule_signature(row))
+
+        new_rows = []
+        new_rules = {}
+        for product, plan in latest.items():
+            for rule in compile_policy(product, plan['活动政策'], plan['供货价']):
+                rule['当期日期'] = plan['当期日期']
+                new_rows.append(rule)
+                new_rules.setdefault(product, []).append(rule_signature(rule))
+
+        changed = {p for p in set(old_rules) | set(new_rules)
+                   if sorted(map(repr, old_rules.get(p, []))) != sorted(map(repr, new_rules.get(p, [])))}
+
+        columns = ['产品名称', '规则类型', '门槛数量', '返利金额', '赠品数量', '单价', '活动政策', '当期日期']
+        cursor.execute(f"DELETE FROM {POLICY_RULES_TABLE}")
+        if new_rows:
+            insert_sql = f"INSERT INTO {POLICY_RULES_TABLE} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            cursor.executemany(insert_sql, [[rule[c] for c in columns] for rule in new_rows])
+        connection.commit()
+        logger.info("活动政策规则已重建: %s 个产品, %s 条规则, 变化产品 %s 个", len(latest), len(new_rows), len(changed))
+        return changed
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def rule_signature(rule):
+    """用于比较规则是否变化的元组"""
+    def num(v):
+        return None if v is None else Decimal(str(v)).normalize()
+    return (rule['规则类型'], rule['门槛数量'], num(rule['返利金额']),
+            rule['赠品数量'], num(rule['单价']), rule['活动政策'] or '')
+
+
+def load_policy_rules(connection, products=None):
+    """读取规则，返回 {产品名称: {'policy': 政策原文, 'rules': [规则, ...]}}
+
+    products 为 None 时读取全部规则，否则按索引只取指定产品。
+    规则表不存在时先按 activity_plan 编译。
+    """
+    sql = f"SELECT 产品名称, 规则类型, 门槛数量, 返利金额, 赠品数量, 单价, 活动政策 FROM {POLICY_RULES_TABLE}"
+    params = []
+    if products is not None:
+        products = [p for p in set(products) if p]
+        if not products:
+            return {}
+        sql += f" WHERE 产品名称 IN ({', '.join(['%s'] * len(products))})"
+        params = products
+    cursor = connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute(sql, params)
+        except Error as e:
+            if e.errno != 1146:  # 表不存在
+                raise
+            compile_policy_rules(connection)
+            cursor.execute(sql, params)
+
+        result = {}
+        for row in cursor.fetchall():
+            entry = result.setdefault(row['产品名称'], {'policy': row['活动政策'] or '', 'rules': []})
+            if row['规则类型'] != RULE_TEXT:
+                entry['rules'].append(row)
+        return result
+    finally:
+        cursor.close()
+
+
+def compute_gift_amount(rules, qty):
+    """根据已编译的规则计算赠品金额
+
+    负数数量（退货）按绝对值选档、计算满足门槛的倍数，再取负号，金额与同样数量的正数相反。
+    """
+    if not rules:
+        return 0
+    try:
+        qty = int(qty or 0)
+    except (TypeError, ValueError):
+        return 0
+
+    sign = -1 if qty < 0 else 1
+
+    def times(threshold):
+        return sign * (abs(qty) // threshold)
+
+    total = Decimal(0)
+    tiers = []
+    for rule in rules:
+        rule_type = rule['规则类型']
+        threshold = rule['门槛数量'] or 0
+        amount = Decimal(str(rule['返利金额'] or 0))
+        if rule_type == RULE_BOX_REBATE and threshold > 0:
+            total += amount * times(threshold)
+        elif rule_type == RULE_TIER_REBATE and threshold > 0:
+            tiers.append((threshold, amount))
+        elif rule_type == RULE_PER_BOX:
+            total += amount * qty
+        elif rule_type == RULE_GIFT and threshold > 0:
+            unit_price = Decimal(str(rule['单价'] or 0))
+            total += (rule['赠品数量'] or 0) * times(threshold) * unit_price
+
+    if tiers:
+        reached = [t for t in tiers if abs(qty) >= t[0]]
+        if reached:
+            threshold, amount = max(reached)
+            total += amount * times(threshold)
+
+    return int(total) if total == total.to_integral_value() else float(total)
@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 重查询的执行时间上限和取消。
+# SELECT 语句加 MAX_EXECUTION_TIME 提示（MySQL 5.7.8+，超时报 3024 错误），各接口的上限可用环境变量调整；
+# 前端为每次比对生成 query_id，语句开头带 /* jxc_query:<query_id> */ 注释，取消时对执行该语句的连接发送 KILL QUERY。
+# 取消时总是按注释在 PROCESSLIST 中查找连接（连接池中的连接会被复用，不能只凭登记的连接 id），
+# 因此取消请求落到其他工作进程时也有效；本进程登记的查询用登记时的连接参数，并可在 /api/queries 中查看。
+QUERY_TIMEOUTS_MS = {
+    'join': int(os.environ.get('JXC_QUERY_TIMEOUT_JOIN_MS', 120000)),
+    'dump': int(os.environ.get('JXC_QUERY_TIMEOUT_DUMP_MS', 60000)),
+    'output': int(os.environ.get('JXC_QUERY_TIMEOUT_OUTPUT_MS', 30000)),
+}
+
+ER_QUERY_INTERRUPTED = 1317
+ER_QUERY_TIMEOUT = 3024
+
+# 不允许下划线和 %，查询 PROCESSLIST 时作为 LIKE 模式使用
+QUERY_ID_RE = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+SELECT_RE = re.compile(r'^\s*SELECT\s', re.I)
+
+
+def valid_query_id(query_id):
+    return bool(query_id) and bool(QUERY_ID_RE.match(str(query_id)))
+
+
+def query_tag(query_id):
+    return f"jxc_query:{query_id}"
+
+
+def limit_select(sql, budget, query_id=None):
+    """给 SELECT 语句加执行时间上限提示，有 query_id 时在开头加标识注释"""
+    timeout_ms = QUERY_TIMEOUTS_MS[budget]
+    if timeout_ms > 0 and SELECT_RE.match(sql):
+        sql = SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */ ", sql, count=1)
+    if valid_query_id(query_id):
+        sql = f"{tagged_prefix(query_id)} {sql}"
+    return sql
+
+
+def interrupted_response(error, budget):
+    """查询超时或被取消时返回 (内容, 状态码)，其他错误返回 None"""
+    errno = getattr(error, 'errno', None)
+    if errno == ER_QUERY_TIMEOUT:
+        seconds = QUERY_TIMEOUTS_MS[budget] / 1000
+        return {'error': f'查询超过 {seconds:g} 秒未完成，已终止，请检查关联字段或缩小范围',
+                'error_type': 'QueryTimeout'}, 504
+    if errno == ER_QUERY_INTERRUPTED:
+        return {'error': '查询已取消', 'error_type': 'QueryCancelled'}, 409
+    return None
+
+
+class RunningQueries:
+    """本进程正在执行的可取消查询：query_id -> 连接 id、连接参数、类型、开始时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    @contextmanager
+    def track(self, query_id, connection, budget, dbconf):
+        if not valid_query_id(query_id):
+            yield
+            return
+        entry = {
+            'connection_id': connection.connection_id,
+            'dbconf': dbconf,
+            'budget': budget,
+            'started': time.time(),
+        }
+        with self._lock:
+            self._queries[query_id] = entry
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._queries.get(query_id) is entry:
+                    del self._queries[query_id]
+
+    def get(self, query_id):
+        with self._lock:
+            return self._queries.get(query_id)
+
+    def list(self):
+        now = time.time()
+        with self._lock:
+            items = list(self._queries.items())
+        return [{'query_id': query_id, 'budget': entry['budget'], 'connection_id': entry['connection_id'],
+                 'seconds': round(now - entry['started'], 1)} for query_id, entry in items]
+
+
+running_queries = RunningQueries()
+
+
+def tagged_prefix(query_id):
+    """limit_select 加在语句开头的标识注释"""
+    return f"/* {query_tag(query_id)} */"
+
+
+def find_tagged_connection(cursor, query_id):
+    """按语句开头的标识注释在 PROCESSLIST 中查找执行该查询的连接 id
+
+    只匹配以注释开头的语句：其他取消请求（重复点击、落到其他工作进程）查询 PROCESSLIST 的语句中
+    也含有该标识，但不在开头，不会被误认为要取消的查询。
+    """
+    cursor.execute("SELECT ID FROM information_schema.PROCESSLIST "
+                   "WHERE COMMAND = 'Query' AND INFO LIKE %s AND ID <> CONNECTION_ID()",
+                   (f"{tagged_prefix(query_id)}%",))
+    rows = cursor.fetchall()
+    return rows[0][0] if rows else None
+
+
+def cancel_query(query_id, dbconf, connect):
+    """取消 query_id 对应的查询，返回被 KILL QUERY 的连接 id，找不到（已执行完）时返回 None
+
+    connect(dbconf) 返回上下文管理器形式的连接，用于在同一个数据库上发送 KILL QUERY。
+    """
+    entry = running_queries.get(query_id)
+    if entry is not None:
+        dbconf = entry['dbconf']
+    with connect(dbconf) as conn:
+        cursor = conn.cursor()
+        try:
+            connection_id = find_tagged_connection(cursor, query_id)
+            if connection_id is None:
+                return None
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            logger.info("已取消查询 %s（连接 %s）", query_id, connection_id)
+            return connection_id
+        finally:
+            cursor.close()
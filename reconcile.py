@@ -0,0 +1,273 @@
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from mysql.connector import Error
+from flow_rollup import parse_day
+from schema import create_table_sql
+
+logger = logging.getLogger(__name__)
+
+# 流向与兑付对账：按 客户 + 产品 + 批号 精确分块（哈希），块内按日期窗口和金额容差配对。
+# 每一行只与同一块内的行比较，总耗时与行数近似线性（单个块很大时块内按日期二分查找候选）。
+RESULTS_TABLE = 'reconcile_results'
+FLOW_TABLE = 'customer_flow'
+REDEMPTION_TABLE = 'customer_redemption_details'
+# 两边对应的字段：客户、产品、批号、日期、金额
+FLOW_FIELDS = {'customer': '流入方名称', 'product': '物料名称', 'batch': '批次', 'date': '进货日期', 'amount': '金额'}
+REDEMPTION_FIELDS = {'customer': '三级公司客户名称', 'product': '商品名称', 'batch': '批号', 'date': '业务日期', 'amount': '金额'}
+
+DEFAULT_DATE_WINDOW = 3
+DEFAULT_AMOUNT_TOLERANCE = Decimal('1.00')
+FETCH_SIZE = 5000
+INSERT_CHUNK_SIZE = 2000
+
+# 对账结果状态
+STATUS_EXACT = 'exact'
+STATUS_TOLERANCE = 'tolerance'
+STATUS_FLOW_ONLY = 'flow_only'
+STATUS_REDEMPTION_ONLY = 'redemption_only'
+STATUSES = (STATUS_EXACT, STATUS_TOLERANCE, STATUS_FLOW_ONLY, STATUS_REDEMPTION_ONLY)
+
+CREATE_RESULTS_SQL = create_table_sql(RESULTS_TABLE)
+RESULT_COLUMNS = ['当期日期', '任务ID', '状态', '流向ID', '兑付ID', '客户名称', '产品名称', '批号',
+                  '流向日期', '兑付日期', '流向金额', '兑付金额', '日期差', '金额差']
+
+_table_checked = False
+
+
+def ensure_results_table(connection):
+    global _table_checked
+    if _table_checked:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CREATE_RESULTS_SQL)
+        connection.commit()
+        _table_checked = True
+    finally:
+        cursor.close()
+
+
+def normalize_text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def normalize_batch(value):
+    """批号：去掉首尾空白和 Excel 数字转换留下的 .0"""
+    text = normalize_text(value)
+    return text[:-2] if text.endswith('.0') and text[:-2].isdigit() else text
+
+
+def normalize_amount(value):
+    """金额取绝对值比较（兑付明细中的金额为负数冲减），无法识别时为 None"""
+    if value is None or value == '':
+        return None
+    try:
+        return abs(Decimal(str(value)))
+    except InvalidOperation:
+        return None
+
+
+def prepare_rows(rows, fields):
+    """数据库行 -> (分块键, 日期序号, 金额, 原始行) 的列表"""
+    prepared = []
+    for row in rows:
+        day = parse_day(row.get(fields['date']))
+        key = (normalize_text(row.get(fields['customer'])), normalize_text(row.get(fields['product'])),
+               normalize_batch(row.get(fields['batch'])))
+        prepared.append((key, day.toordinal() if day else None, normalize_amount(row.get(fields['amount'])), row))
+    return prepared
+
+
+def _amount_diff(a, b):
+    """金额差；只有一边有金额时视为不匹配（None），两边都为空时视为相等"""
+    if a is None and b is None:
+        return Decimal(0)
+    if a is None or b is None:
+        return None
+    return abs(a - b)
+
+
+def match_block(flows, redemptions, date_window, amount_tolerance):
+    """块内配对，返回 ([(流向项, 兑付项, 日期差, 金额差)], 未匹配流向项, 未匹配兑付项)
+
+    流向按日期顺序依次选择窗口内尚未配对、日期差最小（其次金额差最小）的兑付行；
+    日期为空的行只与日期同样为空的行配对。
+    """
+    dated = sorted((r for r in redemptions if r[1] is not None), key=lambda r: (r[1], r[3]['id']))
+    undated = [r for r in redemptions if r[1] is None]
+    days = [r[1] for r in dated]
+    used = [False] * len(dated)
+    undated_used = [False] * len(undated)
+    pairs, flow_only = [], []
+
+    for flow in sorted(flows, key=lambda f: (f[1] is None, f[1] or 0, f[3]['id'])):
+        best = None
+        if flow[1] is None:
+            candidates = ((i, undated[i], 0) for i in range(len(undated)) if not undated_used[i])
+        else:
+            lo = bisect_left(days, flow[1] - date_window)
+            hi = bisect_right(days, flow[1] + date_window)
+            candidates = ((i, dated[i], abs(dated[i][1] - flow[1])) for i in range(lo, hi) if not used[i])
+        for i, red, day_diff in candidates:
+            amount_diff = _amount_diff(flow[2], red[2])
+            if amount_diff is None or amount_diff > amount_tolerance:
+                continue
+            rank = (day_diff, amount_diff)
+            if best is None or rank < best[0]:
+                best = (rank, i, red)
+                if rank == (0, 0):
+                    break
+        if best is None:
+            flow_only.append(flow)
+            continue
+        (day_diff, amount_diff), i, red = best
+        if flow[1] is None:
+            undated_used[i] = True
+        else:
+            used[i] = True
+        pairs.append((flow, red, day_diff, amount_diff))
+
+    redemption_only = [r for r, u in zip(dated, used) if not u] + [r for r, u in zip(undated, undated_used) if not u]
+    return pairs, flow_only, redemption_only
+
+
+def reconcile_rows(flow_rows, redemption_rows, date_window=DEFAULT_DATE_WINDOW,
+                   amount_tolerance=DEFAULT_AMOUNT_TOLERANCE):
+    """对账（纯内存计算），返回 (配对列表, 未匹配流向项, 未匹配兑付项)"""
+    blocks = {}
+    for item in prepare_rows(flow_rows, FLOW_FIELDS):
+        blocks.setdefault(item[0], ([], []))[0].append(item)
+    for item in prepare_rows(redemption_rows, REDEMPTION_FIELDS):
+        blocks.setdefault(item[0], ([], []))[1].append(item)
+
+    pairs, flow_only, redemption_only = [], [], []
+    for flows, redemptions in blocks.values():
+        if not flows:
+            redemption_only.extend(redemptions)
+            continue
+        if not redemptions:
+            flow_only.extend(flows)
+            continue
+        block_pairs, block_flow_only, block_redemption_only = match_block(
+            flows, redemptions, date_window, amount_tolerance)
+        pairs.extend(block_pairs)
+        flow_only.extend(block_flow_only)
+        redemption_only.extend(block_redemption_only)
+    return pairs, flow_only, redemption_only
+
+
+def _load_rows(connection, table_name, fields, period):
+    columns = ', '.join(f"`{f}`" for f in ['id'] + list(fields.values()))
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT {columns} FROM {table_name} WHERE 当期日期 = %s", (period,))
+        rows = []
+        while True:
+            chunk = cursor.fetchmany(FETCH_SIZE)
+            if not chunk:
+                return rows
+            rows.extend(chunk)
+    finally:
+        cursor.close()
+
+
+def _day(ordinal):
+    return date.fromordinal(ordinal) if ordinal is not None else None
+
+
+def _result_rows(period, job_id, pairs, flow_only, redemption_only):
+    for flow, red, day_diff, amount_diff in pairs:
+        status = STATUS_EXACT if day_diff == 0 and amount_diff == 0 else STATUS_TOLERANCE
+        customer, product, batch = flow[0]
+        yield (period, job_id, status, flow[3]['id'], red[3]['id'], customer, product, batch,
+               _day(flow[1]), _day(red[1]), flow[2], red[2], day_diff, amount_diff)
+    for flow in flow_only:
+        customer, product, batch = flow[0]
+        yield (period, job_id, STATUS_FLOW_ONLY, flow[3]['id'], None, customer, product, batch,
+               _day(flow[1]), None, flow[2], None, None, None)
+    for red in redemption_only:
+        customer, product, batch = red[0]
+        yield (period, job_id, STATUS_REDEMPTION_ONLY, None, red[3]['id'], customer, product, batch,
+               None, _day(red[1]), None, red[2], None, None)
+
+
+def run_reconciliation(connection, period, date_window=DEFAULT_DATE_WINDOW,
+                       amount_tolerance=DEFAULT_AMOUNT_TOLERANCE, job_id=None, progress=None):
+    """对指定当期日期的流向与兑付明细对账，结果替换该当期日期之前的对账结果，返回各状态行数"""
+    report = progress or (lambda done, total, message: None)
+    ensure_results_table(connection)
+    started = time.perf_counter()
+
+    flow_rows = _load_rows(connection, FLOW_TABLE, FLOW_FIELDS, period)
+    redemption_rows = _load_rows(connection, REDEMPTION_TABLE, REDEMPTION_FIELDS, period)
+    report(0, None, f"已读取流向 {len(flow_rows)} 行、兑付 {len(redemption_rows)} 行，正在配对")
+    pairs, flow_only, redemption_only = reconcile_rows(flow_rows, redemption_rows, date_window, amount_tolerance)
+    matched_at = time.perf_counter()
+
+    rows = list(_result_rows(period, job_id, pairs, flow_only, redemption_only))
+    insert_sql = (f"INSERT INTO {RESULTS_TABLE} ({', '.join(f'`{c}`' for c in RESULT_COLUMNS)}) "
+                  f"VALUES ({', '.join(['%s'] * len(RESULT_COLUMNS))})")
+    cursor = connection.cursor()
+    try:
+        # 删除旧结果和写入新结果在同一个事务中，查询方不会看到写了一半的结果
+        cursor.execute(f"DELETE FROM {RESULTS_TABLE} WHERE 当期日期 = %s", (period,))
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            cursor.executemany(insert_sql, rows[start:start + INSERT_CHUNK_SIZE])
+            report(min(start + INSERT_CHUNK_SIZE, len(rows)), len(rows), "正在保存对账结果")
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    summary = {status: 0 for status in STATUSES}
+    for row in rows:
+        summary[row[2]] += 1
+    summary.update({
+        'period': str(period),
+        'flow_rows': len(flow_rows),
+        'redemption_rows': len(redemption_rows),
+        'match_seconds': round(matched_at - started, 3),
+        'total_seconds': round(time.perf_counter() - started, 3),
+    })
+    logger.info("对账完成: 当期日期=%s, %s", period, summary)
+    return summary
+
+
+def list_results(connection, period, status=None, page=1, per_page=500):
+    """分页读取对账结果，返回 (总行数, 行列表)"""
+    ensure_results_table(connection)
+    where, params = "WHERE 当期日期 = %s", [period]
+    if status:
+        where += " AND 状态 = %s"
+        params.append(status)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT COUNT(*) AS total FROM {RESULTS_TABLE} {where}", params)
+        total = cursor.fetchone()['total']
+        select_sql = ', '.join(
+            f"DATE_FORMAT(`{c}`, '%Y-%m-%d') AS `{c}`" if c in ('当期日期', '流向日期', '兑付日期') else f"`{c}`"
+            for c in ['id'] + RESULT_COLUMNS)
+        cursor.execute(f"SELECT {select_sql} FROM {RESULTS_TABLE} {where} ORDER BY id LIMIT %s OFFSET %s",
+                       params + [per_page, (page - 1) * per_page])
+        return total, cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def result_summary(connection, period):
+    """各状态的对账结果行数"""
+    ensure_results_table(connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT 状态, COUNT(*) FROM {RESULTS_TABLE} WHERE 当期日期 = %s GROUP BY 状态", (period,))
+        counts = dict(cursor.fetchall())
+    finally:
+        cursor.close()
+    return {status: counts.get(status, 0) for status in STATUSES}
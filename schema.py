@@ -0,0 +1,43 @@
+import os
+import re
+import sys
+import threading
+
+# 表结构只写在建表脚本 create_tables_simple.sql 中；各模块按需建表时从脚本中取出对应的 CREATE TABLE 语句，
+# 不在代码里再写一份，避免两处定义不一致。打包时脚本随程序一起分发（见 *.spec 的 datas）
+SCHEMA_FILE = 'create_tables_simple.sql'
+
+CREATE_TABLE_RE = re.compile(r'CREATE TABLE IF NOT EXISTS (\w+)\s*\(', re.I)
+
+_statements = None
+_lock = threading.Lock()
+
+
+def schema_path():
+    """建表脚本路径，兼容开发环境和 PyInstaller 打包后的环境"""
+    base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, SCHEMA_FILE)
+
+
+def _load_statements():
+    """读取建表脚本，返回 {表名: CREATE TABLE 语句（不含结尾分号）}"""
+    with open(schema_path(), encoding='utf-8') as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    statements = {}
+    for stmt in ''.join(lines).split(';'):
+        stmt = stmt.strip()
+        match = CREATE_TABLE_RE.match(stmt)
+        if match:
+            statements[match.group(1)] = stmt
+    return statements
+
+
+def create_table_sql(table):
+    """建表脚本中 table 的 CREATE TABLE IF NOT EXISTS 语句，脚本中没有该表时抛出 KeyError"""
+    global _statements
+    with _lock:
+        if _statements is None:
+            _statements = _load_statements()
+    if table not in _statements:
+        raise KeyError(f"{SCHEMA_FILE} 中没有表 {table} 的建表语句")
+    return _statements[table]
@@ -0,0 +1,109 @@
+"""生产环境启动入口
+
+    python serve.py                      # 生产模式（Linux/macOS 用 gunicorn 多进程，Windows 用 waitress 多线程）
+    python serve.py --workers 4 --threads 8 --timeout 300
+    python serve.py --dev                # Flask 开发服务器（调试器、自动重载），仅用于开发
+
+参数也可以用环境变量设置：JXC_BIND、JXC_WORKERS、JXC_THREADS、JXC_TIMEOUT、JXC_GRACEFUL_TIMEOUT、JXC_MAX_REQUESTS。
+gunicorn 模式下先在主进程中加载应用（Flask 和 mysql 驱动只导入一次），再 fork 出工作进程；
+pandas 在第一次导入或导出 Excel 时才由各工作进程分别加载。
+向主进程发送 HUP 信号可平滑重启工作进程。
+--timeout 不是按请求的超时：gthread 工作进程由主线程发送心跳，某个请求执行再久也不会触发，
+只有整个工作进程卡住（主线程超过 --timeout 秒没有心跳）才会被重启；waitress 模式下它是空闲连接的关闭时间。
+慢查询的上限由 query_control 中各接口的 MAX_EXECUTION_TIME 控制（JXC_QUERY_TIMEOUT_*_MS）。
+"""
+import argparse
+import os
+import sys
+
+DEFAULT_BIND = '0.0.0.0:5000'
+
+
+def default_workers():
+    # 每个工作进程在导入或导出 Excel 后都会各自加载 pandas，内存占用较大，默认不超过 4 个
+    return min(4, (os.cpu_count() or 1) + 1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Excel数据导入系统 Web 服务')
+    parser.add_argument('--dev', action='store_true', help='使用 Flask 开发服务器（debug=True）')
+    parser.add_argument('--bind', default=os.environ.get('JXC_BIND', DEFAULT_BIND), help='监听地址，默认 0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('JXC_WORKERS', default_workers())),
+                        help='工作进程数（waitress 模式下忽略）')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('JXC_THREADS', 8)), help='每个进程的线程数')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('JXC_TIMEOUT', 300)),
+                        help='gunicorn：工作进程无响应多少秒后重启；waitress：空闲连接关闭秒数（不是按请求的超时，默认 300）')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('JXC_GRACEFUL_TIMEOUT', 60)),
+                        help='重启或停止时等待进行中请求完成的秒数')
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('JXC_MAX_REQUESTS', 0)),
+                        help='工作进程处理多少个请求后自动重启（0 表示不重启），可缓解内存增长')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress'], default='auto')
+    return parser.parse_args(argv)
+
+
+def load_app(app=None):
+    """返回 Flask 应用；python web_import.py 和打包的 exe 以 __main__ 运行 web_import，
+    由它把已经创建的 app 传进来，不能再 import web_import（会把整个模块再执行一遍，得到第二个应用）"""
+    if app is None:
+        from web_import import app
+    return app
+
+
+def run_dev(args, app=None):
+    app = load_app(app)
+    host, port = args.bind.rsplit(':', 1)
+    app.run(host=host, port=int(port), debug=True)
+
+
+def run_gunicorn(args, app=None):
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'timeout': args.timeout,
+                'graceful_timeout': args.graceful_timeout,
+                'max_requests': args.max_requests,
+                'max_requests_jitter': args.max_requests // 10 if args.max_requests else 0,
+                'preload_app': True,
+                'accesslog': None,  # 访问日志由应用自己记录（带 request_id 和耗时）
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(app)
+
+    ProductionApplication().run()
+
+
+def run_waitress(args, app=None):
+    # Windows（包括 PyInstaller 打包的 exe）没有 fork，使用单进程多线程的 waitress；
+    # waitress 没有按请求的超时，channel_timeout 只回收空闲连接
+    from waitress import serve
+    app = load_app(app)
+    host, port = args.bind.rsplit(':', 1)
+    serve(app, host=host, port=int(port), threads=args.threads,
+          channel_timeout=args.timeout, ident='jinxiaocun')
+
+
+def main(argv=None, app=None):
+    args = parse_args(argv)
+    if args.dev:
+        run_dev(args, app)
+        return
+    server = args.server
+    if server == 'auto':
+        server = 'waitress' if sys.platform == 'win32' else 'gunicorn'
+    if server == 'gunicorn':
+        run_gunicorn(args, app)
+    else:
+        run_waitress(args, app)
+
+
+if __name__ == '__main__':
+    main()
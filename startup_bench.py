@@ -0,0 +1,96 @@
+"""测量冷启动耗时
+
+    python startup_bench.py importtime                     # python -X importtime 导入 web_import，列出最慢的模块
+    python startup_bench.py serve --runs 5                 # 源码方式启动（python serve.py --server waitress）
+    python startup_bench.py serve --cmd "dist/web_import/web_import --server waitress --bind 127.0.0.1:{port}"
+
+serve 模式从启动进程开始计时，直到 /metrics 返回 200（不需要数据库），每次启动后结束进程，
+输出每次耗时和中位数。打包后的程序（单文件 / 目录模式）用 --cmd 指定，{port} 会被替换为端口。
+"""
+import argparse
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+DEFAULT_PORT = 5077
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)')
+
+
+def importtime(module='web_import', top=15):
+    """用 -X importtime 导入模块，返回 (总耗时秒, [(累计微秒, 自身微秒, 模块名)])"""
+    env = dict(os.environ, JXC_LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=env)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((int(match.group(2)), int(match.group(1)), match.group(4)))
+    total = next((cumulative for cumulative, _, name in entries if name == module), 0)
+    entries.sort(reverse=True)
+    return total / 1e6, entries[:top]
+
+
+def time_startup(cmd, port, timeout=120):
+    """启动命令，返回 /metrics 首次返回 200 的耗时（秒）"""
+    args = shlex.split(cmd.format(python=sys.executable, port=port))
+    env = dict(os.environ, JXC_LOG_LEVEL='WARNING')
+    started = time.perf_counter()
+    proc = subprocess.Popen(args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"进程已退出: {proc.returncode}（{cmd}）")
+            try:
+                with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise SystemExit(f"启动超时（{timeout}s）: {cmd}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量冷启动耗时')
+    sub = parser.add_subparsers(dest='mode', required=True)
+    p_import = sub.add_parser('importtime', help='python -X importtime 导入 web_import')
+    p_import.add_argument('--module', default='web_import')
+    p_import.add_argument('--top', type=int, default=15)
+    p_serve = sub.add_parser('serve', help='启动服务直到 /metrics 可用')
+    p_serve.add_argument('--cmd', default='{python} serve.py --server waitress --bind 127.0.0.1:{port}',
+                         help='启动命令，可用 {python}、{port} 占位')
+    p_serve.add_argument('--runs', type=int, default=5)
+    p_serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.mode == 'importtime':
+        total, entries = importtime(args.module, args.top)
+        print(f"import {args.module}: {total * 1000:.0f} ms")
+        print(f"{'累计ms':>8} {'自身ms':>8}  模块")
+        for cumulative, self_us, name in entries:
+            print(f"{cumulative / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+        return
+
+    timings = []
+    for i in range(args.runs):
+        elapsed = time_startup(args.cmd, args.port)
+        timings.append(elapsed)
+        print(f"第 {i + 1} 次: {elapsed:.2f}s")
+    print(f"中位数 {statistics.median(timings):.2f}s，最快 {min(timings):.2f}s，最慢 {max(timings):.2f}s")
+
+
+if __name__ == '__main__':
+    main()
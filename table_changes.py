@@ -0,0 +1,55 @@
+import logging
+from policy_rules import compile_policy_rules
+from output_materialize import refresh_output_days, refresh_output_flow_ids, refresh_output_products, OUTPUT_TABLE
+from table_versions import bump_table_version
+from flow_rollup import refresh_rollup_days, rollup_days_for_ids
+from customer_names import refresh_name_index
+
+logger = logging.getLogger(__name__)
+
+
+def notify_table_changed(connection, table_name, days=None, ids=None):
+    """源表数据变化后维护派生数据（活动政策规则、输出结果物化表、流向日汇总、客户名称映射）
+
+    - days: 发生变化的当期日期（导入按天整批替换）
+    - ids: 发生变化的行 id（行级新增、修改、删除）
+    days 和 ids 都为 None 时按全量变化处理；给出了空列表（没有任何行变化）时什么也不做。
+    派生数据维护失败不影响源表已提交的修改。同时更新表数据版本，使数据接口的 ETag 失效。
+    """
+    if (days is not None or ids is not None) and not days and not ids:
+        logger.debug("%s 没有行变化，不维护派生数据", table_name)
+        return
+    bump_table_version(table_name)
+    rollup_days = days
+    if table_name == 'customer_flow' and ids:
+        # 行级修改要在输出结果重新物化前确定涉及的当期日期（被删除行的日期只能从输出结果中找到）
+        id_days = rollup_days_for_ids(connection, ids)
+        rollup_days = None if id_days is None else list(set(id_days) | set(days or []))
+    try:
+        if table_name == 'activity_plan':
+            changed_products = compile_policy_rules(connection)
+            refresh_output_products(connection, changed_products)
+        elif table_name == 'customer_flow':
+            if ids:
+                refresh_output_flow_ids(connection, ids)
+            if days:
+                refresh_output_days(connection, days)
+            if ids is None and days is None:
+                refresh_output_days(connection)
+    except Exception as e:
+        logger.exception("维护 %s 派生数据失败: %s", table_name, e)
+    finally:
+        if table_name == 'customer_flow':
+            try:
+                refresh_rollup_days(connection, rollup_days)
+            except Exception as e:
+                logger.exception("维护流向日汇总失败: %s", e)
+        if days and table_name in ('customer_flow', 'customer_redemption_details'):
+            # 导入后为新出现的客户名称计算映射（行级修改不更新，下次导入或手动刷新时补上）
+            try:
+                refresh_name_index(connection)
+            except Exception as e:
+                logger.exception("维护客户名称映射失败: %s", e)
+        if table_name in ('activity_plan', 'customer_flow'):
+            # 输出结果由这两个表派生，维护失败时也可能已部分刷新
+            bump_table_version(OUTPUT_TABLE)
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import uuid
+
+# 表数据版本：导入和页面编辑后更新，数据接口据此生成 ETag，
+# 浏览器带 If-None-Match 再次请求时不查 MySQL 直接返回 304。
+# 版本保存在文件中（每个表一个文件），多个工作进程共享；直接改库不会更新版本。
+
+
+def _app_base_dir():
+    """程序所在目录：打包后为 exe 所在目录（不是每次启动都不同的解压目录），源码运行时为本文件所在目录"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+# 按程序目录而不是当前工作目录定位，从其他目录启动时仍使用同一组版本文件
+VERSION_DIR = os.path.join(_app_base_dir(), 'uploads', '.versions')
+# 只有这些表有版本号（其他表名不生成 ETag，也不在磁盘上创建文件）
+VERSIONED_TABLES = ('customer_redemption_details', 'customer_flow', 'activity_plan', 'output_results')
+# 还没有版本文件（首次部署、重新部署或清空了 uploads）时的版本号：每个进程启动时随机生成，
+# 不能用固定值，否则浏览器缓存的旧 ETag 会与变化后的数据匹配，得到过期的 304。
+# 不同工作进程的值不同，只会少一些 304，不会返回过期数据；第一次更新版本后各进程一致
+INITIAL_VERSION = uuid.uuid4().hex[:16]
+
+_lock = threading.Lock()
+_TABLE_NAME_RE = re.compile(r'^\w+$')
+
+
+def _version_path(table_name):
+    if not _TABLE_NAME_RE.match(table_name or ''):
+        raise ValueError(f"无效的表名: {table_name!r}")
+    return os.path.join(VERSION_DIR, f"{table_name}.version")
+
+
+def get_table_version(table_name):
+    """当前版本号；读取时不创建文件，还没有版本文件时返回 INITIAL_VERSION"""
+    if table_name not in VERSIONED_TABLES:
+        raise ValueError(f"没有版本号的表: {table_name!r}")
+    try:
+        with open(_version_path(table_name), encoding='utf-8') as f:
+            version = f.read().strip()
+        if version:
+            return version
+    except FileNotFoundError:
+        pass
+    return INITIAL_VERSION
+
+
+def bump_table_version(table_name):
+    """表数据发生变化，生成新版本号并返回；没有版本号的表返回 None"""
+    if table_name not in VERSIONED_TABLES:
+        return None
+    version = uuid.uuid4().hex[:16]
+    path = _version_path(table_name)
+    with _lock:
+        os.makedirs(VERSION_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+        # 原子替换，其他进程不会读到写了一半的文件
+        os.replace(tmp_path, path)
+    return version
+
+
+def data_etag(table_names, params):
+    """由相关表的版本号和请求参数生成 ETag，表名不在 VERSIONED_TABLES 中时返回 None（不做协商缓存）"""
+    try:
+        versions = {t: get_table_version(t) for t in table_names}
+    except ValueError:
+        return None
+    raw = json.dumps([versions, params], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
@@ -1,12 +1,44 @@
 import os
-import re
 import sys
-from flask import Flask, request, render_template_string, jsonify, send_file
+import json
+import time
+import hashlib
+import gzip
+import mimetypes
+import uuid
+import logging
+from decimal import Decimal
+from flask import Flask, request, render_template, jsonify, send_file, g, Response
 from werkzeug.utils import secure_filename
-from data_import import import_excel_data, create_connection
-import mysql.connector
+from data_import import import_excel_data, create_connection, load_pandas
+from table_changes import notify_table_changed
+from output_materialize import ensure_output_materialized, flow_output_fields
+from import_runs import list_import_runs, profile_report, IMPORT_RUNS_TABLE
 from mysql.connector import Error
-import pandas as pd
+from log_config import setup_logging, request_id_var, mask_dbconf
+from metrics import render_metrics, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT
+from assets import AssetManifest, ASSET_MAX_AGE
+from json_response import json_response, columnar_result, compress_response
+from table_versions import data_etag, get_table_version, VERSIONED_TABLES
+from bulk_mutate import apply_bulk_mutation, BulkMutationError
+from filter_delete import count_matching, delete_matching, SYNC_DELETE_LIMIT
+from jobs import submit_job, get_job, find_job, list_jobs, fail_stale_jobs
+from export_jobs import (write_export, export_path, export_expired, cleanup_exports, export_download_name,
+                         EXPORT_FOLDER, EXPORT_FORMATS, EXPORT_RETENTION_HOURS)
+from database_config import get_connection_config
+from compare_pools import compare_connections
+from admission import admission
+from query_control import limit_select, interrupted_response, running_queries, cancel_query, valid_query_id
+from customer_names import (refresh_name_index, list_name_index, has_name_index, name_join_pair,
+                            INDEX_TABLE as NAME_INDEX_TABLE, FLOW_NAME_FIELDS, REDEMPTION_NAME_FIELD, MATCH_TYPES)
+from flow_rollup import run_aggregate, parse_day, AggregateError, AGGREGATE_DEFAULT_LIMIT
+from reconcile import (run_reconciliation, list_results as list_reconcile_results, result_summary as reconcile_summary,
+                       DEFAULT_DATE_WINDOW, DEFAULT_AMOUNT_TOLERANCE, STATUSES as RECONCILE_STATUSES)
+
+setup_logging()
+# 直接运行本脚本时 __name__ 为 '__main__'，这里使用固定的日志名称
+logger = logging.getLogger('web_import')
+access_logger = logging.getLogger('web_import.access')
 
 def resource_path(relative_path):
     """获取资源的绝对路径，兼容开发环境和打包后的环境"""
@@ -36,76 +68,222 @@ TABLE_DISPLAY_NAMES = {
     'output_results': '输出结果',
 }
 
-app = Flask(__name__, static_folder=resource_path('static'))
+app = Flask(__name__, static_folder=resource_path('static'), template_folder=resource_path('templates'))
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB
 
+# 指纹化、预压缩的静态资源（python build_assets.py 生成），模板中用 asset_url('文件名') 引用
+ASSETS = AssetManifest(resource_path(os.path.join('static', 'dist')))
+app.jinja_env.globals['asset_url'] = ASSETS.url
+
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+@app.before_request
+def start_request_log():
+    """为每个请求分配 request_id，同一请求的日志据此串联"""
+    g.request_started = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12]
+    g.request_id_token = request_id_var.set(g.request_id)
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def finish_request_log(response):
+    """每个请求记录一条访问日志，并在响应头中返回 request_id"""
+    duration = time.perf_counter() - g.get('request_started', time.perf_counter())
+    duration_ms = duration * 1000
+    response.headers['X-Request-ID'] = g.get('request_id', '-')
+    # 按路由模板（而不是实际路径）打标签，避免标签数量无限增长
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(duration, route=route, method=request.method, status=response.status_code)
+    access_logger.info("method=%s path=%s status=%s duration_ms=%.1f",
+                       request.method, request.path, response.status_code, duration_ms)
+    return response
+
+@app.after_request
+def compress_json(response):
+    """较大的 JSON 响应按 Accept-Encoding 压缩（在访问日志之前执行）"""
+    return compress_response(response, request.accept_encodings)
+
+@app.teardown_request
+def reset_request_log(exc=None):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        HTTP_IN_FLIGHT.dec()
+        request_id_var.reset(token)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 文本格式的进程内指标"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/healthz')
+def healthz():
+    """健康检查：测量一次数据库往返（连接 + SELECT 1）耗时"""
+    start = time.perf_counter()
+    conn = create_connection()
+    if not conn:
+        return jsonify({'status': 'error', 'database': 'unavailable'}), 503
+    try:
+        connect_ms = (time.perf_counter() - start) * 1000
+        query_start = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        query_ms = (time.perf_counter() - query_start) * 1000
+        return jsonify({'status': 'ok', 'database': 'ok',
+                        'connect_ms': round(connect_ms, 2), 'query_ms': round(query_ms, 2)})
+    except Error as e:
+        logger.error("健康检查失败: %s", e)
+        return jsonify({'status': 'error', 'database': str(e)}), 503
+    finally:
+        conn.close()
+
+def check_not_modified(etag):
+    """请求的 If-None-Match 与 ETag 匹配时返回 304 响应，否则返回 None
+
+    ETag 在查询数据库之前由表版本号计算，匹配时完全不访问 MySQL。
+    使用弱 ETag：同一份数据压缩（gzip / br）前后视为相同。
+    """
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+def with_etag(response, etag):
+    """设置 ETag，并要求浏览器每次使用缓存前先向服务器确认"""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def is_local_database(dbconf):
+    """dbconf 是否就是本系统配置的数据库（包括账号密码一致，304 时不经 MySQL 校验身份）"""
+    if not isinstance(dbconf, dict):
+        return False
+    config = get_connection_config()
+    try:
+        return (dbconf.get('host', 'localhost') == config.get('host')
+                and int(dbconf.get('port', 3306)) == int(config.get('port', 3306))
+                and dbconf.get('user', 'root') == config.get('user')
+                and dbconf.get('password', '') == config.get('password')
+                and dbconf.get('database', '') == config.get('database'))
+    except (TypeError, ValueError):
+        return False
+
+def request_args_key():
+    """请求参数（用于计算 ETag），与参数顺序无关"""
+    return sorted((k, sorted(v)) for k, v in request.args.lists())
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].strip().lower() in ALLOWED_EXTENSIONS
 
 
 
-def get_table_data(table_name, page=1, per_page=500, sort_field=None, sort_order='ASC', search_term=None, fields=None):
-    """获取表数据，支持分页、排序和搜索，可选字段"""
-    try:
-        conn = create_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # 获取表结构
-        cursor.execute(f"DESCRIBE {table_name}")
-        all_columns = [row['Field'] for row in cursor.fetchall()]
-        
-        # 过滤掉已删除字段
-        if table_name == 'customer_redemption_details':
-            all_columns = [col for col in all_columns if col not in REMOVED_FIELDS]
-        
-        # 处理查询字段
-        if fields:
-            select_fields = [f.strip() for f in fields.split(',') if f.strip() and f.strip() in all_columns]
-            if not select_fields:
-                select_fields = all_columns
+def parse_filters(raw):
+    """解析按字段过滤条件，支持 JSON 字符串或字典，返回 {字段: 关键词}"""
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return {}
+    if not isinstance(raw, dict):
+        return {}
+    return {str(k): str(v).strip() for k, v in raw.items() if v is not None and str(v).strip() != ''}
+
+def build_where_clause(column_exprs, search_fields, search_term=None, filters=None, base_conditions=None):
+    """构建 WHERE 子句
+
+    column_exprs: {字段名: SQL表达式}，只有其中的字段可以参与过滤
+    search_fields: 参与全文搜索（任一字段包含关键词）的字段
+    filters: {字段名: 关键词}，每个字段都需包含对应关键词
+    base_conditions: 额外的固定条件
+    """
+    conditions = list(base_conditions or [])
+    params = []
+    if search_term:
+        search_conditions = []
+        for col in search_fields:
+            if col != 'id' and col != '当期日期':  # 排除id和日期字段
+                search_conditions.append(f"{column_exprs[col]} LIKE %s")
+                params.append(f"%{search_term}%")
+        if search_conditions:
+            conditions.append("(" + " OR ".join(search_conditions) + ")")
+    for col, value in (filters or {}).items():
+        if col in column_exprs:
+            conditions.append(f"{column_exprs[col]} LIKE %s")
+            params.append(f"%{value}%")
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_clause, params
+
+def build_order_clause(column_exprs, sort_field, sort_order, default_order=""):
+    """构建多字段排序，排序方向支持 ASC/DESC 或 ASC(字段) 两种写法"""
+    if not sort_field:
+        return default_order
+    sort_fields = [f.strip() for f in sort_field.split(',') if f.strip() and f.strip() in column_exprs]
+    sort_orders = [o.strip() for o in sort_order.split(',')] if sort_order else []
+    named_orders = {}
+    plain_orders = []
+    for item in sort_orders:
+        if '(' in item and item.endswith(')'):
+            direction, field = item[:-1].split('(', 1)
+            named_orders[field] = direction.upper()
         else:
+            plain_orders.append(item.upper())
+    order_items = []
+    for idx, field in enumerate(sort_fields):
+        order = named_orders.get(field) or (plain_orders[idx] if idx < len(plain_orders) else 'ASC')
+        if order not in ('ASC', 'DESC'):
+            order = 'ASC'
+        order_items.append(f"{column_exprs[field]} {order}")
+    if not order_items:
+        return default_order
+    return "ORDER BY " + ", ".join(order_items)
+
+def get_table_columns(conn, table_name):
+    """表的全部字段（customer_redemption_details 过滤掉已删除字段）"""
+    cursor = conn.cursor()
+    cursor.execute(f"DESCRIBE {table_name}")
+    all_columns = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    if table_name == 'customer_redemption_details':
+        all_columns = [col for col in all_columns if col not in REMOVED_FIELDS]
+    return all_columns
+
+def build_table_filter(all_columns, search_term=None, fields=None, filters=None):
+    """查询页的过滤条件：在所选字段（fields，逗号分隔）中搜索，按字段过滤可用全部字段
+
+    返回 (所选字段, WHERE 子句, 参数)，查询、按条件删除、导出共用同一套条件。
+    """
+    if fields:
+        select_fields = [f.strip() for f in fields.split(',') if f.strip() and f.strip() in all_columns]
+        if not select_fields:
             select_fields = all_columns
-        select_fields_sql = ', '.join(select_fields)
-        
-        # 构建查询条件
-        where_clause = ""
-        params = []
-        if search_term:
-            # 构建搜索条件（在所有文本字段中搜索）
-            search_conditions = []
-            for col in select_fields:
-                if col != 'id' and col != '当期日期':  # 排除id和日期字段
-                    search_conditions.append(f"`{col}` LIKE %s")
-                    params.append(f"%{search_term}%")
-            if search_conditions:
-                where_clause = "WHERE " + " OR ".join(search_conditions)
+    else:
+        select_fields = all_columns
+    column_exprs = {col: f"`{col}`" for col in all_columns}
+    where_clause, params = build_where_clause(column_exprs, select_fields, search_term, filters)
+    return select_fields, where_clause, params
+
+def get_table_data(table_name, page=1, per_page=500, sort_field=None, sort_order='ASC', search_term=None, fields=None, filters=None):
+    """获取表数据，支持分页、排序、搜索和按字段过滤，可选字段"""
+    try:
+        conn = create_connection()
         
-        # 调试信息
-        print(f"搜索条件: {where_clause}")
-        print(f"参数数量: {len(params)}")
-        print(f"参数内容: {params}")
+        # 获取表结构，构建查询条件
+        all_columns = get_table_columns(conn, table_name)
+        select_fields, where_clause, params = build_table_filter(all_columns, search_term, fields, filters)
+        cursor = conn.cursor(dictionary=True)
         
         # 构建多字段排序
-        order_clause = ""
-        if sort_field:
-            sort_fields = [f.strip() for f in sort_field.split(',') if f.strip() and f.strip() in select_fields]
-            sort_orders = [o.strip().upper() for o in sort_order.split(',')] if sort_order else []
-            order_items = []
-            for idx, field in enumerate(sort_fields):
-                order = sort_orders[idx] if idx < len(sort_orders) and sort_orders[idx] in ('ASC', 'DESC') else 'ASC'
-                order_items.append(f"`{field}` {order}")
-            if order_items:
-                order_clause = "ORDER BY " + ", ".join(order_items)
+        order_clause = build_order_clause({col: f"`{col}`" for col in select_fields}, sort_field, sort_order)
         
         # 获取总记录数
         count_query = f"SELECT COUNT(*) as total FROM {table_name} {where_clause}"
-        print(f"=== 执行SQL查询 ===")
-        print(f"计数查询: {count_query}")
-        print(f"参数: {params}")
+        logger.debug("计数查询: %s 参数: %s", count_query, params)
         cursor.execute(count_query, params)
         total_records = cursor.fetchone()['total']
         
@@ -127,11 +305,7 @@ def get_table_data(table_name, page=1, per_page=500, sort_field=None, sort_order
             {order_clause}
             LIMIT {per_page} OFFSET {offset}
         """
-        print(f"数据查询: {query}")
-        print(f"参数: {params}")
-        print(f"参数数量: {len(params)}")
-        print(f"SQL中的占位符数量: {query.count('%s')}")
-        print(f"=== SQL查询结束 ===")
+        logger.debug("数据查询: %s 参数: %s", query, params)
         cursor.execute(query, params)
         data = cursor.fetchall()
         
@@ -151,7 +325,7 @@ def get_table_data(table_name, page=1, per_page=500, sort_field=None, sort_order
             'per_page': per_page
         }
     except Error as e:
-        print(f"数据库查询错误: {e}")
+        logger.error("数据库查询错误: %s", e)
         return None
 
 # 在所有涉及customer_redemption_details表字段的地方，去除以下字段：
@@ -165,25 +339,29 @@ REMOVED_FIELDS = [
     '开始时间', '业务量', '单价', '细单编号', '单据编号', '区域'
 ]
 
+def upload_rejected(gate, reason):
+    response = app.make_response(render_template('upload.html', result_msgs=['服务器正在处理其他导入，请稍后重试。']))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(gate.retry_after())
+    return response
+
 @app.route('/', methods=['GET', 'POST'])
+@admission('upload', methods=('POST',), rejected=upload_rejected)
 def upload_file():
     result_msgs = []
     if request.method == 'POST':
-        print("收到POST请求")  # 调试输出
-        print("request.files:", request.files)  # 调试输出
+        logger.debug("收到POST请求")
         files = request.files.getlist('file')
-        print("files内容:", files)  # 调试输出
-        if files:
-            print("第一个文件名:", files[0].filename)  # 调试输出
+        logger.debug("上传文件: %s", [f.filename for f in files])
         if not files or files[0].filename == '':
             result_msgs.append('请选择要上传的文件！')
         else:
             conn = create_connection()
+            # profile=1 时为本次导入保存 cProfile 结果（见 /import_runs）
+            profile = (request.args.get('profile') or request.form.get('profile')) == '1'
             for file in files:
                 filename = file.filename  # 先用原始文件名
-                print(f"收到文件: {filename}")  # 调试输出
-                ext = filename.rsplit('.', 1)[1].strip().lower() if '.' in filename else ''
-                print(f"扩展名: {ext}")         # 调试输出
+                logger.info("收到上传文件: %s", filename)
                 if allowed_file(filename):
                     # 判断文件名对应的表
                     base = os.path.splitext(filename)[0]
@@ -195,221 +373,18 @@ def upload_file():
                     save_path = os.path.join(app.config['UPLOAD_FOLDER'], safe_filename)
                     file.save(save_path)
                     try:
-                        import_excel_data(save_path, table_name, conn)
-                        result_msgs.append(f'文件 {filename} 导入成功！')
+                        run = import_excel_data(save_path, table_name, conn, profile=profile)
+                        if run['状态'] == 'success':
+                            result_msgs.append(f"文件 {filename} 导入成功！共 {run['导入行数']} 行，耗时 {run['总耗时']} 秒")
+                        else:
+                            result_msgs.append(f"文件 {filename} 导入失败：{run['错误信息']}")
                     except Exception as e:
                         result_msgs.append(f'文件 {filename} 导入失败：{e}')
                 else:
                     result_msgs.append(f'文件 {filename} 格式不支持，仅支持xls/xlsx。')
             if conn:
                 conn.close()
-    return render_template_string(r'''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <title>Excel数据导入系统</title>
-    <style>
-        body, html {
-            margin: 0;
-            padding: 0;
-            width: 100vw;
-            height: 100vh;
-            background: #f6f8fa;
-            background-image: url('/static/finance_bg.jpg');
-            background-size: cover;
-            background-position: center center;
-            background-repeat: no-repeat;
-            background-attachment: fixed; /* 可选，让背景固定不随内容滚动 */
-        }
-        .container {
-            width: 420px;
-            margin: 48px auto 0 auto;
-            background: #fff;
-            border-radius: 18px;
-            box-shadow: 0 4px 24px rgba(60,60,120,0.13);
-            overflow: hidden;
-            padding: 32px 32px 24px 32px;
-            min-height: unset;
-        }
-        .logo {
-            display: block;
-            margin: 0 auto 18px auto;
-            width: 80px;
-            height: 80px;
-            object-fit: contain;
-            border-radius: 16px;
-            box-shadow: 0 2px 8px rgba(60,60,120,0.10);
-            background: #fff;
-            animation: logoPop 1.2s cubic-bezier(.5,-0.2,.5,1.4);
-        }
-        @keyframes logoPop {
-            0% { opacity: 0; transform: scale(0.5) rotate(-20deg); }
-            60% { opacity: 1; transform: scale(1.1) rotate(8deg); }
-            100% { opacity: 1; transform: scale(1) rotate(0); }
-        }
-        h2 {
-            text-align: center;
-            color: #333;
-            letter-spacing: 2px;
-        }
-        .msg {
-            margin: 10px 0;
-            color: #007700;
-        }
-        .error {
-            color: #bb2222;
-        }
-       
-        .upload-btn {
-            background: linear-gradient(90deg, #4f8cff 0%, #6ed0ff 100%);
-            color: #fff;
-            border: none;
-            padding: 12px 32px;
-            border-radius: 24px;
-            cursor: pointer;
-            font-size: 18px;
-            font-weight: bold;
-            box-shadow: 0 2px 8px rgba(79,140,255,0.15);
-            transition: background 0.2s, box-shadow 0.2s;
-            position: relative;
-            overflow: hidden;
-        }
-        .upload-btn:hover {
-            background: linear-gradient(90deg, #3578e5 0%, #4fd0ff 100%);
-            box-shadow: 0 4px 16px rgba(79,140,255,0.25);
-        }
-        /* 波纹动画 */
-        .ripple {
-            position: absolute;
-            border-radius: 50%;
-            transform: scale(0);
-            animation: ripple 0.6s linear;
-            background-color: rgba(255,255,255,0.5);
-            pointer-events: none;
-        }
-        @keyframes ripple {
-            to {
-                transform: scale(2.5);
-                opacity: 0;
-            }
-        }
-        .file-input-wrapper {
-            position: relative;
-            display: inline-block;
-            width: 100%;
-            margin: 20px 0 30px 0;
-        }
-        .file-input {
-            opacity: 0;
-            width: 100%;
-            height: 48px;
-            position: absolute;
-            left: 0;
-            top: 0;
-            cursor: pointer;
-        }
-        .file-label {
-            display: block;
-            width: 100%;
-            height: 48px;
-            background: #f0f4ff;
-            border: 2px dashed #4f8cff;
-            border-radius: 12px;
-            text-align: center;
-            line-height: 48px;
-            color: #3578e5;
-            font-size: 16px;
-            font-weight: 500;
-            cursor: pointer;
-            transition: background 0.2s, border 0.2s;
-        }
-        .file-label:hover {
-            background: #e6f0ff;
-            border-color: #3578e5;
-        }
-        input[type=file] {
-            display: none;
-        }
-        .nav-buttons {
-            text-align: center;
-            margin-top: 20px;
-        }
-        .nav-btn {
-            background: linear-gradient(90deg, #28a745 0%, #20c997 100%);
-            color: #fff;
-            border: none;
-            padding: 12px 24px; /* 增加内边距 */
-            border-radius: 8px; /* 圆角 */
-            cursor: pointer;
-            font-size: 16px; /* 增加字体大小 */
-            font-weight: bold; /* 加粗字体 */
-            margin: 0 10px;
-            text-decoration: none;
-            display: inline-block;
-            transition: background 0.3s, transform 0.3s; /* 增加过渡效果 */
-        }
-        .nav-btn:hover {
-            background: linear-gradient(90deg, #218838 0%, #1ea085 100%);
-            transform: scale(1.05); /* 鼠标悬停时放大 */
-        }
-        .nav-btn:active {
-            transform: scale(0.95); /* 点击时缩小 */
-        }
-        .container .msg, .container .error {
-            text-align: center;
-        }
-        .container .nav-buttons {
-            margin-bottom: 0;
-        }
-    </style>
-</head>
-<body>
-<div class="container">
-    <img src="/static/monicaLogo.png" alt="Logo" class="logo">
-    <h2>Excel数据导入系统</h2>
-    <form method="post" enctype="multipart/form-data">
-        <label class="file-label" for="file">请选择要上传的Excel文件（可多选）：</label>
-        <div class="file-input-wrapper">
-            <input class="file-input" id="file" type="file" name="file" multiple required onchange="document.getElementById('file-name').innerText = this.files.length ? Array.from(this.files).map(f=>f.name).join(', ') : '未选择文件'">
-            <span id="file-name" style="display:block;margin-top:8px;color:#888;font-size:14px;">未选择文件</span>
-        </div>
-        <button class="upload-btn" type="submit" id="uploadBtn">上传并导入</button>
-    </form>
-    {% if result_msgs %}
-        <div style="margin-top:20px;">
-        {% for msg in result_msgs %}
-            <div class="msg">{{ msg }}</div>
-        {% endfor %}
-        </div>
-    {% endif %}
-    <div style="margin-top:30px; color:#888; font-size:13px;">
-        <b>说明：</b><br>
-        1. 支持文件名：客户原始兑付明细.xls、仲景宛西.xlsx、活动方案.xlsx、输出结果.xls<br>
-        2. 每次导入会自动删除今天的数据，避免重复。<br>
-        3. 遇到"进货单位"行自动停止导入。<br>
-        4. 仅支持xls/xlsx格式。<br>
-    </div>
-    <div class="nav-buttons">
-        <a href="/query" class="nav-btn">查看数据</a>
-    </div>
-</div>
-<script>
-// 上传按钮波纹动画
-const btn = document.getElementById('uploadBtn');
-btn.addEventListener('click', function(e) {
-    const ripple = document.createElement('span');
-    ripple.className = 'ripple';
-    ripple.style.left = (e.offsetX - 25) + 'px';
-    ripple.style.top = (e.offsetY - 25) + 'px';
-    ripple.style.width = ripple.style.height = '50px';
-    btn.appendChild(ripple);
-    setTimeout(() => ripple.remove(), 600);
-});
-</script>
-</body>
-</html>
-''', result_msgs=result_msgs)
+    return render_template('upload.html', result_msgs=result_msgs)
 
 # 修改query_data和api_data，增加字段过滤
 @app.route('/query')
@@ -439,7 +414,7 @@ def query_data():
         cursor.close()
         conn.close()
     except Exception as e:
-        print(f"获取所有字段失败: {e}")
+        logger.error("获取所有字段失败: %s", e)
     # 过滤掉已删除字段
     if table_name == 'customer_redemption_details':
         all_columns = [col for col in all_columns if col not in REMOVED_FIELDS]
@@ -452,913 +427,7 @@ def query_data():
         result_columns = result['columns']
         result['columns'] = result_columns
     
-    return render_template_string(r'''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <title>数据查询 - {{ table_display_name }}</title>
-    <link rel="stylesheet" href="{{ url_for('static', filename='choices.min.css') }}">
-    <style>
-        body, html {
-            margin: 0;
-            padding: 0;
-            width: 100vw;
-            height: 100vh;
-        }
-        .container {
-            width: 100vw;
-            min-height: 100vh;
-            margin: 0;
-            background: #fff;
-            border-radius: 0;
-            box-shadow: none;
-            overflow: auto;
-            padding: 0;
-        }
-        .header {
-            background: linear-gradient(90deg, #4f8cff 0%, #6ed0ff 100%);
-            color: #fff;
-            padding: 20px 30px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-        .header h1 {
-            margin: 0;
-            font-size: 24px;
-        }
-        .nav-buttons {
-            display: flex;
-            gap: 10px;
-        }
-        .nav-btn {
-            background: rgba(255,255,255,0.2);
-            color: #fff;
-            border: none;
-            padding: 8px 16px;
-            border-radius: 20px;
-            cursor: pointer;
-            text-decoration: none;
-            font-size: 14px;
-            transition: background 0.2s;
-        }
-        .nav-btn:hover {
-            background: rgba(255,255,255,0.3);
-        }
-        .content {
-            padding: 30px 40px;
-        }
-        .controls {
-            display: flex;
-            align-items: center;
-            gap: 20px; /* 控制间距 */
-            flex-wrap: wrap; /* 允许换行 */
-        }
-        .table-selector, .field-selector, .search-box {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        .table-selector select, .field-selector select, .search-box input, .search-btn {
-            padding: 8px 12px;
-            border: 1px solid #ddd;
-            border-radius: 6px;
-            font-size: 14px;
-        }
-        .field-selector select {
-            min-width: 120px;
-            min-height: 32px;
-        }
-        .choices__inner {
-            min-height: 32px;
-        }
-        .search-box input {
-            width: 200px;
-        }
-        .search-btn {
-            background: #28a745;
-            color: #fff;
-            border: none;
-            padding: 8px 16px;
-            border-radius: 6px;
-            cursor: pointer;
-            font-size: 14px;
-        }
-        .search-btn:hover {
-            background: #218838;
-        }
-        .data-table {
-            width: 100%;
-            border-collapse: separate;
-            border-spacing: 0;
-            margin-top: 20px;
-            background: #fff;
-            border-radius: 12px;
-            overflow: hidden;
-            box-shadow: 0 2px 12px rgba(0,0,0,0.08);
-            border: 1px solid #bfc4cc;
-            font-size: 15px;
-        }
-        .data-table th, .data-table td {
-            border: 1px solid #e3e6ee;
-            padding: 10px 8px;
-        }
-        .data-table th {
-            background: #e3f0fb;
-            font-weight: bold;
-            border-bottom: 2px solid #dee2e6;
-            cursor: pointer;
-            user-select: none;
-            color: #2a3b4d;
-        }
-        .data-table th:hover {
-            background: #d0e7fa;
-        }
-        .data-table tr:nth-child(even) {
-            background: #f6f8fa;
-        }
-        .data-table tr:hover {
-            background: #e6f0ff;
-        }
-        .data-table td {
-            font-size: 14px;
-        }
-        .data-table thead tr:first-child th:first-child {
-            border-top-left-radius: 12px;
-        }
-        .data-table thead tr:first-child th:last-child {
-            border-top-right-radius: 12px;
-        }
-        .data-table tbody tr:last-child td:first-child {
-            border-bottom-left-radius: 12px;
-        }
-        .data-table tbody tr:last-child td:last-child {
-            border-bottom-right-radius: 12px;
-        }
-        /* 新增：活动对象字段省略号样式 */
-        .ellipsis-col {
-            max-width: 5em;
-            min-width: 5em;
-            width: 5em;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            white-space: nowrap;
-        }
-        .pagination {
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            gap: 10px;
-            margin-top: 20px;
-        }
-        .pagination a {
-            padding: 8px 12px;
-            border: 1px solid #ddd;
-            text-decoration: none;
-            color: #333;
-            border-radius: 4px;
-        }
-        .pagination a:hover {
-            background: #f8f9fa;
-        }
-        .pagination .current {
-            background: #4f8cff;
-            color: #fff;
-            border-color: #4f8cff;
-        }
-        .stats {
-            margin-left: 20px; /* 控制与下拉框的间距 */
-            color: #666; /* 文字颜色 */
-            font-size: 14px; /* 字体大小 */
-        }
-        .sort-indicator {
-            margin-left: 5px;
-            font-size: 12px;
-        }
-        .loading {
-            text-align: center;
-            padding: 40px;
-            color: #666;
-        }
-        .choices {
-            min-width: 220px !important;
-            font-size: 16px;
-        }
-        .choices__inner {
-            min-height: 40px;
-            font-size: 16px;
-        }
-        .choices__list--dropdown .choices__item {
-            display: flex !important;
-            align-items: center !important;
-            font-size: 16px;
-            min-height: 36px;
-            padding-left: 0.5em;
-            padding-right: 1em;
-            position: relative;
-            white-space: nowrap;
-        }
-        .choices__list--dropdown .choices__item::before {
-            content: '';
-            display: inline-block;
-            width: 20px;
-            height: 20px;
-            border: 2px solid #4f8cff;
-            border-radius: 4px;
-            background: #fff;
-            margin-right: 10px;
-            flex-shrink: 0;
-        }
-        .choices__list--dropdown .choices__item.is-selected::before {
-            background: #4f8cff;
-            border-color: #3578e5;
-            box-shadow: 0 0 0 2px #b3d1ff;
-        }
-        .choices__list--dropdown .choices__item.is-selected::after {
-            content: '\2714';
-            color: #fff;
-            font-size: 14px;
-            position: absolute;
-            left: 13px;
-            top: 50%;
-            transform: translateY(-50%);
-            pointer-events: none;
-        }
-    </style>
-    <script src="{{ url_for('static', filename='choices.min.js') }}"></script>
-</head>
-<body>
-<div class="container">
-    <div class="header">
-        <h1>{{ table_display_name }} - 数据查询</h1>
-        <div class="nav-buttons">
-            <button class="nav-btn" onclick="batchDelete()">
-                <i class="fas fa-trash"></i> 批量删除
-            </button>
-            <button class="nav-btn" onclick="exportExcel()">
-                <i class="fas fa-file-excel"></i> 导出 Excel
-            </button>
-            <button class="nav-btn" onclick="openAddDialog()">
-                <i class="fas fa-file-excel"></i> 新增数据
-            </button>
-            <a href="/compare" class="nav-btn" style="background:linear-gradient(90deg,#ff9800 0%,#ffc107 100%);color:#fff;">
-                <i class="fas fa-random"></i> 数据比对
-            </a>
-            <a href="/" class="nav-btn">
-                <i class="fas fa-arrow-left"></i> 返回上传
-            </a>
-        </div>
-    </div>
-    
-    <div style="background:#f6f8fa;padding:32px 0;min-height:100vh;">
-        <div class="content">
-            <div class="controls" style="display: flex; flex-wrap: wrap; align-items: center; gap: 24px; margin-bottom: 18px;">
-                <div class="table-selector">
-                    <label>选择表：</label>
-                    <select id="tableSelect" onchange="changeTable()" class="nice-input">
-                        {% for table_key, display_name in all_tables.items() %}
-                            <option value="{{ table_key }}" {% if table_key == table_name %}selected{% endif %}>
-                                {{ display_name }}
-                            </option>
-                        {% endfor %}
-                    </select>
-                </div>
-                <div class="field-selector">
-                    <label>选择字段：</label>
-                    <select id="fieldsSelect" multiple class="nice-input">
-                        {% for col in all_columns %}
-                            {% if not (table_name == 'customer_redemption_details' and col in REMOVED_FIELDS) %}
-                                <option value="{{ col }}" {% if fields and col in fields.split(',') %}selected{% endif %}>{{ col }}</option>
-                            {% endif %}
-                        {% endfor %}
-                    </select>
-                </div>
-                <div class="field-selector">
-                    <label>排序字段：</label>
-                    <select id="sortFieldsSelect" multiple>
-                        {% for col in all_columns %}
-                            {% if not (table_name == 'customer_redemption_details' and col in REMOVED_FIELDS) %}
-                                <option value="{{ col }}" {% if sort_field and col in sort_field.split(',') %}selected{% endif %}>{{ col }}</option>
-                            {% endif %}
-                        {% endfor %}
-                    </select>
-                    <label style="margin-left:10px;">排序方向：</label>
-                    <select id="sortOrdersSelect" multiple></select>
-                </div>
-                <div class="search-box" style="display: flex; align-items: center; gap: 10px;">
-                    <div style="position:relative;display:inline-block;">
-                        <input type="text" id="searchInput" class="nice-input" placeholder="搜索关键词..." value="{{ search_term }}" style="padding-right:28px;">
-                        <span id="clearSearchBtn" style="display:none;position:absolute;right:8px;top:50%;transform:translateY(-50%);cursor:pointer;font-size:18px;color:#bbb;">×</span>
-                    </div>
-                    <button class="search-btn" onclick="searchData()">搜索</button>
-                </div>
-                <div class="controls" style="display: flex; align-items: center; gap: 20px;">
-                    <label for="perPageSelect">每页显示行数：</label>
-                    <select id="perPageSelect" onchange="changePerPage()">                    
-                        <option value="500" selected>500</option>
-                        <option value="1000">1000</option>
-                    </select>
-                    <div class="stats">
-                        共 {{ result.total_records }} 条记录
-                    </div>
-                </div>
-            </div>
-            
-            <div class="pagination" style="justify-content:center;">
-                {% if result.current_page > 1 %}
-                    <a href="javascript:void(0)" onclick="changePage(1)" class="page-btn">首页</a>
-                    <a href="javascript:void(0)" onclick="changePage({{ result.current_page - 1 }})" class="page-btn">上一页</a>
-                {% endif %}
-                {% for page in range(max(1, result.current_page - 2), min(result.total_pages + 1, result.current_page + 3)) %}
-                    <a href="javascript:void(0)" onclick="changePage({{ page }})" 
-                       class="page-btn {% if page == result.current_page %}current{% endif %}">
-                        {{ page }}
-                    </a>
-                {% endfor %}
-                {% if result.current_page < result.total_pages %}
-                    <a href="javascript:void(0)" onclick="changePage({{ result.current_page + 1 }})" class="page-btn">下一页</a>
-                    <a href="javascript:void(0)" onclick="changePage({{ result.total_pages }})" class="page-btn">末页</a>
-                {% endif %}
-            </div>
-            <div class="table-container">
-                <table class="data-table">
-                    {% set show_columns = result.columns|rejectattr('Field', 'equalto', 'id')|list %}
-                    <thead>
-                        <tr>
-                            <th><input type="checkbox" id="selectAll" onclick="toggleSelectAll(this)"></th>
-                            <th style="width:60px;">序号</th>
-                            {% for column in show_columns %}
-                                {% if not (table_name == 'customer_redemption_details' and column.Field in REMOVED_FIELDS) %}
-                                    <th onclick="sortTable('{{ column.Field }}')" {% if table_name == 'customer_redemption_details' and column.Field == '活动对象' %}class="ellipsis-col"{% endif %}>
-                                        {{ column.Field }}
-                                        {% if sort_field and column.Field in sort_field.split(',') %}
-                                            <span class="sort-indicator">
-                                                {% if sort_order and column.Field in sort_order.split(',') and sort_order.split(',')[sort_field.split(',').index(column.Field)].upper() == 'ASC' %}↑{% else %}↓{% endif %}
-                                            </span>
-                                        {% endif %}
-                                    </th>
-                                {% endif %}
-                            {% endfor %}
-                            <th>操作</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {% for row in result.data %}
-                            <tr>
-                                <td><input type="checkbox" data-id="{{ row.id }}"></td>
-                                <td>{{ (result.current_page-1)*result.per_page + loop.index }}</td>
-                                {% for column in show_columns %}
-                                    {% if not (table_name == 'customer_redemption_details' and column.Field in REMOVED_FIELDS) %}
-                                        <td {% if table_name == 'customer_redemption_details' and column.Field == '活动对象' %}class="ellipsis-col" title="{{ row[column.Field] }}"{% endif %}>{{ row[column.Field] or '' }}</td>
-                                    {% endif %}
-                                {% endfor %}
-                                <td>
-                                    <button class="button" style="background: linear-gradient(90deg, #4f8cff 0%, #6ed0ff 100%); color: #fff; padding: 5px 10px; border-radius: 15px; cursor: pointer; font-size: 14px; " onclick="openEditDialog({{ loop.index0 }})">编辑</button>
-                                    <button class="button" style="background: linear-gradient(90deg, #4f8cff 20%, #6ed0ff 50%); color: #fff; padding: 5px 10px; border-radius: 15px; cursor: pointer; font-size: 14px; " onclick= "deleteRow({{ loop.index0 }})">删除</button>
-                                </td>
-                            </tr>
-                        {% endfor %}
-                    </tbody>
-                </table>
-            </div>
-        </div>
-    </div>
-
-<div id="modalMask" style="display:none;position:fixed;left:0;top:0;width:100vw;height:100vh;background:rgba(0,0,0,0.15);z-index:1000;"></div>
-<div id="editDialog" style="display:none;position:fixed;left:50%;top:50%;transform:translate(-50%,-50%);background:#fff;padding:24px 32px;box-shadow:0 2px 16px #888;border-radius:8px;z-index:1001;min-width:320px;">
-    <form id="editForm">
-        <div id="editFields"></div>
-        <div style="margin-top:18px;text-align:right;">
-            <button type="button" onclick="closeDialog()">取消</button>
-            <button type="submit">保存</button>
-        </div>
-    </form>
-</div>
-<div id="addDialog" style="display:none;position:fixed;left:50%;top:50%;transform:translate(-50%,-50%);background:#fff;padding:32px 36px;box-shadow:0 8px 32px #888;border-radius:18px;z-index:1001;min-width:320px;max-width:90vw;max-height:90vh;overflow:auto;">
-    <form id="addForm" style="margin:0;">
-        <div style="font-size:22px;font-weight:bold;text-align:center;margin-bottom:24px;letter-spacing:2px;color:#3578e5;">新增数据</div>
-        <div id="addFields"></div>
-        <div style="margin-top:28px;display:flex;gap:18px;justify-content:flex-end;">
-            <button type="button" onclick="closeDialog()" style="background:#f3f4f6;color:#333;border:none;padding:10px 28px;border-radius:8px;font-size:16px;cursor:pointer;transition:background 0.2s;">取消</button>
-            <button type="submit" style="background:linear-gradient(90deg,#4f8cff 0%,#6ed0ff 100%);color:#fff;border:none;padding:10px 28px;border-radius:8px;font-size:16px;font-weight:bold;cursor:pointer;box-shadow:0 2px 8px rgba(79,140,255,0.10);transition:background 0.2s,box-shadow 0.2s;">新增</button>
-        </div>
-    </form>
-</div>
-<style>
-#addDialog input, #addDialog select {
-    width: 100%;
-    padding: 10px 14px;
-    border: 1px solid #d1d5db;
-    border-radius: 7px;
-    font-size: 16px;
-    margin-top: 4px;
-    margin-bottom: 18px;
-    background: #f9fafb;
-    transition: border 0.2s, box-shadow 0.2s;
-}
-#addDialog input:focus, #addDialog select:focus {
-    border: 1.5px solid #4f8cff;
-    outline: none;
-    background: #fff;
-    box-shadow: 0 0 0 2px #b3d1ff;
-}
-#addDialog label {
-    font-size: 15px;
-    color: #333;
-    font-weight: 500;
-    margin-bottom: 2px;
-    display: block;
-}
-@media (max-width: 600px) {
-    #addDialog {
-        padding: 18px 6vw;
-        min-width: unset;
-    }
-    #addDialog form > div[style*='margin-top:28px'] {
-        flex-direction: column;
-        gap: 10px;
-    }
-}
-</style>
-
-<script>
-var sort_order = "{{ sort_order|default('') }}";
-var sort_field = "{{ sort_field|default('') }}";
-var fields = "{{ fields|default('') }}";
-
-let currentSortField = '{{ sort_field }}';
-let currentSortOrder = '{{ sort_order }}';
-let currentFields = '{{ fields if fields else '' }}';
-
-let sortFieldsChoices, sortOrdersChoices;
-
-// 初始化Choices美化多选
-window.addEventListener('DOMContentLoaded', function() {
-    // 先初始化排序方向
-    sortOrdersChoices = new Choices('#sortOrdersSelect', {
-        removeItemButton: true,
-        searchResultLimit: 20,
-        placeholder: true,
-        placeholderValue: '请选择排序方向',
-        noResultsText: '无匹配',
-        noChoicesText: '无可选',
-        itemSelectText: '选择',
-        shouldSort: false,
-        renderChoiceLimit: -1
-    });
-    // 再初始化排序字段
-    sortFieldsChoices = new Choices('#sortFieldsSelect', {
-        removeItemButton: true,
-        searchResultLimit: 10,
-        placeholder: true,
-        placeholderValue: '请选择排序字段',
-        noResultsText: '无匹配字段',
-        noChoicesText: '无可选字段',
-        itemSelectText: '选择',
-        shouldSort: false,
-        renderChoiceLimit: -1
-    });
-    // 先设置排序字段选中，再刷新排序方向
-    if (typeof sort_field !== 'undefined' && sort_field) {
-        setTimeout(() => {
-            sortFieldsChoices.setChoiceByValue(sort_field.split(','));
-            updateSortOrdersChoices();
-        }, 0);
-    } else {
-        updateSortOrdersChoices();
-    }
-    // 字段多选
-    new Choices('#fieldsSelect', {
-        removeItemButton: true,
-        searchResultLimit: 10,
-        placeholder: true,
-        placeholderValue: '请选择字段',
-        noResultsText: '无匹配字段',
-        noChoicesText: '无可选字段',
-        itemSelectText: '选择',
-        shouldSort: false,
-        searchEnabled: true,
-        renderChoiceLimit: -1 // 确保下拉时全部显示
-    });
-
-    // 联动逻辑
-    document.getElementById('sortFieldsSelect').addEventListener('addItem', updateSortOrdersChoices, false);
-    document.getElementById('sortFieldsSelect').addEventListener('removeItem', updateSortOrdersChoices, false);
-
-    // 替换排序方向下拉框的事件监听，避免递归死循环
-    document.getElementById('sortOrdersSelect').addEventListener('change', function(e) {
-        const sel = document.getElementById('sortOrdersSelect');
-        const selected = Array.from(sel.selectedOptions).map(o => o.value);
-        const fieldMap = {};
-        selected.forEach(val => {
-            const match = val.match(/(ASC|DESC)\((.+)\)/);
-            if (match) fieldMap[match[2]] = val;
-        });
-        // 只保留每个字段的最后一个方向
-        for (let i = 0; i < sel.options.length; i++) {
-            sel.options[i].selected = false;
-        }
-        Object.values(fieldMap).forEach(val => {
-            for (let i = 0; i < sel.options.length; i++) {
-                if (sel.options[i].value === val) sel.options[i].selected = true;
-            }
-        });
-        // 不再调用 setChoiceByValue，避免递归
-    });
-
-    // 页面初始时也要同步一次
-    updateSortOrdersChoices();
-
-    // 获取 URL 参数
-    const urlParams = new URLSearchParams(window.location.search);
-    const perPage = urlParams.get('per_page');
-
-    // 如果有 per_page 参数，设置下拉框的值
-    if (perPage) {
-        const perPageSelect = document.getElementById('perPageSelect');
-        perPageSelect.value = perPage; // 设置下拉框的值
-    }
-});
-
-function updateSortOrdersChoices() {
-    const sortFieldsSel = document.getElementById('sortFieldsSelect');
-    const selectedFields = Array.from(sortFieldsSel.selectedOptions).map(o => o.value);
-    sortOrdersChoices.clearChoices();
-    if (selectedFields.length === 0) {
-        sortOrdersChoices.setChoices([{ value: '', label: '请选择排序字段', disabled: true }], 'value', 'label', false);
-        return;
-    }
-    const newChoices = selectedFields.flatMap(field => [
-        { value: `ASC(${field})`, label: `升序(${field})` },
-        { value: `DESC(${field})`, label: `降序(${field})` }
-    ]);
-    sortOrdersChoices.setChoices(newChoices, 'value', 'label', false);
-    setTimeout(() => {
-        if (sort_order) {
-            const sel = document.getElementById('sortOrdersSelect');
-            let restore = sort_order.split(',').filter(val => [...sel.options].some(opt => opt.value === val));
-            restore.forEach(val => {
-                for (let i = 0; i < sel.options.length; i++) {
-                    if (sel.options[i].value === val) sel.options[i].selected = true;
-                }
-            });
-            sortOrdersChoices.removeActiveItems();
-            sortOrdersChoices.setChoiceByValue(restore);
-        }
-    }, 0);
-}
-
-// 多选值获取函数
-function getSelectedFields() {
-    const sel = document.getElementById('fieldsSelect');
-    return Array.from(sel.selectedOptions).map(o => o.value).join(',');
-}
-function getSelectedSortFields() {
-    const sel = document.getElementById('sortFieldsSelect');
-    return Array.from(sel.selectedOptions).map(o => o.value).join(',');
-}
-function getSelectedSortOrders() {
-    const sel = document.getElementById('sortOrdersSelect');
-    // 保留完整的 value（如 ASC(结算金额)）
-    return Array.from(sel.selectedOptions).map(o => o.value).join(',');
-}
-
-function changeTable() {
-    const table = document.getElementById('tableSelect').value;
-    const fields = getSelectedFields();
-    const sortFields = getSelectedSortFields();
-    const sortOrders = getSelectedSortOrders();
-    const searchTerm = document.getElementById('searchInput').value.trim();
-    let url = `/query?table=${table}`;
-    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
-    if (sortFields) url += `&sort_field=${encodeURIComponent(sortFields)}`;
-    if (sortOrders) url += `&sort_order=${encodeURIComponent(sortOrders)}`;
-    if (searchTerm) url += `&search=${encodeURIComponent(searchTerm)}`;
-    window.location.href = url;
-}
-
-function searchData() {
-    const searchTerm = document.getElementById('searchInput').value.trim();
-    const table = document.getElementById('tableSelect').value;
-    const fields = getSelectedFields();
-    const sortFields = getSelectedSortFields();
-    const sortOrders = getSelectedSortOrders();
-    const perPage = document.getElementById('perPageSelect').value; // 获取每页显示的条数
-    let url = `/query?table=${table}&per_page=${perPage}`; // 将 per_page 加入 URL
-    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
-    if (searchTerm) url += `&search=${encodeURIComponent(searchTerm)}`;
-    if (sortFields) url += `&sort_field=${encodeURIComponent(sortFields)}`;
-    if (sortOrders) url += `&sort_order=${encodeURIComponent(sortOrders)}`;
-    window.location.href = url;
-}
-
-function sortTable(field) {
-    // 兼容表头点击单字段排序，优先级最高
-    let newOrder = 'ASC';
-    if (currentSortField && currentSortField.split(',')[0] === field && currentSortOrder.split(',')[0] === 'ASC') {
-        newOrder = 'DESC';
-    }
-    currentSortField = field;
-    currentSortOrder = newOrder;
-    const table = document.getElementById('tableSelect').value;
-    const searchTerm = document.getElementById('searchInput').value.trim();
-    const fields = getSelectedFields();
-    let url = `/query?table=${table}`;
-    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
-    if (searchTerm) url += `&search=${encodeURIComponent(searchTerm)}`;
-    url += `&sort_field=${field}&sort_order=${newOrder}`;
-    window.location.href = url;
-}
-
-function changePage(page) {
-    const table = document.getElementById('tableSelect').value;
-    const searchTerm = document.getElementById('searchInput').value.trim();
-    const fields = getSelectedFields();
-    const sortFields = getSelectedSortFields();
-    const sortOrders = getSelectedSortOrders();
-    const perPage = document.getElementById('perPageSelect').value; // 获取每页显示的条数
-    let url = `/query?table=${table}&page=${page}&per_page=${perPage}`; // 将 per_page 加入 URL
-    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
-    if (searchTerm) url += `&search=${encodeURIComponent(searchTerm)}`;
-    if (sortFields) url += `&sort_field=${encodeURIComponent(sortFields)}`;
-    if (sortOrders) url += `&sort_order=${encodeURIComponent(sortOrders)}`;
-    window.location.href = url;
-}
-
-// 回车键搜索
-document.getElementById('searchInput').addEventListener('keypress', function(e) {
-    if (e.key === 'Enter') {
-        searchData();
-    }
-});
-
-// 搜索框清空按钮逻辑
-const searchInput = document.getElementById('searchInput');
-const clearBtn = document.getElementById('clearSearchBtn');
-if (searchInput && clearBtn) {
-    function toggleClearBtn() {
-        clearBtn.style.display = searchInput.value ? 'block' : 'none';
-    }
-    searchInput.addEventListener('input', toggleClearBtn);
-    toggleClearBtn();
-    clearBtn.onclick = function() {
-        searchInput.value = '';
-        searchInput.focus();
-        toggleClearBtn();
-    };
-}
-
-// 数据缓存
-const tableName = '{{ table_name }}';
-const columns = {{ result.columns|tojson }};
-const data = {{ result.data|tojson }};
-const pk = columns[0].Field; // 默认第一个字段为主键
-
-// JS部分，columns包含Field和Type，data为行数据
-// 工具函数：判断是否日期/时间字段
-function isDateField(col) {
-    let name = col.Field;
-    let type = (col.Type||'').toLowerCase();
-    return name.includes('日期') || type.startsWith('date');
-}
-function isDateTimeField(col) {
-    let type = (col.Type||'').toLowerCase();
-    return type.startsWith('datetime') || type.startsWith('timestamp');
-}
-// 工具函数：格式化日期为YYYY-MM-DD
-function formatDate(val) {
-    if (!val) return '';
-    let d = new Date(val.replace(/-/g,'/').replace(/\./g,'/'));
-    if (isNaN(d.getTime())) return val;
-    let m = (d.getMonth()+1).toString().padStart(2,'0');
-    let day = d.getDate().toString().padStart(2,'0');
-    return d.getFullYear()+'-'+m+'-'+day;
-}
-// 工具函数：格式化为input type=datetime-local
-function formatDateTime(val) {
-    if (!val) return '';
-    let d = new Date(val.replace(/-/g,'/').replace(/\./g,'/'));
-    if (isNaN(d.getTime())) return val;
-    let m = (d.getMonth()+1).toString().padStart(2,'0');
-    let day = d.getDate().toString().padStart(2,'0');
-    let h = d.getHours().toString().padStart(2,'0');
-    let min = d.getMinutes().toString().padStart(2,'0');
-    return d.getFullYear()+'-'+m+'-'+day+'T'+h+':'+min;
-}
-// 工具函数：判断是否数字字段
-function isNumberField(col) {
-    let type = (col.Type||'').toLowerCase();
-    return type.startsWith('int') || type.startsWith('decimal') || type.startsWith('float') || type.startsWith('double') || type.startsWith('numeric');
-}
-// 新增弹窗表单生成
-function openAddDialog() {
-    document.getElementById('modalMask').style.display = 'block';
-    document.getElementById('addDialog').style.display = 'block';
-    let html = '';
-    for (let col of columns) {
-        if (col.Field === pk) continue;
-        if (isDateTimeField(col)) {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input type='datetime-local' name='${col.Field}' style='width:180px;'></div>`;
-        } else if (isDateField(col)) {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input type='date' name='${col.Field}' style='width:180px;'></div>`;
-        } else {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input name='${col.Field}' style='width:180px;'></div>`;
-        }
-    }
-    document.getElementById('addFields').innerHTML = html;
-}
-// 编辑弹窗表单生成
-function openEditDialog(idx) {
-    document.getElementById('modalMask').style.display = 'block';
-    document.getElementById('editDialog').style.display = 'block';
-    let row = data[idx];
-    let html = '';
-    for (let col of columns) {
-        let val = row[col.Field] || '';
-        if (col.Field === pk) {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input name='${col.Field}' value='${val}' readonly style='width:180px;background:#eee;'></div>`;
-        } else if (isDateTimeField(col)) {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input type='datetime-local' name='${col.Field}' value='${formatDateTime(val)}' style='width:180px;'></div>`;
-        } else if (isDateField(col)) {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input type='date' name='${col.Field}' value='${formatDate(val)}' style='width:180px;'></div>`;
-        } else {
-            html += `<div style='margin-bottom:12px;'><label>${col.Field}：</label><input name='${col.Field}' value='${val}' style='width:180px;'></div>`;
-        }
-    }
-    document.getElementById('editFields').innerHTML = html;
-    document.getElementById('editForm').onsubmit = function(e) {
-        e.preventDefault();
-        let form = e.target;
-        let postData = {};
-        for (let el of form.elements) {
-            if (el.name) {
-                let col = columns.find(c=>c.Field===el.name);
-                if (el.type === 'date' && el.value) {
-                    postData[el.name] = el.value;
-                } else if (el.type === 'datetime-local' && el.value) {
-                    postData[el.name] = el.value.replace('T',' ');
-                } else if (col && isNumberField(col) && el.value === '') {
-                    postData[el.name] = null;
-                } else {
-                    postData[el.name] = el.value;
-                }
-            }
-        }
-        let pkValue = postData[pk];
-        delete postData[pk];
-        fetch('/api/update_row', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({table: tableName, pk_name: pk, pk_value: pkValue, data: postData})
-        }).then(async r => {
-            let res;
-            try {
-                res = await r.json();
-            } catch (e) {
-                res = {success: false, msg: '服务器未返回有效JSON'};
-            }
-            if (r.ok && res.success) {
-                location.reload();
-            } else {
-                alert('修改失败：' + (res && res.msg ? res.msg : `HTTP ${r.status}`));
-            }
-        });
-    };
-}
-function deleteRow(idx) {
-    if(!confirm('确定要删除这条数据吗？')) return;
-    let row = data[idx];
-    let pkValue = row[pk];
-    fetch('/api/delete_row', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({table: tableName, pk_name: pk, pk_value: pkValue})
-    }).then(r=>r.json()).then(res=>{
-        if(res.success){ location.reload(); } else { alert('删除失败：'+res.msg); }
-    });
-}
-function closeDialog() {
-    document.getElementById('modalMask').style.display = 'none';
-    document.getElementById('editDialog').style.display = 'none';
-    document.getElementById('addDialog').style.display = 'none';
-}
-document.getElementById('addForm').onsubmit = function(e) {
-    e.preventDefault();
-    let form = e.target;
-    let postData = {};
-    for (let el of form.elements) {
-        if (el.name) {
-            let col = columns.find(c=>c.Field===el.name);
-            if (el.type === 'date' && el.value) {
-                postData[el.name] = el.value;
-            } else if (el.type === 'datetime-local' && el.value) {
-                postData[el.name] = el.value.replace('T',' ');
-            } else if (col && isNumberField(col) && el.value === '') {
-                postData[el.name] = null;
-            } else {
-                postData[el.name] = el.value;
-            }
-        }
-    }
-    fetch('/api/add_row', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({table: tableName, data: postData})
-    }).then(r=>r.json()).then(res=>{
-        if(res.success){ location.reload(); } else { alert('新增失败：'+res.msg); }
-    });
-};
-
-document.getElementById('fieldsSelect').addEventListener('focus', function() {
-    this.parentNode.querySelector('.choices').click();
-});
-
-function batchDelete() {
-    const selectedRows = Array.from(document.querySelectorAll('.data-table input[type=checkbox]:checked'));
-    if (selectedRows.length === 0) {
-        alert('请至少选择一条记录进行删除。');
-        return;
-    }
-    const ids = selectedRows.map(row => row.dataset.id);
-    const table = tableName; // 替换为实际的表名
-    const pk_name = 'id'; // 替换为实际的主键字段名
-
-    if (confirm('确定要删除选中的记录吗？')) {
-        fetch('/api/batch_delete', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({table: table, pk_name: pk_name, ids: ids})
-        }).then(response => response.json()).then(res => {
-            if (res.success) {
-                location.reload();
-            } else {
-                alert('删除失败：' + res.msg);
-            }
-        });
-    }
-}
-
-function toggleSelectAll(selectAllCheckbox) {
-    const checkboxes = document.querySelectorAll('.data-table input[type=checkbox]');
-    checkboxes.forEach(checkbox => {
-        checkbox.checked = selectAllCheckbox.checked;
-    });
-}
-
-function exportExcel() {
-    const table = tableName; // 替换为实际的表名
-    const selectedRows = Array.from(document.querySelectorAll('.data-table input[type=checkbox]:checked'));
-    if (selectedRows.length === 0) {
-        alert('请至少选择一条记录进行导出。');
-        return;
-    }
-    const ids = selectedRows.map(row => row.dataset.id);
-    
-    fetch('/api/export_excel', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({table: table, ids: ids})
-    })
-    .then(response => {
-        if (response.ok) {
-            return response.blob(); // 获取文件 Blob
-        } else {
-            return response.json().then(res => { throw new Error(res.msg); });
-        }
-    })
-    .then(blob => {
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `${table}.xlsx`; // 设置下载文件名
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-    })
-    .catch(error => {
-        alert('导出失败：' + error.message);
-    });
-}
-
-function changePerPage() {
-    const perPage = document.getElementById('perPageSelect').value;
-    const table = document.getElementById('tableSelect').value;
-    const searchTerm = document.getElementById('searchInput').value.trim();
-    const fields = getSelectedFields();
-    const sortFields = getSelectedSortFields();
-    const sortOrders = getSelectedSortOrders();
-    let url = `/query?table=${table}&per_page=${perPage}`;
-    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
-    if (searchTerm) url += `&search=${encodeURIComponent(searchTerm)}`;
-    if (sortFields) url += `&sort_field=${encodeURIComponent(sortFields)}`;
-    if (sortOrders) url += `&sort_order=${encodeURIComponent(sortOrders)}`;
-    window.location.href = url;
-}
-</script>
-</body>
-</html>
-''', result=result, table_name=table_name, table_display_name=TABLE_DISPLAY_NAMES.get(table_name, table_name), all_tables=TABLE_DISPLAY_NAMES, search_term=search_term, sort_field=sort_field, sort_order=sort_order, fields=fields, all_columns=all_columns, max=max, min=min)
+    return render_template('query.html', result=result, table_name=table_name, table_display_name=TABLE_DISPLAY_NAMES.get(table_name, table_name), all_tables=TABLE_DISPLAY_NAMES, search_term=search_term, sort_field=sort_field, sort_order=sort_order, fields=fields, all_columns=all_columns, max=max, min=min)
 
 @app.route('/api/data')
 def api_data():
@@ -1370,22 +439,31 @@ def api_data():
     sort_order = request.args.get('sort_order', 'ASC')
     search_term = request.args.get('search', '')
     fields = request.args.get('fields')
+    filters = parse_filters(request.args.get('filters'))
     
-    result = get_table_data(table_name, page, per_page, sort_field, sort_order, search_term, fields)
+    etag = data_etag([table_name], request_args_key())
+    not_modified = check_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    
+    result = get_table_data(table_name, page, per_page, sort_field, sort_order, search_term, fields, filters)
     
     if result is None:
         return jsonify({'error': '数据库连接错误'}), 500
     
-    return jsonify(result)
+    # format=columnar 时返回列式数据（字段列表 + 每列数组，重复较多的字符串列做字典编码）
+    if request.args.get('format') == 'columnar':
+        result = columnar_result(result)
+    return with_etag(json_response(result), etag)
 
 @app.route('/api/add_row', methods=['POST'])
 def api_add_row():
     table = request.json.get('table')
     data = request.json.get('data')  # dict
     
-    print(f"=== api_add_row 请求参数 ===")
-    print(f"表名: {table}")
-    print(f"数据: {data}")
+    logger.debug("=== api_add_row 请求参数 ===")
+    logger.debug("表名: %s", table)
+    logger.debug("数据: %s", data)
     
     if not table or not data:
         return jsonify({'success': False, 'msg': '参数缺失'}), 400
@@ -1403,24 +481,21 @@ def api_add_row():
         sql = f"INSERT INTO `{table}` ({fields}) VALUES ({values})"
         params = list(data.values())
         
-        print(f"执行SQL: {sql}")
-        print(f"参数: {params}")
+        logger.debug("执行SQL: %s", sql)
+        logger.debug("参数: %s", params)
         
         cursor.execute(sql, params)
         conn.commit()
+        # 维护派生数据（活动政策规则、输出结果）
+        notify_table_changed(conn, table, ids=[cursor.lastrowid])
         cursor.close()
         conn.close()
         
-        print("=== api_add_row 执行完成 ===")
+        logger.debug("=== api_add_row 执行完成 ===")
         return jsonify({'success': True})
         
     except Exception as e:
-        import traceback
-        print(f"=== api_add_row 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_add_row 执行错误: %s", e)
         return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
 
 @app.route('/api/update_row', methods=['POST'])
@@ -1430,14 +505,14 @@ def api_update_row():
     pk_value = request.json.get('pk_value')
     data = request.json.get('data')  # dict
     
-    print(f"=== api_update_row 请求参数 ===")
-    print(f"表名: {table}")
-    print(f"主键名: {pk_name}")
-    print(f"主键值: {pk_value}")
-    print(f"更新数据: {data}")
+    logger.debug("=== api_update_row 请求参数 ===")
+    logger.debug("表名: %s", table)
+    logger.debug("主键名: %s", pk_name)
+    logger.debug("主键值: %s", pk_value)
+    logger.debug("更新数据: %s", data)
     
     if not table or not pk_name or pk_value is None or not data:
-        print('参数缺失:', table, pk_name, pk_value, data)
+        logger.warning("api_update_row 参数缺失: %s %s %s %s", table, pk_name, pk_value, data)
         return jsonify({'success': False, 'msg': '参数缺失'}), 400
     
     # 把空字符串转为None
@@ -1452,24 +527,21 @@ def api_update_row():
         sql = f"UPDATE `{table}` SET {set_clause} WHERE `{pk_name}`=%s"
         params = list(data.values()) + [pk_value]
         
-        print(f"执行SQL: {sql}")
-        print(f"参数: {params}")
+        logger.debug("执行SQL: %s", sql)
+        logger.debug("参数: %s", params)
         
         cursor.execute(sql, params)
         conn.commit()
+        # 维护派生数据（活动政策规则、输出结果）
+        notify_table_changed(conn, table, ids=[pk_value] if pk_name == 'id' else None)
         cursor.close()
         conn.close()
         
-        print("=== api_update_row 执行完成 ===")
+        logger.debug("=== api_update_row 执行完成 ===")
         return jsonify({'success': True})
         
     except Exception as e:
-        import traceback
-        print(f"=== api_update_row 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_update_row 执行错误: %s", e)
         return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
 
 @app.route('/api/delete_row', methods=['POST'])
@@ -1478,10 +550,10 @@ def api_delete_row():
     pk_name = request.json.get('pk_name')
     pk_value = request.json.get('pk_value')
     
-    print(f"=== api_delete_row 请求参数 ===")
-    print(f"表名: {table}")
-    print(f"主键名: {pk_name}")
-    print(f"主键值: {pk_value}")
+    logger.debug("=== api_delete_row 请求参数 ===")
+    logger.debug("表名: %s", table)
+    logger.debug("主键名: %s", pk_name)
+    logger.debug("主键值: %s", pk_value)
     
     if not table or not pk_name or pk_value is None:
         return jsonify({'success': False, 'msg': '参数缺失'}), 400
@@ -1492,24 +564,21 @@ def api_delete_row():
         sql = f"DELETE FROM `{table}` WHERE `{pk_name}`=%s"
         params = (pk_value,)
         
-        print(f"执行SQL: {sql}")
-        print(f"参数: {params}")
+        logger.debug("执行SQL: %s", sql)
+        logger.debug("参数: %s", params)
         
         cursor.execute(sql, params)
         conn.commit()
+        # 维护派生数据（活动政策规则、输出结果）
+        notify_table_changed(conn, table, ids=[pk_value] if pk_name == 'id' else None)
         cursor.close()
         conn.close()
         
-        print("=== api_delete_row 执行完成 ===")
+        logger.debug("=== api_delete_row 执行完成 ===")
         return jsonify({'success': True})
         
     except Exception as e:
-        import traceback
-        print(f"=== api_delete_row 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_delete_row 执行错误: %s", e)
         return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
 
 @app.route('/api/batch_delete', methods=['POST'])
@@ -1517,9 +586,9 @@ def api_batch_delete():
     table = request.json.get('table')
     ids = request.json.get('ids')  # list
     
-    print(f"=== api_batch_delete 请求参数 ===")
-    print(f"表名: {table}")
-    print(f"删除ID列表: {ids}")
+    logger.debug("=== api_batch_delete 请求参数 ===")
+    logger.debug("表名: %s", table)
+    logger.debug("删除ID列表: %s", ids)
     
     if not table or not ids:
         return jsonify({'success': False, 'msg': '参数缺失'}), 400
@@ -1529,34 +598,136 @@ def api_batch_delete():
         cursor = conn.cursor()
         sql = f"DELETE FROM `{table}` WHERE `id` IN ({','.join(['%s'] * len(ids))})"
         
-        print(f"执行SQL: {sql}")
-        print(f"参数: {ids}")
+        logger.debug("执行SQL: %s", sql)
+        logger.debug("参数: %s", ids)
         
         cursor.execute(sql, ids)
         conn.commit()
+        # 维护派生数据（活动政策规则、输出结果）
+        notify_table_changed(conn, table, ids=ids)
         cursor.close()
         conn.close()
         
-        print("=== api_batch_delete 执行完成 ===")
+        logger.debug("=== api_batch_delete 执行完成 ===")
         return jsonify({'success': True})
         
     except Exception as e:
-        import traceback
-        print(f"=== api_batch_delete 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_batch_delete 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+
+def run_delete_by_filter(ctx, params):
+    """后台任务：按条件分批删除"""
+    conn = create_connection()
+    if not conn:
+        raise RuntimeError('数据库连接错误')
+    try:
+        table = params['table']
+        _, where_clause, where_params = build_table_filter(
+            get_table_columns(conn, table), params.get('search'), params.get('fields'), params.get('filters'))
+        deleted = delete_matching(conn, table, where_clause, where_params,
+                                  on_deleted=lambda ids: notify_table_changed(conn, table, ids=ids),
+                                  progress=lambda done, total: ctx.progress(done, total, f"已删除 {done} 行"),
+                                  total=params.get('count'))
+        return {'deleted': deleted}
+    finally:
+        conn.close()
+
+@app.route('/api/delete_by_filter', methods=['POST'])
+def api_delete_by_filter():
+    """按查询条件删除（与 /api/data 相同的 search、fields、filters）
+
+    dry_run=true 只返回匹配行数；没有任何条件时需要 confirm_all=true。
+    匹配行数不超过 SYNC_DELETE_LIMIT 时直接分批删除，否则提交后台任务并返回 job_id，
+    进度通过 /api/jobs/<job_id> 查询。
+    """
+    payload = request.json or {}
+    table = payload.get('table')
+    search_term = (payload.get('search') or '').strip()
+    fields = payload.get('fields')
+    filters = parse_filters(payload.get('filters'))
+    dry_run = bool(payload.get('dry_run'))
+    
+    logger.debug("=== api_delete_by_filter 请求参数 ===")
+    logger.debug("表名: %s，搜索: %s，字段: %s，过滤: %s，预览: %s", table, search_term, fields, filters, dry_run)
+    
+    if not table:
+        return jsonify({'success': False, 'msg': '参数缺失'}), 400
+    
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        all_columns = get_table_columns(conn, table)
+        _, where_clause, params = build_table_filter(all_columns, search_term, fields, filters)
+        if not where_clause and not payload.get('confirm_all'):
+            return jsonify({'success': False, 'msg': '没有删除条件，删除全表数据需要 confirm_all'}), 400
+        count = count_matching(conn, table, where_clause, params)
+        if dry_run or count == 0:
+            return jsonify({'success': True, 'dry_run': dry_run, 'count': count})
+        
+        if count > SYNC_DELETE_LIMIT:
+            job_params = {'table': table, 'search': search_term, 'fields': fields, 'filters': filters, 'count': count}
+            job_id = submit_job(conn, 'delete_by_filter', job_params, run_delete_by_filter)
+            return jsonify({'success': True, 'count': count, 'job_id': job_id}), 202
+        
+        deleted = delete_matching(conn, table, where_clause, params,
+                                  on_deleted=lambda ids: notify_table_changed(conn, table, ids=ids))
+        logger.debug("=== api_delete_by_filter 执行完成 ===")
+        return jsonify({'success': True, 'count': count, 'deleted': deleted})
+    except Exception as e:
+        logger.exception("api_delete_by_filter 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/bulk_mutate', methods=['POST'])
+def api_bulk_mutate():
+    """批量新增、修改、删除，一个事务、一次提交
+
+    参数：table、inserts（[{字段: 值}]）、updates（[{id, data: {字段: 值}}]）、deletes（[id]）。
+    返回逐条结果 results 和新的表数据版本 version。
+    """
+    payload = request.json or {}
+    table = payload.get('table')
+    inserts = payload.get('inserts') or []
+    updates = payload.get('updates') or []
+    deletes = payload.get('deletes') or []
+    
+    logger.debug("=== api_bulk_mutate 请求参数 ===")
+    logger.debug("表名: %s，新增 %s 条，修改 %s 条，删除 %s 条", table, len(inserts), len(updates), len(deletes))
+    
+    if not table or not (inserts or updates or deletes):
+        return jsonify({'success': False, 'msg': '参数缺失'}), 400
+    if not all(isinstance(x, list) for x in (inserts, updates, deletes)):
+        return jsonify({'success': False, 'msg': 'inserts、updates、deletes 必须是数组'}), 400
+    
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        results, changed_ids = apply_bulk_mutation(conn, table, inserts, updates, deletes)
+        # 维护派生数据（活动政策规则、输出结果），同时更新表数据版本；全部失败（没有行变化）时不需要
+        if changed_ids:
+            notify_table_changed(conn, table, ids=changed_ids)
+        logger.debug("=== api_bulk_mutate 执行完成 ===")
+        version = get_table_version(table) if table in VERSIONED_TABLES else None
+        return jsonify({'success': True, 'results': results, 'version': version})
+    except BulkMutationError as e:
+        return jsonify({'success': False, 'msg': str(e), 'results': e.results}), 400
+    except Exception as e:
+        logger.exception("api_bulk_mutate 执行错误: %s", e)
         return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
 
 @app.route('/api/export_excel', methods=['POST'])
 def export_excel():
     table_name = request.json.get('table') 
     ids = request.json.get('ids')  # list
     
-    print(f"=== export_excel 请求参数 ===")
-    print(f"表名: {table_name}")
-    print(f"导出ID列表: {ids}")
+    logger.debug("=== export_excel 请求参数 ===")
+    logger.debug("表名: %s", table_name)
+    logger.debug("导出ID列表: %s", ids)
     
     if not table_name or not ids:
         return jsonify({'success': False, 'msg': '参数缺失'}), 400
@@ -1580,12 +751,12 @@ def export_excel():
         
         select_sql = ', '.join(select_fields)
         sql = f"SELECT {select_sql} FROM `{table_name}` WHERE id IN ({','.join(['%s'] * len(ids))})"
-        print(f"执行SQL: {sql}")
-        print(f"参数: {ids}")
+        logger.debug("执行SQL: %s", sql)
+        logger.debug("参数: %s", ids)
         
         cursor.execute(sql, ids)
         data = cursor.fetchall()
-        print(f"查询结果: {len(data)} 行数据")
+        logger.debug("查询结果: %s 行数据", len(data))
         
         # 排除不需要的字段
         for row in data:
@@ -1595,238 +766,550 @@ def export_excel():
         cursor.close()
         conn.close()
 
-        # 创建 Excel 文件
-        import pandas as pd
+        # 创建 Excel 文件（pandas 只在导出时加载）
+        pd = load_pandas()
         df = pd.DataFrame(data)
         output = f"{table_name}.xlsx"
         df.to_excel(output, index=False)
-        print(f"Excel文件已创建: {output}")
+        logger.debug("Excel文件已创建: %s", output)
 
         # 发送文件到浏览器
-        print("=== export_excel 执行完成 ===")
+        logger.debug("=== export_excel 执行完成 ===")
         return send_file(output, as_attachment=True)
         
     except Exception as e:
-        import traceback
-        print(f"=== export_excel 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("export_excel 执行错误: %s", e)
         return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
 
-@app.route('/api/output_results')
-def api_output_results():
+def export_filter(conn, params):
+    """导出任务的字段和条件：给了 ids 时只导出这些行，否则按查询条件导出"""
+    all_columns = get_table_columns(conn, params['table'])
+    select_fields, where_clause, where_params = build_table_filter(
+        all_columns, params.get('search'), params.get('fields'), params.get('filters'))
+    ids = params.get('ids')
+    if ids:
+        where_clause = f"WHERE `id` IN ({','.join(['%s'] * len(ids))})"
+        where_params = list(ids)
+    # 与原导出一致，不导出 id
+    return [f for f in select_fields if f != 'id'], where_clause, where_params
+
+def run_export(ctx, params):
+    """后台任务：生成导出文件"""
+    conn = create_connection()
+    if not conn:
+        raise RuntimeError('数据库连接错误')
     try:
-        print("=== 开始执行 api_output_results ===")
-        conn = create_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # 只读取仲景宛西-客户流向表（左表）
-        print("1. 获取 customer_flow 表结构...")
-        cursor.execute("DESCRIBE customer_flow")
-        describe_result = cursor.fetchall()
-        print(f"DESCRIBE结果: {describe_result}")
-        # 使用字典格式获取字段名
-        flow_fields = [row['Field'] for row in describe_result]
-        print(f"customer_flow 字段: {flow_fields}")
-        
-        print("2. 查询 customer_flow 表数据...")
-        # 构建查询字段，格式化当期日期
-        select_fields = []
-        for field in flow_fields:
-            if field == '当期日期':
-                select_fields.append(f"DATE_FORMAT({field}, '%Y-%m-%d %H:%i:%s') as {field}")
-            else:
-                select_fields.append(field)
-        
-        select_sql = ', '.join(select_fields)
-        cursor.execute(f"SELECT {select_sql} FROM customer_flow")
-        flow_rows = cursor.fetchall()
-        print(f"customer_flow 表记录数: {len(flow_rows)}")
-        
-        # 读取活动方案表（用于计算赠品金额）
-        print("3. 获取 activity_plan 表结构...")
-        cursor.execute("DESCRIBE activity_plan")
-        describe_result = cursor.fetchall()
-        print(f"DESCRIBE结果: {describe_result}")
-        # 使用字典格式获取字段名
-        plan_fields = [row['Field'] for row in describe_result]
-        print(f"activity_plan 字段: {plan_fields}")
+        table = params['table']
+        fields, where_clause, where_params = export_filter(conn, params)
+        total = count_matching(conn, table, where_clause, where_params)
+        ctx.progress(0, total, '正在查询', force=True)
+        path = export_path(ctx.job_id, params['format'])
+        rows = write_export(conn, table, fields, where_clause, where_params, path, params['format'],
+                            progress=lambda done, total: ctx.progress(done, total, f"已写入 {done} 行"), total=total)
+        ctx.progress(rows, total, '已完成', force=True)
+        return {'path': path, 'rows': rows, 'download_name': export_download_name(table, params['format'])}
+    finally:
+        conn.close()
+
+def export_job_response(job, reused=False):
+    """导出任务的状态；完成时带下载地址"""
+    result = job.get('结果') if isinstance(job.get('结果'), dict) else {}
+    body = {'success': True, 'job_id': job['id'], 'status': job['状态'], 'reused': reused,
+            'done': job.get('已完成'), 'total': job.get('总数'), 'rows': result.get('rows')}
+    if job['状态'] == 'success':
+        body['download_url'] = f"/api/exports/{job['id']}/download"
+        body['retention_hours'] = EXPORT_RETENTION_HOURS
+    elif job['状态'] == 'failed':
+        body['msg'] = job.get('错误信息')
+    return body
+
+@app.route('/api/exports', methods=['POST'])
+def api_create_export():
+    """提交后台导出任务
+
+    参数：table、format（xlsx / csv，默认 xlsx）、ids（只导出选中的行）或 search、fields、filters（与 /api/data 相同）。
+    相同参数且表数据版本未变化时复用已有任务和文件（reused=true）。
+    进度通过 /api/jobs/<job_id> 查询，完成后从 download_url 下载，文件保留 JXC_EXPORT_RETENTION_HOURS 小时。
+    """
+    payload = request.json or {}
+    table = payload.get('table')
+    fmt = (payload.get('format') or 'xlsx').lower()
+    
+    if not table:
+        return jsonify({'success': False, 'msg': '参数缺失'}), 400
+    if table not in VERSIONED_TABLES:
+        # 复用导出文件依赖表数据版本
+        return jsonify({'success': False, 'msg': f"不支持导出的表: {table}"}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'msg': f"不支持的导出格式: {fmt}"}), 400
+    
+    params = {
+        'table': table,
+        'format': fmt,
+        'ids': [str(i) for i in payload.get('ids') or []],
+        'search': (payload.get('search') or '').strip(),
+        'fields': payload.get('fields') or '',
+        'filters': parse_filters(payload.get('filters')),
+        'version': get_table_version(table),
+    }
+    
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        cleanup_exports()
+        job = find_job(conn, 'export', params)
+        if job and (job['状态'] != 'success' or not export_expired((job.get('结果') or {}).get('path'))):
+            logger.info("复用导出任务 %s", job['id'])
+            return jsonify(export_job_response(job, reused=True))
+        job_id = submit_job(conn, 'export', params, run_export)
+        return jsonify(export_job_response(get_job(conn, job_id))), 202
+    except Exception as e:
+        logger.exception("api_create_export 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/exports/<int:job_id>')
+def api_export_status(job_id):
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        job = get_job(conn, job_id)
+        if job is None or job['类型'] != 'export':
+            return jsonify({'success': False, 'msg': '导出任务不存在'}), 404
+        return jsonify(export_job_response(job))
+    finally:
+        conn.close()
+
+@app.route('/api/exports/<int:job_id>/download')
+def api_export_download(job_id):
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        job = get_job(conn, job_id)
+    finally:
+        conn.close()
+    if job is None or job['类型'] != 'export' or job['状态'] != 'success':
+        return jsonify({'success': False, 'msg': '导出文件不存在或尚未完成'}), 404
+    result = job.get('结果') or {}
+    path = os.path.abspath(result.get('path') or '')
+    if not path.startswith(os.path.abspath(EXPORT_FOLDER) + os.sep) or export_expired(path):
+        return jsonify({'success': False, 'msg': '导出文件已过期，请重新导出'}), 410
+    return send_file(path, as_attachment=True, download_name=result.get('download_name'))
+
+def run_reconcile(ctx, params):
+    """后台任务：对指定当期日期的流向与兑付明细对账"""
+    conn = create_connection()
+    if not conn:
+        raise RuntimeError('数据库连接错误')
+    try:
+        ctx.progress(0, None, '正在读取数据', force=True)
+        summary = run_reconciliation(conn, params['period'], params['date_window'], Decimal(params['amount_tolerance']),
+                                     job_id=ctx.job_id, progress=ctx.progress)
+        ctx.progress(1, 1, '已完成', force=True)
+        return summary
+    finally:
+        conn.close()
+
+@app.route('/api/reconcile', methods=['POST'])
+def api_reconcile():
+    """提交对账任务：按 客户 + 产品 + 批号 分块，块内按日期窗口和金额容差配对流向与兑付明细
+
+    参数：period（当期日期，YYYY-MM-DD）、date_window（日期相差天数上限，默认 3）、
+    amount_tolerance（金额差上限，默认 1.00）。结果替换该当期日期之前的对账结果，
+    通过 /api/reconcile/results 查询；同一参数的任务正在执行时返回该任务。
+    因服务重启而中断的任务（心跳超时）先标记为 failed，不再被复用，也不会挡住新的对账。
+    """
+    payload = request.json or {}
+    
+    logger.debug("=== api_reconcile 请求参数 ===")
+    logger.debug("参数: %s", payload)
+    
+    period = parse_day(payload.get('period'))
+    if period is None:
+        return jsonify({'success': False, 'msg': 'period 参数缺失或格式错误（YYYY-MM-DD）'}), 400
+    try:
+        date_window = int(payload.get('date_window', DEFAULT_DATE_WINDOW))
+        amount_tolerance = Decimal(str(payload.get('amount_tolerance', DEFAULT_AMOUNT_TOLERANCE)))
+    except (TypeError, ValueError, ArithmeticError):
+        return jsonify({'success': False, 'msg': 'date_window、amount_tolerance 必须是数字'}), 400
+    if not 0 <= date_window <= 31 or amount_tolerance < 0:
+        return jsonify({'success': False, 'msg': 'date_window 范围 0-31，amount_tolerance 不能为负数'}), 400
+    
+    params = {'period': period.isoformat(), 'date_window': date_window, 'amount_tolerance': str(amount_tolerance)}
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        job = find_job(conn, 'reconcile', params, statuses=('pending', 'running'))
+        if job:
+            return jsonify({'success': True, 'job_id': job['id'], 'status': job['状态'], 'reused': True})
+        # find_job 已跳过心跳超时的任务，这里把它们标记为 failed，任务列表中不再显示为执行中
+        fail_stale_jobs(conn)
+        job_id = submit_job(conn, 'reconcile', params, run_reconcile)
+        return jsonify({'success': True, 'job_id': job_id, 'status': 'pending', 'reused': False}), 202
+    except Exception as e:
+        logger.exception("api_reconcile 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/reconcile/results')
+def api_reconcile_results():
+    """对账结果，参数：period（当期日期）、status（exact / tolerance / flow_only / redemption_only）、page、per_page"""
+    period = parse_day(request.args.get('period'))
+    status = request.args.get('status') or None
+    if period is None:
+        return jsonify({'error': 'period 参数缺失或格式错误（YYYY-MM-DD）'}), 400
+    if status and status not in RECONCILE_STATUSES:
+        return jsonify({'error': f"不支持的状态: {status}"}), 400
+    page = max(1, int(request.args.get('page', 1)))
+    per_page = min(5000, max(1, int(request.args.get('per_page', 500))))
+    
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接错误'}), 500
+    try:
+        total, rows = list_reconcile_results(conn, period, status, page, per_page)
+        return json_response({
+            'summary': reconcile_summary(conn, period),
+            'data': rows,
+            'total_records': total,
+            'total_pages': (total + per_page - 1) // per_page,
+            'current_page': page,
+            'per_page': per_page,
+        })
+    except Exception as e:
+        logger.exception("api_reconcile_results 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+def get_output_results_page(page=1, per_page=500, sort_field=None, sort_order='ASC', search_term=None, fields=None, filters=None):
+    """分页读取物化的输出结果，参数和返回格式与 get_table_data 一致，另返回全部可用字段 fields"""
+    conn = create_connection()
+    try:
+        # 输出结果在导入和行编辑时已物化到 output_results，这里只读物化行
+        ensure_output_materialized(conn)
+        flow_fields = flow_output_fields(conn)
+        all_fields = ['id'] + flow_fields + ['当期日期', '活动政策', '赠品金额']
+        
+        # 对外字段名到物化表列的映射（id 对应来源流向行 id）
+        column_exprs = {f: f"`{f}`" for f in all_fields}
+        column_exprs['id'] = '`流向ID`'
+        select_exprs = dict(column_exprs)
+        # %T 即 %H:%i:%s，避免与参数占位符 %s 冲突
+        select_exprs['当期日期'] = "DATE_FORMAT(当期日期, '%Y-%m-%d %T')"
         
-        print("4. 查询 activity_plan 表数据...")
-        cursor.execute("SELECT * FROM activity_plan")
-        plan_rows = cursor.fetchall()
-        print(f"activity_plan 表记录数: {len(plan_rows)}")
+        if fields:
+            select_fields = [f.strip() for f in fields.split(',') if f.strip() in column_exprs]
+            if not select_fields:
+                select_fields = all_fields
+        else:
+            select_fields = all_fields
         
-        plan_map = {row['产品名称']: row for row in plan_rows}
-        print(f"活动方案映射表大小: {len(plan_map)}")
+        where_clause, params = build_where_clause(column_exprs, select_fields, search_term, filters,
+                                                  base_conditions=['流向ID IS NOT NULL'])
+        order_clause = build_order_clause(column_exprs, sort_field, sort_order, default_order="ORDER BY 流向ID")
         
-        # 生成输出结果（只包含左表数据）
-        print("5. 开始生成输出结果...")
-        result_rows = []
+        cursor = conn.cursor(dictionary=True)
+        count_query = f"SELECT COUNT(*) AS total FROM output_results {where_clause}"
+        logger.debug("计数查询: %s", count_query)
+        cursor.execute(limit_select(count_query, 'output'), params)
+        total_records = cursor.fetchone()['total']
         
-        # 保持原始字段顺序，并添加计算字段
-        all_fields = flow_fields.copy()  # 保持原始字段顺序
-        if '活动政策' not in all_fields:
-            all_fields.append('活动政策')
-        if '赠品金额' not in all_fields:
-            all_fields.append('赠品金额')
+        offset = (page - 1) * per_page
+        select_sql = ', '.join(f"{select_exprs[f]} AS `{f}`" for f in select_fields)
+        query = f"SELECT {select_sql} FROM output_results {where_clause} {order_clause} LIMIT {per_page} OFFSET {offset}"
+        logger.debug("数据查询: %s", query)
+        cursor.execute(limit_select(query, 'output'), params)
+        data = cursor.fetchall()
+        cursor.close()
         
-        for i, row in enumerate(flow_rows):
-            print(f"处理第 {i+1} 条记录: 物料名称={row.get('物料名称', 'N/A')}")
-            
-            # 只保留左表字段，不加前缀
-            new_row = {k: row.get(k, '') for k in flow_fields}
-            
-            # 活动政策
-            plan = plan_map.get(row.get('物料名称'))
-            policy = plan['活动政策'] if plan else ''
-            new_row['活动政策'] = policy
-            
-            # 赠品金额
-            def parse_policy(policy, qty):
-                if not policy:
-                    return 0
-                m = re.search(r'购(\d+)盒.*?返(\d+)元', policy)
-                if m:
-                    base_qty = int(m.group(1))
-                    base_amt = int(m.group(2))
-                    if base_qty > 0:
-                        return base_amt * (int(qty) // base_qty)
-                return 0
-            
-            qty = row.get('销售数量', 0)
-            new_row['赠品金额'] = parse_policy(policy, qty)
-            
-            result_rows.append(new_row)
-        print(f"最终字段数: {len(all_fields)}")
-        print(f"最终记录数: {len(result_rows)}")
+        return {
+            'fields': all_fields,
+            'data': data,
+            'columns': [{'Field': f} for f in select_fields],
+            'total_records': total_records,
+            'total_pages': (total_records + per_page - 1) // per_page,
+            'current_page': page,
+            'per_page': per_page
+        }
+    finally:
+        conn.close()
+
+@app.route('/api/output_results')
+@admission('output')
+def api_output_results():
+    """输出结果分页接口，参数与 /api/data 相同：page、per_page、sort_field、sort_order、search、filters、fields、format"""
+    try:
+        logger.debug("=== 开始执行 api_output_results ===")
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, int(request.args.get('per_page', 500)))
+        sort_field = request.args.get('sort_field')
+        sort_order = request.args.get('sort_order', 'ASC')
+        search_term = request.args.get('search', '')
+        fields = request.args.get('fields')
+        filters = parse_filters(request.args.get('filters'))
+        
+        etag = data_etag(['output_results'], request_args_key())
+        not_modified = check_not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        result = get_output_results_page(page, per_page, sort_field, sort_order, search_term, fields, filters)
+        logger.debug("总记录数: %s, 本页记录数: %s", result['total_records'], len(result['data']))
+        
+        logger.debug("=== api_output_results 执行完成 ===")
+        if request.args.get('format') == 'columnar':
+            result = columnar_result(result)
+        return with_etag(json_response(result), etag)
         
+    except Exception as e:
+        interrupted = interrupted_response(e, 'output')
+        if interrupted is not None:
+            logger.warning("api_output_results 查询中止: %s", e)
+            return jsonify(interrupted[0]), interrupted[1]
+        logger.exception("api_output_results 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+
+@app.route('/api/aggregate')
+def api_aggregate():
+    """分组汇总接口，customer_flow 的常用汇总直接读日汇总表，其他情况在源表上执行有限制的 GROUP BY
+
+    参数：table（默认 customer_flow）、group_by（逗号分隔字段）、period（day / month）、
+    metrics（逗号分隔的 count、sum:字段）、filters、start_date、end_date、sort_field、sort_order、
+    limit（默认 1000，最多 10000）、source（table 时强制查询源表）
+    """
+    table_name = request.args.get('table', 'customer_flow')
+    group_by = [f.strip() for f in request.args.get('group_by', '').split(',') if f.strip()]
+    filters = parse_filters(request.args.get('filters'))
+
+    logger.debug("=== api_aggregate 请求参数 ===")
+    logger.debug("表名: %s，分组: %s，周期: %s，过滤: %s", table_name, group_by, request.args.get('period'), filters)
+
+    if table_name not in TABLE_DISPLAY_NAMES:
+        return jsonify({'error': f'不支持的表: {table_name}'}), 400
+    if table_name == 'customer_redemption_details' and set(group_by + list(filters)) & set(REMOVED_FIELDS):
+        return jsonify({'error': '字段不存在'}), 400
+
+    etag = data_etag([table_name], request_args_key())
+    not_modified = check_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接错误'}), 500
+    try:
+        result = run_aggregate(conn, table_name, group_by,
+                               period=request.args.get('period') or None,
+                               metrics=request.args.get('metrics'),
+                               filters=filters,
+                               start_date=request.args.get('start_date'),
+                               end_date=request.args.get('end_date'),
+                               sort_field=request.args.get('sort_field'),
+                               sort_order=request.args.get('sort_order', 'DESC'),
+                               limit=request.args.get('limit', AGGREGATE_DEFAULT_LIMIT),
+                               source=request.args.get('source'))
+        logger.debug("汇总来源: %s，分组数: %s", result['source'], len(result['rows']))
+        return with_etag(json_response(result), etag)
+    except AggregateError as e:
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 400
+    except ValueError as e:
+        # limit 等参数格式错误
+        return jsonify({'error': f"参数格式错误: {e}", 'error_type': type(e).__name__}), 400
+    except Exception as e:
+        logger.exception("api_aggregate 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/import_runs')
+def api_import_runs():
+    """最近的导入运行记录，参数：limit（默认 50）、table"""
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接失败'}), 500
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+        runs = list_import_runs(conn, limit, request.args.get('table'))
+        return jsonify({'runs': runs})
+    except Exception as e:
+        logger.exception("api_import_runs 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/import_runs/<int:run_id>/profile')
+def api_import_run_profile(run_id):
+    """某次导入的 cProfile 报告（按累计耗时排序）"""
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接失败'}), 500
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT 性能分析文件 FROM {IMPORT_RUNS_TABLE} WHERE id = %s", (run_id,))
+        row = cursor.fetchone()
         cursor.close()
+    finally:
         conn.close()
-        
-        print("=== api_output_results 执行完成 ===")
-        return jsonify({"fields": all_fields, "rows": result_rows})
-        
+    if not row or not row[0] or not os.path.exists(row[0]):
+        return jsonify({'error': '该次导入没有性能分析结果'}), 404
+    limit = min(200, max(1, int(request.args.get('limit', 40))))
+    return Response(profile_report(row[0], limit), mimetype='text/plain; charset=utf-8')
+
+@app.route('/api/jobs')
+def api_jobs():
+    """最近的后台任务，参数：limit（默认 50）、type"""
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接失败'}), 500
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+        return jsonify({'jobs': list_jobs(conn, limit, request.args.get('type'))})
+    except Exception as e:
+        logger.exception("api_jobs 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    """后台任务的状态、进度和结果"""
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接失败'}), 500
+    try:
+        job = get_job(conn, job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify(job)
     except Exception as e:
-        import traceback
-        print(f"=== api_output_results 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_job 执行错误: %s", e)
         return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/import_runs')
+def import_runs_page():
+    """导入运行记录页面"""
+    conn = create_connection()
+    if not conn:
+        return "数据库连接错误", 500
+    try:
+        runs = list_import_runs(conn, min(500, max(1, int(request.args.get('limit', 50)))), request.args.get('table'))
+    finally:
+        conn.close()
+    return render_template('import_runs.html', runs=runs)
 
 @app.route('/api/get_tables', methods=['POST'])
 def api_get_tables():
     data = request.json
-    print(f"=== api_get_tables 请求参数 ===")
-    print(f"数据库配置: {data}")
+    logger.debug("=== api_get_tables 请求参数 ===")
+    if not isinstance(data, dict):
+        return jsonify({'error': '数据库配置格式不正确'}), 400
+    logger.debug("数据库配置: %s", mask_dbconf(data))
     
     try:
-        conn = mysql.connector.connect(
-            host=data.get('host', 'localhost'),
-            port=int(data.get('port', 3306)),
-            user=data.get('user', 'root'),
-            password=data.get('password', ''),
-            database=data.get('database', '')
-        )
-        cursor = conn.cursor()
-        
-        sql = "SHOW TABLES"
-        print(f"执行SQL: {sql}")
-        cursor.execute(sql)
-        tables = [row[0] for row in cursor.fetchall()]
-        print(f"查询到的表: {tables}")
-        
-        cursor.close()
-        conn.close()
+        with compare_connections.connection(data) as conn:
+            cursor = conn.cursor()
+            sql = "SHOW TABLES"
+            logger.debug("执行SQL: %s", sql)
+            cursor.execute(sql)
+            tables = [row[0] for row in cursor.fetchall()]
+            logger.debug("查询到的表: %s", tables)
+            cursor.close()
         return jsonify({'tables': tables})
     except Exception as e:
-        import traceback
-        print(f"=== api_get_tables 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        logger.exception("api_get_tables 执行错误: %s", e)
         return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
 
 @app.route('/api/get_table_data', methods=['POST'])
+@admission('dump')
 def api_get_table_data():
     data = request.json
     table = data.get('table')
     dbconf = data.get('dbconf', {})
+    # 可选：前端生成的查询标识，用于 /api/queries/<query_id>/cancel 取消
+    query_id = data.get('query_id')
     
-    print(f"=== api_get_table_data 请求参数 ===")
-    print(f"表名: {table}")
-    print(f"数据库配置: {dbconf}")
+    logger.debug("=== api_get_table_data 请求参数 ===")
+    logger.debug("表名: %s", table)
+    logger.debug("数据库配置: %s", mask_dbconf(dbconf))
     
     if not table:
         return jsonify({'error': '缺少表名'}), 400
+    if not isinstance(dbconf, dict):
+        return jsonify({'error': '数据库配置格式不正确'}), 400
+    
+    # 只有本系统的数据库才有表版本号，其他库每次都重新查询
+    etag = None
+    if is_local_database(dbconf):
+        etag = data_etag([table], [table])
+        not_modified = check_not_modified(etag)
+        if not_modified is not None:
+            return not_modified
     
     try:
-        conn = mysql.connector.connect(
-            host=dbconf.get('host', 'localhost'),
-            port=int(dbconf.get('port', 3306)),
-            user=dbconf.get('user', 'root'),
-            password=dbconf.get('password', ''),
-            database=dbconf.get('database', '')
-        )
-        cursor = conn.cursor()
-        
-        # 获取所有字段
-        describe_sql = f"DESCRIBE `{table}`"
-        print(f"1. 执行SQL: {describe_sql}")
-        cursor.execute(describe_sql)
-        describe_result = cursor.fetchall()
-        print(f"DESCRIBE结果: {describe_result}")
-        # 使用索引格式获取字段名（因为使用的是普通cursor）
-        all_fields = [desc[0] for desc in describe_result]
-        print(f"表字段: {all_fields}")
-        
-        # 查询所有数据，格式化当期日期字段
-        select_fields = []
-        for field in all_fields:
-            if field == '当期日期':
-                select_fields.append(f"DATE_FORMAT({field}, '%Y-%m-%d %H:%i:%s') as {field}")
-            else:
-                select_fields.append(field)
-        
-        select_sql = ', '.join(select_fields)
-        sql = f"SELECT {select_sql} FROM `{table}`"
-        print(f"2. 执行SQL: {sql}")
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        print(f"查询结果: {len(rows)} 行数据")
-        
-        import io, csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(all_fields)
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            # 补全缺失字段
-            full_row = [row_dict.get(col, '') for col in all_fields]
-            writer.writerow(full_row)
-        
-        cursor.close()
-        conn.close()
-        
-        print("=== api_get_table_data 执行完成 ===")
-        return jsonify({'csv_string': output.getvalue()})
+        with compare_connections.connection(dbconf) as conn:
+            cursor = conn.cursor()
+            
+            # 获取所有字段（表结构按库缓存）
+            logger.debug("1. 获取表结构: %s", table)
+            describe_result = compare_connections.describe(cursor, dbconf, table)
+            logger.debug("DESCRIBE结果: %s", describe_result)
+            # 使用索引格式获取字段名（因为使用的是普通cursor）
+            all_fields = [desc[0] for desc in describe_result]
+            logger.debug("表字段: %s", all_fields)
+        
+            # 查询所有数据，格式化当期日期字段
+            select_fields = []
+            for field in all_fields:
+                if field == '当期日期':
+                    select_fields.append(f"DATE_FORMAT({field}, '%Y-%m-%d %H:%i:%s') as {field}")
+                else:
+                    select_fields.append(field)
+        
+            select_sql = ', '.join(select_fields)
+            sql = limit_select(f"SELECT {select_sql} FROM `{table}`", 'dump', query_id)
+            logger.debug("2. 执行SQL: %s", sql)
+            with running_queries.track(query_id, conn, 'dump', dbconf):
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+            logger.debug("查询结果: %s 行数据", len(rows))
+        
+            import io, csv
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(all_fields)
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                # 补全缺失字段
+                full_row = [row_dict.get(col, '') for col in all_fields]
+                writer.writerow(full_row)
+        
+            cursor.close()
+        
+        logger.debug("=== api_get_table_data 执行完成 ===")
+        return with_etag(jsonify({'csv_string': output.getvalue()}), etag)
         
     except Exception as e:
-        import traceback
-        print(f"=== api_get_table_data 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        interrupted = interrupted_response(e, 'dump')
+        if interrupted is not None:
+            logger.warning("api_get_table_data 查询中止: %s", e)
+            return jsonify(interrupted[0]), interrupted[1]
+        logger.exception("api_get_table_data 执行错误: %s", e)
+        # 表结构可能已经变化，下次重新查询
+        compare_connections.invalidate_schema(dbconf, table)
         return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
 
 @app.route('/api/compare_join', methods=['POST'])
+@admission('join')
 def api_compare_join():
     data = request.json
     tableA = data.get('tableA')
@@ -1836,95 +1319,218 @@ def api_compare_join():
     dbconf = data.get('dbconf', {})
     # 可选：日期字段及格式化要求
     date_fields = data.get('date_fields', {})  # {tableA: 字段名, tableB: 字段名}
+    # 可选：流向客户名称与兑付客户名称按客户名称映射表（customer_name_index）模糊关联
+    fuzzy_names = bool(data.get('fuzzy_names'))
+    # 可选：前端生成的查询标识，用于 /api/queries/<query_id>/cancel 取消
+    query_id = data.get('query_id')
     
-    print(f"=== api_compare_join 请求参数 ===")
-    print(f"表A: {tableA}")
-    print(f"表B: {tableB}")
-    print(f"关联键A: {keysA}")
-    print(f"关联键B: {keysB}")
-    print(f"数据库配置: {dbconf}")
-    print(f"日期字段配置: {date_fields}")
+    logger.debug("=== api_compare_join 请求参数 ===")
+    logger.debug("表A: %s", tableA)
+    logger.debug("表B: %s", tableB)
+    logger.debug("关联键A: %s", keysA)
+    logger.debug("关联键B: %s", keysB)
+    logger.debug("数据库配置: %s", mask_dbconf(dbconf))
+    logger.debug("日期字段配置: %s", date_fields)
+    logger.debug("客户名称模糊关联: %s", fuzzy_names)
     
-    if not tableA or not tableB or not keysA or not keysB or len(keysA) != len(keysB):
+    if not tableA or not tableB or not keysA or not keysB or len(keysA) != len(keysB) or not isinstance(dbconf, dict):
         return jsonify({'error': '参数缺失或不合法'}), 400
+    name_pair = name_join_pair(keysA, keysB) if fuzzy_names else None
+    if fuzzy_names and name_pair is None:
+        return jsonify({'error': f"模糊关联需要 {'/'.join(FLOW_NAME_FIELDS)} 与 {REDEMPTION_NAME_FIELD} 作为一组关联字段"}), 400
     
     try:
-        conn = mysql.connector.connect(
-            host=dbconf.get('host', 'localhost'),
-            port=int(dbconf.get('port', 3306)),
-            user=dbconf.get('user', 'root'),
-            password=dbconf.get('password', ''),
-            database=dbconf.get('database', '')
-        )
-        cursor = conn.cursor()
-        
-        # 获取字段名
-        print("1. 获取表A字段...")
-        cursor.execute(f"DESCRIBE `{tableA}`")
-        describe_result = cursor.fetchall()
-        print(f"表A DESCRIBE结果: {describe_result}")
-        fieldsA = [row[0] for row in describe_result]
-        print(f"表A字段: {fieldsA}")
-        
-        print("2. 获取表B字段...")
-        cursor.execute(f"DESCRIBE `{tableB}`")
-        describe_result = cursor.fetchall()
-        print(f"表B DESCRIBE结果: {describe_result}")
-        fieldsB = [row[0] for row in describe_result]
-        print(f"表B字段: {fieldsB}")
-        
-        # 拼接select字段
-        select_fields = [f"a.`{f}` AS '左-{f}'" for f in fieldsA] + [f"b.`{f}` AS '右-{f}'" for f in fieldsB]
-        select_sql = ", ".join(select_fields)
-        print(f"SELECT字段: {select_sql}")
-        
-        # 构造ON条件，支持日期格式化
-        on_clauses = []
-        for kA, kB in zip(keysA, keysB):
-            if date_fields.get('A') == kA and date_fields.get('B') == kB:
-                on_clauses.append(f"DATE_FORMAT(a.`{kA}`,'%Y/%c/%e') = DATE_FORMAT(b.`{kB}`,'%Y/%c/%e')")
-            elif date_fields.get('A') == kA:
-                on_clauses.append(f"DATE_FORMAT(a.`{kA}`,'%Y/%c/%e') = b.`{kB}`")
-            elif date_fields.get('B') == kB:
-                on_clauses.append(f"a.`{kA}` = DATE_FORMAT(b.`{kB}`,'%Y/%c/%e')")
+        with compare_connections.connection(dbconf) as conn:
+            cursor = conn.cursor()
+            
+            # 获取字段名（表结构按库缓存）
+            logger.debug("1. 获取表A字段...")
+            describe_result = compare_connections.describe(cursor, dbconf, tableA)
+            logger.debug("表A DESCRIBE结果: %s", describe_result)
+            fieldsA = [row[0] for row in describe_result]
+            logger.debug("表A字段: %s", fieldsA)
+        
+            logger.debug("2. 获取表B字段...")
+            describe_result = compare_connections.describe(cursor, dbconf, tableB)
+            logger.debug("表B DESCRIBE结果: %s", describe_result)
+            fieldsB = [row[0] for row in describe_result]
+            logger.debug("表B字段: %s", fieldsB)
+        
+            # 拼接select字段
+            select_fields = [f"a.`{f}` AS '左-{f}'" for f in fieldsA] + [f"b.`{f}` AS '右-{f}'" for f in fieldsB]
+            select_sql = ", ".join(select_fields)
+            logger.debug("SELECT字段: %s", select_sql)
+        
+            # 构造ON条件，支持日期格式化
+            on_clauses = []
+            for kA, kB in zip(keysA, keysB):
+                if date_fields.get('A') == kA and date_fields.get('B') == kB:
+                    on_clauses.append(f"DATE_FORMAT(a.`{kA}`,'%Y/%c/%e') = DATE_FORMAT(b.`{kB}`,'%Y/%c/%e')")
+                elif date_fields.get('A') == kA:
+                    on_clauses.append(f"DATE_FORMAT(a.`{kA}`,'%Y/%c/%e') = b.`{kB}`")
+                elif date_fields.get('B') == kB:
+                    on_clauses.append(f"a.`{kA}` = DATE_FORMAT(b.`{kB}`,'%Y/%c/%e')")
+                else:
+                    on_clauses.append(f"a.`{kA}` = b.`{kB}`")
+        
+            name_map = None
+            if name_pair is not None:
+                if not has_name_index(cursor):
+                    return jsonify({'error': '该数据库没有客户名称映射表，请先在本系统导入数据或刷新客户名称映射'}), 400
+                # 流向一侧的客户名称先经映射表换成兑付明细中的名称，没有映射的按原名称关联
+                idx, flow_side = name_pair
+                kA, kB = keysA[idx], keysB[idx]
+                map_join = f"LEFT JOIN {NAME_INDEX_TABLE} m ON m.`来源` = 'flow' AND m.`名称` = "
+                if flow_side == 'A':
+                    on_clauses[idx] = f"COALESCE(m.`匹配名称`, a.`{kA}`) = b.`{kB}`"
+                    from_sql = f"`{tableA}` a {map_join}a.`{kA}` JOIN `{tableB}` b"
+                    flow_table, flow_field = tableA, kA
+                else:
+                    on_clauses[idx] = f"a.`{kA}` = COALESCE(m.`匹配名称`, b.`{kB}`)"
+                    from_sql = f"`{tableB}` b {map_join}b.`{kB}` JOIN `{tableA}` a"
+                    flow_table, flow_field = tableB, kB
+                # 前端据此补充未匹配行时使用同样的映射
+                cursor.execute(limit_select(f"SELECT m.`名称`, m.`匹配名称` FROM {NAME_INDEX_TABLE} m "
+                                            f"WHERE m.`来源` = 'flow' AND m.`匹配名称` IS NOT NULL AND m.`名称` IN "
+                                            f"(SELECT DISTINCT `{flow_field}` FROM `{flow_table}`)", 'join', query_id))
+                name_map = dict(cursor.fetchall())
             else:
-                on_clauses.append(f"a.`{kA}` = b.`{kB}`")
+                from_sql = f"`{tableA}` a JOIN `{tableB}` b"
         
-        on_sql = ' AND '.join(on_clauses)
-        print(f"ON条件: {on_sql}")
+            on_sql = ' AND '.join(on_clauses)
+            logger.debug("ON条件: %s", on_sql)
         
-        sql = f"SELECT {select_sql} FROM `{tableA}` a JOIN `{tableB}` b ON {on_sql}"
-        print(f"3. 执行JOIN SQL: {sql}")
-        cursor.execute(sql)
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        print(f"JOIN结果: {len(rows)} 行数据")
+            sql = limit_select(f"SELECT {select_sql} FROM {from_sql} ON {on_sql}", 'join', query_id)
+            logger.debug("3. 执行JOIN SQL: %s", sql)
+            with running_queries.track(query_id, conn, 'join', dbconf):
+                cursor.execute(sql)
+                columns = [desc[0] for desc in cursor.description]
+                rows = cursor.fetchall()
+            logger.debug("JOIN结果: %s 行数据", len(rows))
         
-        import io, csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(columns)
-        writer.writerows(rows)
+            import io, csv
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            writer.writerows(rows)
         
-        cursor.close()
-        conn.close()
+            cursor.close()
         
-        print("=== api_compare_join 执行完成 ===")
-        return jsonify({'csv_string': output.getvalue(), 'sql': sql})
+        logger.debug("=== api_compare_join 执行完成 ===")
+        return jsonify({'csv_string': output.getvalue(), 'sql': sql, 'name_map': name_map})
         
     except Exception as e:
-        import traceback
-        print(f"=== api_compare_join 执行错误 ===")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误信息: {str(e)}")
-        print("详细错误堆栈:")
-        traceback.print_exc()
+        interrupted = interrupted_response(e, 'join')
+        if interrupted is not None:
+            logger.warning("api_compare_join 查询中止: %s", e)
+            return jsonify(interrupted[0]), interrupted[1]
+        logger.exception("api_compare_join 执行错误: %s", e)
+        compare_connections.invalidate_schema(dbconf)
         return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
 
+@app.route('/api/queries')
+def api_queries():
+    """本进程正在执行的可取消查询"""
+    return jsonify({'queries': running_queries.list()})
+
+@app.route('/api/queries/<query_id>/cancel', methods=['POST'])
+def api_cancel_query(query_id):
+    """取消联表比对等长时间查询，参数 dbconf 与发起查询时相同（查询在本进程登记时可省略）"""
+    data = request.get_json(silent=True) or {}
+    logger.debug("=== api_cancel_query 请求参数 ===")
+    logger.debug("查询标识: %s, 数据库配置: %s", query_id, mask_dbconf(data.get('dbconf', {})))
+    if not valid_query_id(query_id):
+        return jsonify({'success': False, 'msg': '查询标识不合法'}), 400
+    try:
+        connection_id = cancel_query(query_id, data.get('dbconf', {}), compare_connections.connection)
+    except Exception as e:
+        logger.exception("api_cancel_query 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    if connection_id is None:
+        return jsonify({'success': False, 'msg': '查询不存在或已执行完'}), 404
+    return jsonify({'success': True, 'connection_id': connection_id})
+
+@app.route('/api/customer_names')
+def api_customer_names():
+    """流向客户名称到兑付客户名称的映射，参数：match（exact / normalized / fuzzy / none）、search、page、per_page"""
+    match_type = request.args.get('match') or None
+    if match_type and match_type not in MATCH_TYPES:
+        return jsonify({'error': f"不支持的匹配方式: {match_type}"}), 400
+    page = max(1, int(request.args.get('page', 1)))
+    per_page = min(5000, max(1, int(request.args.get('per_page', 500))))
+    conn = create_connection()
+    if not conn:
+        return jsonify({'error': '数据库连接错误'}), 500
+    try:
+        total, rows = list_name_index(conn, match_type, request.args.get('search'), page, per_page)
+        return json_response({
+            'data': rows,
+            'total_records': total,
+            'total_pages': (total + per_page - 1) // per_page,
+            'current_page': page,
+            'per_page': per_page,
+        })
+    except Exception as e:
+        logger.exception("api_customer_names 执行错误: %s", e)
+        return jsonify({'error': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/customer_names/refresh', methods=['POST'])
+def api_customer_names_refresh():
+    """为新出现的客户名称计算映射；full=true 时全部重新计算"""
+    full = bool((request.json or {}).get('full')) if request.is_json else False
+    conn = create_connection()
+    if not conn:
+        return jsonify({'success': False, 'msg': '数据库连接错误'}), 500
+    try:
+        return jsonify({'success': True, **refresh_name_index(conn, full=full)})
+    except Exception as e:
+        logger.exception("api_customer_names_refresh 执行错误: %s", e)
+        return jsonify({'success': False, 'msg': str(e), 'error_type': type(e).__name__}), 500
+    finally:
+        conn.close()
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """指纹化静态资源：按 Accept-Encoding 返回预压缩版本，内容不变，允许浏览器永久缓存"""
+    path, encoding = ASSETS.resolve(filename, request.accept_encodings)
+    if path is None:
+        return "Not Found", 404
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
 @app.route('/compare')
 def compare_page():
-    """数据比对原型工具页面"""
-    return render_template_string(open(resource_path('static/web_compare.html'), encoding='utf-8').read())
+    """数据比对原型工具页面（没有服务端变量，启动时读入内存，按 ETag 协商缓存）"""
+    if request.accept_encodings.quality('gzip') > 0:
+        response = Response(COMPARE_PAGE_GZIP, content_type='text/html; charset=utf-8')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(COMPARE_PAGE_ETAG + '-gz')
+    else:
+        response = Response(COMPARE_PAGE_BODY, content_type='text/html; charset=utf-8')
+        response.set_etag(COMPARE_PAGE_ETAG)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# 页面模板在启动时编译进 Jinja 缓存，请求时只渲染（生产模式下不检查模板文件变化）
+PAGE_TEMPLATES = ['upload.html', 'query.html', 'import_runs.html']
+for template_name in PAGE_TEMPLATES:
+    app.jinja_env.get_template(template_name)
+
+with open(resource_path('static/web_compare.html'), encoding='utf-8') as f:
+    COMPARE_PAGE_BODY = ASSETS.rewrite_static_urls(f.read()).encode('utf-8')
+COMPARE_PAGE_ETAG = hashlib.sha1(COMPARE_PAGE_BODY).hexdigest()
+COMPARE_PAGE_GZIP = gzip.compress(COMPARE_PAGE_BODY, compresslevel=9, mtime=0)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # 默认使用生产 WSGI 服务器，开发时用 python web_import.py --dev；
+    # 传入本模块已创建的 app，避免 serve 再 import web_import 把模块执行第二遍
+    from serve import main
+    main(app=app) 
\ No newline at end of file
@@ -1,16 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
+# 单文件模式：生成一个 web_import.exe，每次启动都要先把整个程序解压到临时目录，启动较慢。
+# 办公电脑上建议使用目录模式 web_import_onedir.spec（pyinstaller web_import_onedir.spec），
+# 不需要解压，启动快得多；两种模式的启动耗时可用 startup_bench.py 测量。
 
+EXCLUDES = ['tkinter', 'matplotlib', 'IPython', 'jupyter_client', 'notebook', 'scipy', 'pytest', 'PyQt5', 'PySide6']
 
 a = Analysis(
     ['web_import.py'],
     pathex=[],
     binaries=[],
-    datas=[('static', 'static'), ('uploads', 'uploads')],
-    hiddenimports=['pandas', 'openpyxl', 'xlrd'],
+    # uploads 是运行时的工作目录（相对当前目录），不打包
+    datas=[('static', 'static'), ('templates', 'templates'), ('create_tables_simple.sql', '.')],
+    hiddenimports=['pandas', 'openpyxl', 'xlrd', 'waitress'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # pandas 的可选依赖，程序用不到；排除后包更小，单文件模式解压更快
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +32,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # UPX 压缩后每次启动都要解压，关闭以加快启动（文件会稍大）
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
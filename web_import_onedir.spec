@@ -0,0 +1,49 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 目录模式：生成 dist/web_import/ 目录（web_import.exe 加依赖文件），启动时不需要解压，
+# 比单文件模式（web_import.spec）启动快得多；分发时把整个目录打包成 zip。
+
+EXCLUDES = ['tkinter', 'matplotlib', 'IPython', 'jupyter_client', 'notebook', 'scipy', 'pytest', 'PyQt5', 'PySide6']
+
+a = Analysis(
+    ['web_import.py'],
+    pathex=[],
+    binaries=[],
+    # uploads 是运行时的工作目录（相对当前目录），不打包
+    datas=[('static', 'static'), ('templates', 'templates'), ('create_tables_simple.sql', '.')],
+    hiddenimports=['pandas', 'openpyxl', 'xlrd', 'waitress'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # pandas 的可选依赖，程序用不到；排除后包更小，单文件模式解压更快
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='web_import',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='web_import',
+)